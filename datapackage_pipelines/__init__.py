@@ -2,9 +2,18 @@
 import io
 import os
 
-from .specs import pipelines
-from .manager import execute_pipeline
-
 VERSION_FILE = os.path.join(os.path.dirname(__file__), 'VERSION')
 
 __version__ = io.open(VERSION_FILE, encoding='utf-8').readline().strip()
+
+
+def __getattr__(name):
+    # Processors only need `datapackage_pipelines.wrapper`, so don't load the
+    # specs parser and the manager (and everything they import) unless asked to
+    if name == 'pipelines':
+        from .specs import pipelines
+        return pipelines
+    if name == 'execute_pipeline':
+        from .manager import execute_pipeline
+        return execute_pipeline
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
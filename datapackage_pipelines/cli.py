@@ -12,6 +12,10 @@ from .manager.logging_config import logging
 from .specs import pipelines, PipelineSpec #noqa
 from .status import status_mgr
 from .manager import run_pipelines
+from .manager.runner import match_pipeline_id
+from .manager.trace import merge_traces, TRACE_ARTIFACT
+from .utilities.step_stats import TRACE_ENV_VAR, STEP_STATS_ENV_VAR
+from .utilities.profiler import PROFILE_ARTIFACT, profile_data
 
 
 @click.group(invoke_without_command=True)
@@ -47,12 +51,30 @@ def serve():
 @click.option('--force', default=False, is_flag=True)
 @click.option('--concurrency', default=1)
 @click.option('--slave', default=False, is_flag=True)
-def run(pipeline_id, verbose, use_cache, dirty, force, concurrency, slave):
+@click.option('--trace', default=False, is_flag=True,
+              help='Store a trace of each execution (see `dpp trace`)')
+@click.option('--step-stats', default=False, is_flag=True,
+              help='Store the stats of each step in the stats of each execution')
+@click.option('--in-process', default=False, is_flag=True,
+              help='Run concurrent pipelines on a single event loop in this process, '
+                   'instead of a worker process each')
+@click.option('--max-processes', default=None, type=int,
+              help='With --in-process, the maximal number of step processes running at once')
+@click.option('--cpu-slots', default=None, type=int,
+              help='With --in-process, the maximal number of CPU slots used at once')
+@click.option('--resume', default=False, is_flag=True,
+              help='Restart pipelines whose last execution failed from their latest checkpoint')
+def run(pipeline_id, verbose, use_cache, dirty, force, concurrency, slave, trace, step_stats,
+        in_process, max_processes, cpu_slots, resume):
     """Run a pipeline by pipeline-id.
        pipeline-id supports '%' wildcard for any-suffix matching,
        'all' for running all pipelines and
        comma-delimited list of pipeline ids"""
     exitcode = 0
+    if trace:
+        os.environ[TRACE_ENV_VAR] = '1'
+    if step_stats:
+        os.environ[STEP_STATS_ENV_VAR] = '1'
 
     running = []
     progress = {}
@@ -78,10 +100,19 @@ def run(pipeline_id, verbose, use_cache, dirty, force, concurrency, slave):
                 else:
                     print('\x1b[2K%s: \x1b[31mFAILURE, processed %s rows\x1b[0m' % (pid, count))
 
-    results = run_pipelines(pipeline_id, '.', use_cache,
-                            dirty, force, concurrency,
-                            verbose, progress_cb if not verbose else None,
-                            slave)
+    root_logger = logging.getLogger()
+    log_level = root_logger.level
+    if in_process and not verbose:
+        # The pipelines log in this process, which would garble the progress display
+        root_logger.setLevel(logging.WARNING)
+    try:
+        results = run_pipelines(pipeline_id, '.', use_cache,
+                                dirty, force, concurrency,
+                                verbose, progress_cb if not verbose else None,
+                                slave, in_process, max_processes, cpu_slots, resume,
+                                fork_server=True)
+    finally:
+        root_logger.setLevel(log_level)
     if not slave:
         logging.info('RESULTS:')
         errd = False
@@ -117,6 +148,56 @@ def run(pipeline_id, verbose, use_cache, dirty, force, concurrency, slave):
     exit(exitcode)
 
 
+@cli.command()
+@click.argument('pipeline_id')
+@click.option('--output', '-o', default='-', type=click.File('w'),
+              help='File to write the trace to (default: standard output)')
+def trace(pipeline_id, output):
+    """Export the trace of the last execution of pipelines (in the Chrome trace-event format).
+       Runs of several pipelines are merged into a single trace.
+       Pipelines must be run with `dpp run --trace` for their executions to be traced."""
+    traces = []
+    for _id in status_mgr().all_pipeline_ids():
+        if not match_pipeline_id(pipeline_id, _id):
+            continue
+        ex = status_mgr().get(_id).get_last_execution()
+        execution_trace = ex.get_artifact(TRACE_ARTIFACT) if ex is not None else None
+        if execution_trace is None:
+            click.echo('No trace for the last execution of {}'.format(_id), err=True)
+            continue
+        traces.append(execution_trace)
+    if len(traces) == 0:
+        exit(1)
+    json.dump(merge_traces(traces), output)
+
+
+@cli.command()
+@click.argument('pipeline_id')
+@click.option('--step', '-s', default=None, type=int,
+              help='Index of the profiled process to show (as shown in the list of profiles)')
+@click.option('--output', '-o', default=None, type=click.File('wb'),
+              help='File to write the profile of the step to (pstats, or collapsed stacks)')
+def profile(pipeline_id, step, output):
+    """Show the profiles of the steps of the last execution of a pipeline.
+       Steps are profiled by setting `profile: true` (cProfile) or `profile: sample` on them."""
+    ex = status_mgr().get(pipeline_id).get_last_execution()
+    profiles = (ex.get_artifact(PROFILE_ARTIFACT) if ex is not None else None) or []
+    if step is not None:
+        profiles = [p for p in profiles if p['index'] == step]
+    if len(profiles) == 0:
+        click.echo('No profiles found for the last execution of {}'.format(pipeline_id), err=True)
+        exit(1)
+    if output is not None:
+        if len(profiles) > 1:
+            click.echo('Several steps were profiled, choose one using --step', err=True)
+            exit(1)
+        output.write(profile_data(profiles[0]))
+        return
+    for p in profiles:
+        click.echo('{index} {step} ({mode}, {processes} processes):'.format(**p))
+        click.echo(p['report'])
+
+
 @cli.command()
 def init():
     """Reset the status of all pipelines"""
@@ -1,11 +1,12 @@
 import sys
-import shutil
-import gzip
 
 from datapackage_pipelines.wrapper import ingest
+from datapackage_pipelines.utilities.cache_files import CacheReader
 
 params, _, _ = ingest()
 
 load_from = params['load-from']
 
-shutil.copyfileobj(gzip.open(load_from, "rt"), sys.stdout)
+sys.stdout.flush()
+with CacheReader(load_from) as cache_file:
+    cache_file.replay(sys.stdout.buffer, params.get('resources'))
@@ -7,7 +7,6 @@ import hashlib
 import copy
 import importlib
 
-import requests
 from tableschema.exceptions import CastError
 from tableschema.schema import Schema
 
@@ -227,6 +226,7 @@ class FileDumper(DumperBase):
                 url = resource[PROP_STREAMED_FROM]
                 delete = False
                 if is_a_url(url):
+                    import requests
                     tmp = tempfile.NamedTemporaryFile(delete=False)
                     stream = requests.get(url, stream=True).raw
                     stream.read = functools.partial(stream.read, decode_content=True)
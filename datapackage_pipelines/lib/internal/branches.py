@@ -0,0 +1,16 @@
+import os
+import sys
+import json
+
+from datapackage_pipelines.utilities.framing import get_framing
+from datapackage_pipelines.utilities.step_stats import report_step_stats
+from datapackage_pipelines.utilities.branches import join_branches
+
+
+if __name__ == '__main__':
+    config = json.loads(sys.argv[1])
+    join_branches(sys.stdin.buffer, get_framing(config['input']),
+                  sys.stdout.buffer, get_framing(config['output']),
+                  [(os.fdopen(branch['input'], 'wb'), branch['output'], get_framing(branch['framing']))
+                   for branch in config['branches']])
+    report_step_stats()
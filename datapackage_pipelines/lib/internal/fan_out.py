@@ -0,0 +1,12 @@
+import os
+import sys
+
+from datapackage_pipelines.utilities.framing import get_framing
+from datapackage_pipelines.utilities.step_stats import report_step_stats
+from datapackage_pipelines.utilities.replication import fan_out
+
+
+if __name__ == '__main__':
+    framing, mode, *fds = sys.argv[1:]
+    fan_out(sys.stdin.buffer, [os.fdopen(int(fd), 'wb') for fd in fds], get_framing(framing), mode)
+    report_step_stats()
@@ -0,0 +1,36 @@
+import logging
+import importlib.util
+
+from dataflows import Flow
+
+from datapackage_pipelines.wrapper import ingest
+from datapackage_pipelines.utilities.flow_utils import spew_flow, step_boundary, failed_step
+from datapackage_pipelines.utilities.fusion import FAILED_STEP_MARKER, flow_arity
+
+
+def step_flow(step, stats):
+    spec = importlib.util.spec_from_file_location(
+        'datapackage_pipelines.lib.fused.' + step['run'], step['executor']
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    if flow_arity(step['executor']) == 2:
+        return module.flow(step['parameters'], stats)
+    return module.flow(step['parameters'])
+
+
+if __name__ == '__main__':
+    try:
+        with ingest() as ctx:
+            spew_flow(
+                Flow(*[
+                    Flow(step_flow(step, ctx.stats), step_boundary(step['run']))
+                    for step in ctx.parameters['steps']
+                ]),
+                ctx
+            )
+    except Exception as e:
+        run = failed_step(e)
+        if run is not None:
+            logging.error('%s%s', FAILED_STEP_MARKER, run)
+        raise
@@ -4,11 +4,9 @@ import logging
 
 import datapackage
 
-from dataflows.helpers.resource_matcher import ResourceMatcher
-
 from datapackage_pipelines.wrapper import ingest, spew, get_dependency_datapackage_url
 from datapackage_pipelines.utilities.resources import tabular, PROP_STREAMING, \
-    PROP_STREAMED_FROM
+    PROP_STREAMED_FROM, ResourceMatcher
 
 
 def progress_logger(iter, log_progress_rows):
@@ -10,11 +10,9 @@ import tabulator
 
 from tableschema import Schema
 
-from dataflows.helpers.resource_matcher import ResourceMatcher
-
 from datapackage_pipelines.wrapper import ingest, spew
 from datapackage_pipelines.utilities.resources import streamable, PATH_PLACEHOLDER, get_path, \
-    PROP_STREAMED_FROM, PROP_STREAMING, streaming
+    PROP_STREAMED_FROM, PROP_STREAMING, streaming, ResourceMatcher
 from datapackage_pipelines.utilities.extended_json import json
 from datapackage_pipelines.utilities.tabulator_txt_parser import TXTParser
 
@@ -0,0 +1,164 @@
+"""
+Backpressure monitoring of the pipes between steps.
+
+A step which can't keep up with its input makes the pipe it reads from fill up, which blocks the
+step writing to that pipe, and eventually all previous steps. While a pipeline runs, the
+manager samples how full each pipe of the pipeline is (using FIONREAD on a duplicate of its read end).
+Once it's done, the step whose input pipe was full most often, while its output pipe wasn't, is
+named as the limiting step. If no pipe was ever full (e.g. when the first step is the slowest), the
+step which was busy for the longest time (not blocked on its input or output) is named instead.
+"""
+import os
+import asyncio
+import logging
+import struct
+
+try:
+    import fcntl
+    import termios
+except ImportError:
+    fcntl = termios = None
+
+SAMPLE_INTERVAL = 0.5
+# A pipe is considered full when it holds at least this fraction of its capacity
+FULL_THRESHOLD = 0.9
+DEFAULT_PIPE_SIZE = 64 * 1024
+BURSTY_PIPE_SIZE_ENV_VAR = 'DPP_BURSTY_PIPE_SIZE'
+DEFAULT_BURSTY_PIPE_SIZE = 1024 * 1024
+# Not exposed by the fcntl module before Python 3.10
+F_SETPIPE_SZ = getattr(fcntl, 'F_SETPIPE_SZ', 1031)
+F_GETPIPE_SZ = getattr(fcntl, 'F_GETPIPE_SZ', 1032)
+
+
+def pipe_size(fd):
+    try:
+        return fcntl.fcntl(fd, F_GETPIPE_SZ)
+    except (AttributeError, OSError):
+        return DEFAULT_PIPE_SIZE
+
+
+def set_pipe_size(fd, size=None):
+    """Raises the capacity of a pipe (for steps producing data in bursts), if the system allows it"""
+    if size is None:
+        size = int(os.environ.get(BURSTY_PIPE_SIZE_ENV_VAR, DEFAULT_BURSTY_PIPE_SIZE))
+    try:
+        return fcntl.fcntl(fd, F_SETPIPE_SZ, size)
+    except (AttributeError, OSError) as e:
+        logging.warning('Failed to set pipe size to %d: %s', size, e)
+        return None
+
+
+def pipe_fill(fd):
+    """Number of bytes waiting in a pipe"""
+    return struct.unpack('i', fcntl.ioctl(fd, termios.FIONREAD, b'\0' * 4))[0]
+
+
+class PipeEdge(object):
+
+    def __init__(self, fd, writer, reader, reader_process):
+        self.fd = fd
+        self.writer = writer
+        self.reader = reader
+        self.reader_process = reader_process
+        self.capacity = pipe_size(fd)
+        self.samples = 0
+        self.full = 0
+        self.total = 0
+        self.max = 0
+
+    def sample(self):
+        if self.fd is None:
+            return
+        if self.reader_process.returncode is not None:
+            # Holding on to the pipe would keep the writer from noticing the reader is gone
+            self.close()
+            return
+        try:
+            fill = pipe_fill(self.fd)
+        except OSError:
+            self.close()
+            return
+        self.samples += 1
+        self.total += fill
+        self.max = max(self.max, fill)
+        if fill >= self.capacity * FULL_THRESHOLD:
+            self.full += 1
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    @property
+    def full_ratio(self):
+        return self.full / self.samples if self.samples > 0 else 0.0
+
+    def stats(self):
+        return {
+            'capacity': self.capacity,
+            'samples': self.samples,
+            'max_fill': self.max,
+            'average_fill': round(self.total / self.samples / self.capacity, 3) if self.samples > 0 else 0.0,
+            'full': round(self.full_ratio, 3),
+        }
+
+
+class PipeMonitor(object):
+    """Samples the fill level of the pipes between consecutive steps of a pipeline"""
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.edges = []
+        self.task = None
+
+    @property
+    def available(self):
+        return fcntl is not None and termios is not None
+
+    def watch(self, rfd, writer, reader, reader_process):
+        """Start sampling the pipe `rfd`, from step `writer` to step `reader` (read by `reader_process`)"""
+        if not self.available:
+            return
+        self.edges.append(PipeEdge(os.dup(rfd), writer, reader, reader_process))
+
+    def start(self):
+        if len(self.edges) > 0:
+            self.task = asyncio.ensure_future(self.run())
+
+    async def run(self):
+        while True:
+            for edge in self.edges:
+                edge.sample()
+            await asyncio.sleep(self.interval)
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+        for edge in self.edges:
+            edge.close()
+
+    def limiting_step(self, all_step_stats):
+        """
+        Returns the `run` of the step limiting the pipeline and the reason, or (None, None).
+        `all_step_stats` are the stats reported by the processes (see utilities/step_stats.py).
+        """
+        if any(edge.full > 0 for edge in self.edges):
+            pressure = {}
+            for edge in self.edges:
+                pressure.setdefault(id(edge.reader), [edge.reader, 0.0])[1] += edge.full_ratio
+                pressure.setdefault(id(edge.writer), [edge.writer, 0.0])[1] -= edge.full_ratio
+            step, _ = max(pressure.values(), key=lambda item: item[1])
+            edge = next(edge for edge in self.edges if edge.reader is step)
+            return step['run'], 'input pipe was full %d%% of the time' % (edge.full_ratio * 100)
+
+        busy = [(stats['wall_time'] - stats['blocked_on_input'] - stats['blocked_on_output'], stats['step'])
+                for stats in all_step_stats
+                if all(key in stats for key in ('wall_time', 'blocked_on_input', 'blocked_on_output'))]
+        if len(busy) > 0:
+            busy_time, run = max(busy)
+            return run, 'busy for %.1f seconds' % busy_time
+        return None, None
@@ -0,0 +1,105 @@
+"""
+Automatic checkpoints, for resuming failed executions.
+
+A checkpoint is a cache file of the output of a step, written like the cache of a step with
+`cache: true` (and named after its `_cache_hash`). Unlike caches, checkpoints are only read by
+`dpp run --resume`, when the previous execution of the pipeline failed: the pipeline then restarts
+after the latest step with a valid checkpoint written by that execution. A normal run always starts
+from the first step, as the inputs of the pipeline might have changed since.
+
+Steps with `checkpoint: true` always write a checkpoint. The `checkpoint` policy of a pipeline adds
+checkpoints automatically:
+
+    checkpoint:
+      every: 5     # after every 5 steps
+      cost: 60     # after steps which took, together with the steps since the previous
+                   # checkpoint, more than 60 seconds to run
+
+The cost of a step is the time it spent working (i.e. not waiting for the steps before and after
+it) in previous successful executions, taken from their step stats.
+A checkpoint is only valid if its step completed before the failure, and steps which run
+in parallel or in branches are not checkpointed automatically.
+"""
+import logging
+
+from ..utilities.stat_utils import STATS_DPP_KEY
+from ..utilities.step_stats import STATS_STEPS_KEY
+
+CHECKPOINT_KEY = 'checkpoint'
+EVERY_KEY = 'every'
+COST_KEY = 'cost'
+# Key of the step's cache hash in its step stats
+STATS_CACHE_HASH_KEY = 'cache_hash'
+
+
+def step_cost(step_stats):
+    """Seconds a step spent working, according to its step stats"""
+    if 'wall_time' in step_stats and 'blocked_on_input' in step_stats:
+        return max(step_stats['wall_time']
+                   - step_stats['blocked_on_input']
+                   - step_stats.get('blocked_on_output', 0), 0)
+    # Internal processes (e.g. fan-out) only report their CPU time
+    return step_stats.get('cpu_time', 0)
+
+
+def historical_costs(ps):
+    """Costs of the steps of a pipeline, by their cache hash, from its latest successful executions"""
+    costs = {}
+    for execution in ps.executions:
+        if not execution.success or not execution.stats:
+            continue
+        execution_costs = {}
+        for step_stats in execution.stats.get(STATS_DPP_KEY, {}).get(STATS_STEPS_KEY, []):
+            cache_hash = step_stats.get(STATS_CACHE_HASH_KEY)
+            if cache_hash is not None:
+                # All processes of a step (e.g. its replicas) add up
+                execution_costs[cache_hash] = execution_costs.get(cache_hash, 0) + step_cost(step_stats)
+        for cache_hash, cost in execution_costs.items():
+            # Steps skipped by resuming have no stats, so older executions fill in for them
+            costs.setdefault(cache_hash, cost)
+    return costs
+
+
+def checkpointable(step):
+    return 'branches' not in step and step.get('parallelism', 1) == 1
+
+
+def apply_checkpoint_policy(pipeline_steps, policy, costs):
+    """Returns the steps of the pipeline, marking the steps to checkpoint according to `policy`"""
+    every = policy.get(EVERY_KEY)
+    max_cost = policy.get(COST_KEY)
+    ret = []
+    steps_since, cost_since = 0, 0
+    for i, step in enumerate(pipeline_steps):
+        steps_since += 1
+        cost_since += costs.get(step.get('_cache_hash'), 0)
+        if step.get('cache') or step.get(CHECKPOINT_KEY):
+            steps_since, cost_since = 0, 0
+        elif i < len(pipeline_steps) - 1 and checkpointable(step) and \
+                ((every is not None and steps_since >= every) or
+                 (max_cost is not None and cost_since > max_cost)):
+            # There's no point in a checkpoint after the last step
+            step = dict(step, **{CHECKPOINT_KEY: True})
+            steps_since, cost_since = 0, 0
+        ret.append(step)
+    return ret
+
+
+def failed_execution_start(ps, execution_id):
+    """
+    Start time of the oldest of the failed executions of the pipeline right before `execution_id`,
+    or None if the previous execution didn't fail.
+    Checkpoints written by any of these executions may be resumed from, as each of them might
+    have loaded the checkpoints written by the ones before it.
+    """
+    ret = None
+    for execution in ps.executions:
+        if execution.execution_id == execution_id:
+            continue
+        if execution.success or execution.start_time is None:
+            break
+        ret = execution.start_time
+    if ret is None:
+        logging.info('%s Previous execution of %s did not fail, nothing to resume',
+                     execution_id[:8], ps.pipeline_id)
+    return ret
@@ -0,0 +1,108 @@
+import heapq
+import statistics
+from collections import OrderedDict
+
+from ..specs import PipelineSpec  # noqa
+from ..specs.hashers import recheck_dependencies
+
+
+class ExecutionGraph(object):
+    """
+    The dependency graph of the pipelines to execute, built once from their specs.
+    Pipelines become ready once all of their dependencies which are executed in the same run
+    have completed; dependencies which aren't part of the run are not waited for.
+
+    Ready pipelines are handed out by the length of the longest chain of pipelines which depend on
+    them (including themselves), weighted by how long each pipeline took to run last time. This
+    starts the pipelines on the critical path of the run as early as possible, rather than leaving
+    them for the end. Pipelines without a history are assumed to take the median time of the others.
+    Ties are broken by the order of discovery.
+    """
+
+    def __init__(self, specs, status_manager):
+        self.status_manager = status_manager
+        self.specs = OrderedDict()
+        for spec in specs:
+            # Specs with a duplicate id are never executed
+            self.specs.setdefault(spec.pipeline_id, spec)
+        self.order = dict((pipeline_id, i) for i, pipeline_id in enumerate(self.specs))
+        self.dependents = dict((pipeline_id, []) for pipeline_id in self.specs)
+        self.waiting_on = {}
+        self.ready = []
+        self.executed = set()
+        for pipeline_id, spec in self.specs.items():
+            dependencies = set(dep for dep in spec.dependencies if dep in self.specs)
+            self.waiting_on[pipeline_id] = dependencies
+            for dependency in dependencies:
+                self.dependents[dependency].append(pipeline_id)
+        self.durations = self._durations()
+        self.priority = self._priorities()
+        for pipeline_id, waiting_on in self.waiting_on.items():
+            if len(waiting_on) == 0:
+                self._push(pipeline_id)
+
+    def _durations(self):
+        durations = dict((pipeline_id, historical_duration(self.status_manager, pipeline_id))
+                         for pipeline_id in self.specs)
+        known = [duration for duration in durations.values() if duration is not None]
+        default = statistics.median(known) if len(known) > 0 else 1.0
+        return dict((pipeline_id, default if duration is None else duration)
+                    for pipeline_id, duration in durations.items())
+
+    def _priorities(self):
+        """The duration of the longest chain starting at each pipeline"""
+        priority = {}
+        for pipeline_id in self.specs:
+            # Iterative post-order traversal, as chains might be longer than the recursion limit
+            stack = [(pipeline_id, False)]
+            while len(stack) > 0:
+                current, expanded = stack.pop()
+                if current in priority:
+                    continue
+                if expanded:
+                    priority[current] = self.durations[current] + \
+                        max((priority[dependent] for dependent in self.dependents[current]), default=0)
+                else:
+                    stack.append((current, True))
+                    stack.extend((dependent, False) for dependent in self.dependents[current]
+                                 if dependent not in priority)
+        return priority
+
+    def _push(self, pipeline_id):
+        heapq.heappush(self.ready, (-self.priority[pipeline_id], self.order[pipeline_id], pipeline_id))
+
+    def __len__(self):
+        """Number of pipelines not handed out yet"""
+        return len(self.specs) - len(self.executed)
+
+    def pop_ready(self) -> PipelineSpec:
+        """Returns the next pipeline to execute, or None if none is ready"""
+        if len(self.ready) == 0:
+            return None
+        _, _, pipeline_id = heapq.heappop(self.ready)
+        self.executed.add(pipeline_id)
+        spec = self.specs[pipeline_id]
+        if any(dep in self.specs for dep in spec.dependencies):
+            # Its dependencies were just executed, so they might not block it anymore
+            recheck_dependencies(spec, self.status_manager)
+        return spec
+
+    def complete(self, pipeline_id):
+        """Marks a pipeline as done (successfully or not), possibly readying its dependents"""
+        for dependent in self.dependents.get(pipeline_id, ()):
+            waiting_on = self.waiting_on[dependent]
+            if pipeline_id in waiting_on:
+                waiting_on.remove(pipeline_id)
+                if len(waiting_on) == 0:
+                    self._push(dependent)
+
+
+def historical_duration(status_manager, pipeline_id):
+    """How long (in seconds) the last execution of a pipeline took, or None if it's unknown"""
+    if pipeline_id is None:
+        return None
+    ps = status_manager.get(pipeline_id)
+    execution = ps.get_last_successful_execution() or ps.get_last_execution()
+    if execution is None or execution.start_time is None or execution.finish_time is None:
+        return None
+    return max(execution.finish_time - execution.start_time, 0.0)
@@ -0,0 +1,209 @@
+"""
+Runs pipelines concurrently on a single event loop, in the current process.
+
+Executing a pipeline is a coroutine over the pipes of its step processes, so pipelines can share
+one event loop instead of each needing a thread and a worker process. How many run at once is
+bounded by `concurrency`, and by global limits on the step processes and CPU slots they use.
+
+A pipeline holds its share of the limits from the moment it starts until it completes, as all of
+its steps run at once. Its share is estimated from its steps before caches and fusion are applied,
+so it's an upper bound:
+- processes: one per step (a step with `parallelism` adds a fan-out and a fan-in process,
+  a step with `branches` adds a join process), plus the sink.
+- CPU slots: the steps of a chain stream rows to each other, so a chain is counted as a single
+  slot unless it has a step with `parallelism` (a slot for each replica) or `branches` (the slots
+  of all branches).
+A pipeline whose share is larger than a limit gets all of it, so it runs alone rather than never.
+"""
+import time
+import asyncio
+import logging
+
+from .tasks import async_execute_spec
+from .trace import tracing_enabled
+from .workers import queue_spec, ProgressReport
+
+PROCESSES = 'processes'
+CPU_SLOTS = 'cpu_slots'
+
+
+def chain_demand(steps):
+    """(processes, cpu slots) used by a chain of steps"""
+    processes, cpu_slots = 0, 1
+    for step in steps:
+        if 'branches' in step:
+            branches = [chain_demand(branch) for branch in step['branches']]
+            processes += 1 + sum(branch_processes for branch_processes, _ in branches)
+            cpu_slots = max(cpu_slots, sum(branch_slots for _, branch_slots in branches))
+        elif step.get('parallelism', 1) > 1:
+            processes += step['parallelism'] + 2
+            cpu_slots = max(cpu_slots, step['parallelism'])
+        else:
+            processes += 1
+    return processes, cpu_slots
+
+
+def pipeline_demand(pipeline_steps):
+    processes, cpu_slots = chain_demand(pipeline_steps)
+    return {PROCESSES: processes + 1, CPU_SLOTS: cpu_slots}
+
+
+class ExecutionLimits(object):
+    """
+    Global limits on the resources used by the pipelines running at once (None means no limit).
+    Pipelines wait until their share is available.
+    """
+
+    def __init__(self, max_processes=None, cpu_slots=None):
+        self.limits = {PROCESSES: max_processes, CPU_SLOTS: cpu_slots}
+        self.in_use = {PROCESSES: 0, CPU_SLOTS: 0}
+        self._condition = None
+
+    def share(self, demand):
+        """The share of each resource taken by a pipeline with the given demand"""
+        return dict((resource, amount if self.limits[resource] is None else min(amount, self.limits[resource]))
+                    for resource, amount in demand.items())
+
+    def fits(self, share):
+        return all(self.limits[resource] is None or self.in_use[resource] + amount <= self.limits[resource]
+                   for resource, amount in share.items())
+
+    @property
+    def condition(self):
+        # Created on first use, so that it's bound to the running loop
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    async def acquire(self, demand):
+        """Waits until the share of `demand` is available and takes it, returns the share"""
+        share = self.share(demand)
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.fits(share))
+            for resource, amount in share.items():
+                self.in_use[resource] += amount
+        return share
+
+    async def release(self, share):
+        async with self.condition:
+            for resource, amount in share.items():
+                self.in_use[resource] -= amount
+            self.condition.notify_all()
+
+
+async def run_spec(spec, status_manager, use_cache, limits, progress_cb=None, queued=None, resume=False):
+    """Runs a pipeline within `limits`, returns (pipeline_id, success, stats, errors)"""
+    pipeline_id = spec.pipeline_id
+    eid = queue_spec(spec, status_manager)
+    if eid is None:
+        return pipeline_id, False, None, ['Already Running']
+
+    row_count = 0
+
+    def report_progress(rows):
+        nonlocal row_count
+        row_count = rows
+        if progress_cb is not None:
+            progress_cb(ProgressReport(pipeline_id, rows, None, None, None))
+
+    dispatched = time.time() if queued is not None else None
+    share = await limits.acquire(pipeline_demand(spec.pipeline_details.get('pipeline', [])))
+    try:
+        success, stats, errors = \
+            await async_execute_spec(spec, eid,
+                                     use_cache=use_cache,
+                                     progress_cb=report_progress,
+                                     queued=queued,
+                                     dispatched=dispatched,
+                                     resume=resume)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:  # noqa
+        logging.exception('Failed to execute %s', pipeline_id)
+        success, stats, errors = False, None, ['Crashed', repr(e)]
+    finally:
+        await limits.release(share)
+
+    if progress_cb is not None:
+        progress_cb(ProgressReport(pipeline_id, row_count, success, errors, stats))
+    return pipeline_id, success, stats, errors
+
+
+async def async_run_specs(all_specs, status_manager, use_cache, concurrency, limits, results,
+                          progress_cb=None, resume=False):
+    """
+    Runs the specs yielded by `all_specs` (see runner.specs_to_execute) as they become ready,
+    appending (pipeline_id, success, stats, errors) to `results` as they complete.
+    """
+    running = {}
+    completed = []
+    queued = time.time() if tracing_enabled() else None
+
+    async def wait_for_completion():
+        done, _ = await asyncio.wait(list(running), return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            del running[task]
+            result = task.result()
+            results.append(result)
+            completed.append(result[0])
+
+    try:
+        while True:
+            if len(completed) == 0 and len(running) >= concurrency:
+                # Only pick the next pipeline once there's room for it, so that it's the most urgent one
+                await wait_for_completion()
+
+            done = completed.pop() if len(completed) > 0 else None
+            try:
+                spec = all_specs.send(done)
+            except StopIteration:
+                spec = None
+
+            if spec is None:
+                if len(completed) > 0:
+                    continue
+                if len(running) > 0:
+                    await wait_for_completion()
+                    continue
+                break
+
+            if len(spec.validation_errors) > 0:
+                results.append((spec.pipeline_id, False, {},
+                                ['init'] + list(map(str, spec.validation_errors))))
+                continue
+
+            task = asyncio.ensure_future(run_spec(spec, status_manager, use_cache, limits,
+                                                  progress_cb, queued, resume))
+            running[task] = spec.pipeline_id
+
+    except asyncio.CancelledError:
+        for task in running:
+            task.cancel()
+        if len(running) > 0:
+            await asyncio.wait(list(running))
+        raise
+
+
+def run_specs(all_specs, status_manager, use_cache, concurrency,
+              max_processes=None, cpu_slots=None, progress_cb=None, resume=False):
+    """
+    Runs the specs yielded by `all_specs` on the current event loop.
+    Returns a list of (pipeline_id, success, stats, errors), of the pipelines which completed.
+    """
+    results = []
+    limits = ExecutionLimits(max_processes, cpu_slots)
+    loop = asyncio.get_event_loop()
+    main_task = asyncio.ensure_future(async_run_specs(all_specs, status_manager, use_cache,
+                                                      concurrency, limits, results, progress_cb,
+                                                      resume))
+    try:
+        loop.run_until_complete(main_task)
+    except KeyboardInterrupt:
+        logging.info("Caught keyboard interrupt. Cancelling tasks...")
+        main_task.cancel()
+        try:
+            loop.run_until_complete(main_task)
+        except asyncio.CancelledError:
+            pass
+        logging.info("Caught keyboard interrupt. DONE!")
+    return results
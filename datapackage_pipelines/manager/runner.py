@@ -1,95 +1,22 @@
-import sys
-import os
-import json
+import time
 import concurrent
-import subprocess
 import threading
 from queue import Queue
 
 from collections import namedtuple
 
-from ..utilities.execution_id import gen_execution_id
-
 from ..specs import pipelines, PipelineSpec #noqa
 from ..status import status_mgr
-from ..lib.internal.sink import SINK_MAGIC
-from .tasks import execute_pipeline, finalize
+from .tasks import finalize
+from .execution_graph import ExecutionGraph
+from .workers import execute_spec, worker_execute_pipeline, ProgressReport  # noqa
+from .loop_runner import run_specs
+from .trace import tracing_enabled
 
 
 ExecutionResult = namedtuple('ExecutionResult',
                              ['pipeline_id', 'success', 'stats', 'errors'])
 
-ProgressReport = namedtuple('ProgressReport',
-                            ['pipeline_id', 'row_count', 'success', 'errors', 'stats'])
-
-MAGIC = 'INFO    :(sink): '+SINK_MAGIC
-
-
-def remote_execute_pipeline(spec, root_dir, use_cache, verbose, progress_report_queue):
-    args = ['dpp',
-            'run',
-            '--slave',
-            '--use-cache' if use_cache else '--no-use-cache',
-            spec.pipeline_id]
-    popen = subprocess.Popen(args, encoding='utf8',
-                             stderr=subprocess.PIPE,
-                             stdout=subprocess.DEVNULL,
-                             env=os.environ.copy(),
-                             cwd=root_dir)
-    progress = 0
-    lines = []
-    for line in popen.stderr:
-        if len(line) == 0:
-            continue
-        if line.startswith(MAGIC):
-            if progress_report_queue is not None:
-                progress = int(line[len(MAGIC):].strip())
-                progress_report_queue.put(ProgressReport(spec.pipeline_id, progress, None, None, None))
-            continue
-        while len(lines) > 0:
-            log = lines.pop(0)
-            if verbose:
-                sys.stderr.write('[%s:%s] >>> %s' %
-                                 (spec.pipeline_id, threading.current_thread().name, log))
-        lines.append(line)
-    if len(lines) > 0:
-        results = lines.pop(0)
-    else:
-        if progress_report_queue is not None:
-            progress_report_queue.put(ProgressReport(spec.pipeline_id,
-                                                     progress,
-                                                     False,
-                                                     ['Empty'],
-                                                     None
-                                                     ))
-        return (spec.pipeline_id, False, {}, ['Empty'])
-    try:
-        results = json.loads(results)
-        if progress_report_queue is not None:
-            progress_report_queue.put(ProgressReport(spec.pipeline_id,
-                                                     progress,
-                                                     results[0]['success'],
-                                                     results[0]['errors'],
-                                                     results[0]['stats']
-                                                     ))
-    except json.decoder.JSONDecodeError:
-        if verbose:
-            sys.stderr.write('[%s:%s] >>> %s' % (spec.pipeline_id, threading.current_thread().name, results))
-        if progress_report_queue is not None:
-            progress_report_queue.put(ProgressReport(spec.pipeline_id,
-                                                     progress,
-                                                     False,
-                                                     ['Crashed', results],
-                                                     None
-                                                     ))
-        return (spec.pipeline_id, False, {}, [results])
-
-    results = results[0]
-    return (spec.pipeline_id,
-            results['success'],
-            results['stats'],
-            results['errors'])
-
 
 def progress_report_handler(callback, queue):
     while True:
@@ -112,48 +39,30 @@ def match_pipeline_id(arg, pipeline_id):
 
 
 def specs_to_execute(argument, root_dir, status_manager, ignore_missing_deps, dirty, results):
+    """
+    Yields the specs of the pipelines to execute, once they're ready to run (or None, if none is
+    ready until a running pipeline completes). The id of each completed pipeline is sent back.
+    """
 
-    pending = set()
-    executed = set()
-    completed = set()
+    def selected():
+        for spec in pipelines(ignore_missing_deps=ignore_missing_deps,
+                              root_dir=root_dir, status_manager=status_manager):
+            if match_pipeline_id(argument, spec.pipeline_id):
 
-    for spec in pipelines(ignore_missing_deps=ignore_missing_deps,
-                          root_dir=root_dir, status_manager=status_manager):
-        if match_pipeline_id(argument, spec.pipeline_id):
+                # If only dirty was requested
+                if dirty:
+                    ps = status_manager.get(spec.pipeline_id)
+                    if not ps.dirty():
+                        continue
 
-            # If only dirty was requested
-            if dirty:
-                ps = status_manager.get(spec.pipeline_id)
-                if not ps.dirty():
-                    continue
+                yield spec
 
-            pending.add(spec.pipeline_id)
+    graph = ExecutionGraph(selected(), status_manager)
 
-    while len(pending) > 0:
-        to_yield = None
-        for spec in pipelines(ignore_missing_deps=ignore_missing_deps,
-                              root_dir=root_dir, status_manager=status_manager):
-            pipeline_id = spec.pipeline_id
-            if pipeline_id not in pending:
-                continue
-
-            unresolved = set(spec.dependencies) - completed
-            if len(unresolved) == 0:
-                to_yield = spec
-                break
-
-            unresolved = unresolved - executed - pending
-            if len(unresolved) > 0:
-                # No point in waiting for dependencies that will never be resolved
-                to_yield = spec
-                break
-
-        if to_yield is not None:
-            executed.add(to_yield.pipeline_id)
-            pending.remove(to_yield.pipeline_id)
-        completed_pipeline_id = yield(to_yield)
+    while len(graph) > 0:
+        completed_pipeline_id = yield(graph.pop_ready())
         if completed_pipeline_id is not None:
-            completed.add(completed_pipeline_id)
+            graph.complete(completed_pipeline_id)
 
     yield None
 
@@ -166,10 +75,31 @@ def run_pipelines(pipeline_id_pattern,
                   concurrency=1,
                   verbose_logs=True,
                   progress_cb=None,
-                  slave=False):
+                  slave=False,
+                  in_process=False,
+                  max_processes=None,
+                  cpu_slots=None,
+                  resume=False,
+                  fork_server=False):
     """Run a pipeline by pipeline-id.
        pipeline-id supports the '%' wildcard for any-suffix matching.
-       Use 'all' or '%' for running all pipelines"""
+       Use 'all' or '%' for running all pipelines.
+       With `in_process`, pipelines run concurrently on this process's event loop, using at most
+       `max_processes` step processes and `cpu_slots` CPU slots at once (see loop_runner.py).
+       With `resume`, pipelines whose previous execution failed restart from their latest checkpoint
+       (see checkpoints.py).
+       With `fork_server`, concurrent pipelines run in workers forked from a fork server, which
+       import the `__main__` module of this process - so it must be guarded by
+       `if __name__ == '__main__'` (see workers.py)"""
+    if in_process:
+        status_manager = status_mgr(root_dir)
+        results = []
+        all_specs = specs_to_execute(pipeline_id_pattern, root_dir, status_manager, force, dirty, results)
+        results.extend(ExecutionResult(*result)
+                       for result in run_specs(all_specs, status_manager, use_cache, concurrency,
+                                               max_processes, cpu_slots, progress_cb, resume))
+        return results
+
     with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency,
                                                thread_name_prefix='T') as executor:
         try:
@@ -177,9 +107,12 @@ def run_pipelines(pipeline_id_pattern,
             pending_futures = set()
             done_futures = set()
             finished_futures = []
+            # Pipelines executed in this process, which weren't reported as completed yet
+            executed_locally = []
             progress_thread = None
             progress_queue = None
             status_manager = status_mgr(root_dir)
+            queued = time.time() if tracing_enabled() else None
 
             if progress_cb is not None:
                 progress_queue = Queue()
@@ -190,11 +123,19 @@ def run_pipelines(pipeline_id_pattern,
 
             while True:
 
+                if not slave and len(done_futures) == 0 and len(pending_futures) >= concurrency:
+                    # Only pick the next pipeline once a worker is free, so that it's the most urgent one
+                    done_futures, pending_futures = \
+                        concurrent.futures.wait(pending_futures,
+                                                return_when=concurrent.futures.FIRST_COMPLETED)
+
                 done = None
                 if len(done_futures) > 0:
                     done = done_futures.pop()
                     finished_futures.append(done)
                     done = done.result()[0]
+                elif len(executed_locally) > 0:
+                    done = executed_locally.pop()
 
                 try:
                     spec = all_specs.send(done)
@@ -224,40 +165,20 @@ def run_pipelines(pipeline_id_pattern,
                     continue
 
                 if slave:
-                    # Set environment variables for the pipeline
-                    for key, value in spec.environment.items():
-                        os.environ[key] = str(value)
-                    ps = status_manager.get(spec.pipeline_id)
-                    ps.init(spec.pipeline_details,
-                            spec.source_details,
-                            spec.validation_errors,
-                            spec.cache_hash)
-                    eid = gen_execution_id()
-                    if ps.queue_execution(eid, 'manual'):
-                        success, stats, errors = \
-                            execute_pipeline(spec, eid,
-                                             use_cache=use_cache)
-                        results.append(ExecutionResult(
-                            spec.pipeline_id,
-                            success,
-                            stats,
-                            errors
-                        ))
-                    else:
-                        results.append(
-                            ExecutionResult(spec.pipeline_id,
-                                            False,
-                                            None,
-                                            ['Already Running'])
-                        )
+                    results.append(ExecutionResult(*execute_spec(spec, status_manager, use_cache,
+                                                                 resume=resume)))
+                    executed_locally.append(spec.pipeline_id)
 
                 else:
-                    f = executor.submit(remote_execute_pipeline,
+                    f = executor.submit(worker_execute_pipeline,
                                         spec,
                                         root_dir,
                                         use_cache,
                                         verbose_logs,
-                                        progress_queue)
+                                        progress_queue,
+                                        queued,
+                                        resume,
+                                        fork_server)
                     pending_futures.add(f)
 
             for f in finished_futures:
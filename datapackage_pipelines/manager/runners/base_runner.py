@@ -1,3 +1,6 @@
+import asyncio
+
+
 class BaseRunner(object):
 
     def __init__(self, name, parameters):
@@ -6,3 +9,23 @@ class BaseRunner(object):
 
     def get_execution_args(self, step, cwd, idx):
         raise NotImplementedError()
+
+    def supports_framing(self, step):
+        return False
+
+    def supports_replication(self, step):
+        return False
+
+    async def create_process(self, args, cwd, wfd, rfd, env=None, pass_fds=()):
+        pass_fds = {rfd, wfd, *pass_fds}
+        if None in pass_fds:
+            pass_fds.remove(None)
+        rfd = asyncio.subprocess.PIPE if rfd is None else rfd
+        wfd = asyncio.subprocess.DEVNULL if wfd is None else wfd
+        return await asyncio.create_subprocess_exec(*args,
+                                                    stdin=rfd,
+                                                    stdout=wfd,
+                                                    stderr=asyncio.subprocess.PIPE,
+                                                    pass_fds=pass_fds,
+                                                    cwd=cwd,
+                                                    env=env)
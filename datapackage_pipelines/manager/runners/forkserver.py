@@ -0,0 +1,143 @@
+import os
+import sys
+import json
+import socket
+import atexit
+import asyncio
+import logging
+import tempfile
+import threading
+import subprocess
+
+from .local_python import LocalPythonRunner
+from .forkserver_main import LENGTH
+
+FORKSERVER_MAIN = os.path.join(os.path.dirname(__file__), 'forkserver_main.py')
+DEFAULT_PRELOAD = [
+    'datapackage_pipelines.wrapper',
+    'datapackage_pipelines.utilities.flow_utils',
+    'tableschema',
+    'datapackage',
+    'dataflows',
+    'requests',
+]
+
+
+class ForkServer(object):
+    """A warm process with all common modules imported, forking processors on request"""
+
+    def __init__(self, preload):
+        self.socket_dir = tempfile.mkdtemp(prefix='dpp-forkserver-')
+        self.socket_path = os.path.join(self.socket_dir, 'socket')
+        self.process = subprocess.Popen([sys.executable, FORKSERVER_MAIN, self.socket_path] + list(preload),
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        if self.process.stdout.readline() != b'ready\n':
+            raise RuntimeError('Failed to start fork server')
+        atexit.register(self.stop)
+
+    def alive(self):
+        return self.process.poll() is None
+
+    def stop(self):
+        if self.alive():
+            self.process.stdin.close()
+            self.process.wait()
+        try:
+            os.unlink(self.socket_path)
+            os.rmdir(self.socket_dir)
+        except OSError:
+            pass
+
+    def fork(self, args, cwd, fds, env):
+        """Run a processor with the given stdin, stdout and stderr, returns a connected socket and its pid"""
+        request = json.dumps(dict(args=args, cwd=os.path.abspath(cwd), env=env)).encode('utf8')
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            conn.connect(self.socket_path)
+            socket.send_fds(conn, [LENGTH.pack(len(request))], fds)
+            conn.sendall(request)
+            pid = b''
+            while not pid.endswith(b'\n'):
+                chunk = conn.recv(1)
+                if chunk == b'':
+                    raise RuntimeError('Fork server failed to start %s' % args[0])
+                pid += chunk
+        except Exception:
+            conn.close()
+            raise
+        return conn, int(pid)
+
+
+class ForkedProcess(object):
+    """Quacks like the asyncio Process objects used by the manager"""
+
+    def __init__(self, pid, conn, stdin, stderr):
+        self.pid = pid
+        self.conn = conn
+        self.stdin = stdin
+        self.stderr = stderr
+        self.returncode = None
+
+    async def wait(self):
+        if self.returncode is None:
+            reader, writer = await asyncio.open_unix_connection(sock=self.conn)
+            line = await reader.readline()
+            writer.close()
+            if line == b'':
+                logging.error('Fork server disappeared while running process %d', self.pid)
+                self.returncode = 1
+            else:
+                self.returncode = int(line)
+        return self.returncode
+
+    def kill(self):
+        if self.returncode is not None:
+            raise ProcessLookupError()
+        os.kill(self.pid, 9)
+
+
+class ForkServerRunner(LocalPythonRunner):
+    """
+    Runs processors exactly like the LocalPythonRunner, but forks them from a warm process
+    which already imported all common modules (listed in the `preload` parameter), instead
+    of starting a new interpreter for each step.
+    """
+
+    _servers = {}
+    _lock = threading.Lock()
+
+    def _server(self):
+        preload = tuple((self.parameters or {}).get('preload', DEFAULT_PRELOAD))
+        with self._lock:
+            server = self._servers.get(preload)
+            if server is None or not server.alive():
+                server = self._servers[preload] = ForkServer(preload)
+            return server
+
+    async def create_process(self, args, cwd, wfd, rfd, env=None, pass_fds=()):
+        if not hasattr(socket, 'send_fds') or not hasattr(os, 'fork') or pass_fds:
+            return await super().create_process(args, cwd, wfd, rfd, env, pass_fds)
+
+        to_close = []
+        stdin = None
+        if rfd is None:
+            rfd, stdin_w = os.pipe()
+            to_close.append(rfd)
+            stdin = os.fdopen(stdin_w, 'wb')
+        if wfd is None:
+            wfd = os.open(os.devnull, os.O_WRONLY)
+            to_close.append(wfd)
+        stderr_r, stderr_w = os.pipe()
+        to_close.append(stderr_w)
+
+        try:
+            conn, pid = self._server().fork(args[1:], cwd, [rfd, wfd, stderr_w],
+                                            dict(os.environ) if env is None else env)
+        finally:
+            for fd in to_close:
+                os.close(fd)
+
+        stderr = asyncio.StreamReader(limit=2**16)
+        await asyncio.get_event_loop().connect_read_pipe(lambda: asyncio.StreamReaderProtocol(stderr),
+                                                         os.fdopen(stderr_r, 'rb', buffering=0))
+        return ForkedProcess(pid, conn, stdin, stderr)
@@ -0,0 +1,148 @@
+"""
+A fork server for running processors.
+
+This script is started by the ForkServerRunner with the path of a unix socket to listen on,
+followed by a list of modules to import in advance. For each connection it receives:
+
+- a 4 byte length along with three file descriptors (stdin, stdout and stderr for the processor),
+- a JSON request of that length, containing the processor's `args`, `cwd` and `env`.
+
+It then forks a child which runs the processor exactly like `python <args>` would, sends
+back the child's pid (as a line of text), and once the child exits - its exit code.
+A child never returns to the server's loop: it exits by raising SystemExit out of it.
+
+The server exits when its stdin is closed.
+"""
+import os
+import sys
+import json
+import runpy
+import socket
+import signal
+import struct
+import logging
+import importlib
+import selectors
+import traceback
+
+LENGTH = struct.Struct('>I')
+
+
+def recv_exactly(conn, size):
+    data = b''
+    while len(data) < size:
+        chunk = conn.recv(size - len(data))
+        if chunk == b'':
+            raise EOFError()
+        data += chunk
+    return data
+
+
+def run_child(request, fds):
+    for target, fd in enumerate(fds):
+        os.dup2(fd, target)
+        os.close(fd)
+
+    os.chdir(request['cwd'])
+    os.environ.clear()
+    os.environ.update(request['env'])
+    args = request['args']
+    sys.argv = list(args)
+    sys.path[0] = os.path.dirname(os.path.abspath(args[0]))
+
+    try:
+        runpy.run_path(args[0], run_name='__main__')
+    except SystemExit:
+        raise
+    except BaseException:  # noqa
+        traceback.print_exc()
+        sys.exit(1)
+    # The child leaves the server's loop by exiting, so that the interpreter shuts down just like it
+    # would after `python <args>` (waiting for threads, running atexit handlers and flushing output)
+    sys.exit(0)
+
+
+def serve(socket_path, preload):
+    for module in preload:
+        try:
+            importlib.import_module(module)
+        except Exception:  # noqa
+            logging.exception('Failed to preload %s', module)
+
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(socket_path)
+    listener.listen(64)
+
+    # Ctrl-C is handled by the manager, and the processors themselves
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    wakeup_r, wakeup_w = os.pipe()
+    os.set_blocking(wakeup_w, False)
+    signal.set_wakeup_fd(wakeup_w)
+    signal.signal(signal.SIGCHLD, lambda *_: None)
+
+    children = {}
+    selector = selectors.DefaultSelector()
+    selector.register(listener, selectors.EVENT_READ, 'accept')
+    selector.register(wakeup_r, selectors.EVENT_READ, 'reap')
+    selector.register(sys.stdin.fileno(), selectors.EVENT_READ, 'control')
+
+    # Let the runner know we're ready, and make sure children start with a clean stdout
+    sys.stdout.write('ready\n')
+    sys.stdout.flush()
+    devnull = os.open(os.devnull, os.O_RDWR)
+    os.dup2(devnull, sys.stdout.fileno())
+    os.close(devnull)
+
+    while True:
+        for key, _ in selector.select():
+            if key.data == 'control':
+                if os.read(sys.stdin.fileno(), 1024) == b'':
+                    return
+            elif key.data == 'reap':
+                os.read(wakeup_r, 1024)
+                while len(children) > 0:
+                    try:
+                        pid, status = os.waitpid(-1, os.WNOHANG)
+                    except ChildProcessError:
+                        break
+                    if pid == 0:
+                        break
+                    conn = children.pop(pid, None)
+                    if conn is not None:
+                        try:
+                            conn.sendall(b'%d\n' % os.waitstatus_to_exitcode(status))
+                        except OSError:
+                            pass
+                        conn.close()
+            elif key.data == 'accept':
+                conn, _ = listener.accept()
+                try:
+                    msg, fds, _, _ = socket.recv_fds(conn, LENGTH.size, 3)
+                    request = json.loads(recv_exactly(conn, LENGTH.unpack(msg)[0]).decode('utf8'))
+                except (OSError, EOFError, ValueError, struct.error):
+                    logging.exception('Bad request')
+                    conn.close()
+                    continue
+
+                pid = os.fork()
+                if pid == 0:
+                    selector.close()
+                    listener.close()
+                    conn.close()
+                    for other in children.values():
+                        other.close()
+                    signal.set_wakeup_fd(-1)
+                    os.close(wakeup_r)
+                    os.close(wakeup_w)
+                    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                    signal.signal(signal.SIGINT, signal.default_int_handler)
+                    run_child(request, fds)
+
+                for fd in fds:
+                    os.close(fd)
+                children[pid] = conn
+                conn.sendall(b'%d\n' % pid)
+
+
+if __name__ == '__main__':
+    serve(sys.argv[1], sys.argv[2:])
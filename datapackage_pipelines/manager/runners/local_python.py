@@ -3,6 +3,7 @@ import sys
 import shlex
 
 from ...utilities.extended_json import json
+from ...utilities.framing import JSON_FRAMING
 from .base_runner import BaseRunner
 
 
@@ -15,9 +16,17 @@ class LocalPythonRunner(BaseRunner):
             str(idx),
             json.dumps(step.get('parameters', {})),
             str(step.get('validate', False)),
-            step.get('_cache_hash') if step.get('cache') else ''
+            step.get('_cache_hash') if step.get('cache') else '',
+            step.get('__input_framing', JSON_FRAMING),
+            step.get('__output_framing', JSON_FRAMING),
         ]
 
+    def supports_framing(self, step):
+        return step.get('framing') != JSON_FRAMING
+
+    def supports_replication(self, step):
+        return True
+
 
 class WrappedPythonRunner(LocalPythonRunner):
 
@@ -33,3 +42,10 @@ class WrappedPythonRunner(LocalPythonRunner):
                                                 env=os.environ)
         args = shlex.split(cmd)
         return args
+
+    def supports_framing(self, step):
+        # The wrapped environment might run a different version of the wrapper
+        return False
+
+    def supports_replication(self, step):
+        return False
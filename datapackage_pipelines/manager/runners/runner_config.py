@@ -2,6 +2,7 @@ import os
 import yaml
 
 from .local_python import LocalPythonRunner, WrappedPythonRunner
+from .forkserver import ForkServerRunner
 
 
 class RunnerConfiguration(object):
@@ -21,6 +22,7 @@ class RunnerConfiguration(object):
         return {
             'local-python': LocalPythonRunner,
             'wrapped-python': WrappedPythonRunner,
+            'forkserver': ForkServerRunner,
         }.get(kind, LocalPythonRunner)
 
     def get_runner(self, name):
@@ -1,22 +1,44 @@
 import asyncio
-import gzip
 import logging
 import os
-from concurrent.futures import CancelledError
+import sys
+import shutil
+import tempfile
+import time
+from asyncio import CancelledError
 from json.decoder import JSONDecodeError
 
 from ..specs.specs import resolve_executor
 from ..status import status_mgr
 from ..utilities.stat_utils import STATS_DPP_KEY, STATS_OUT_DP_URL_KEY
-from ..utilities.extended_json import json
+from ..utilities.extended_json import json, JSON_CODEC_ENV_VAR
+from ..utilities.framing import JSON_FRAMING, framing_available
+from ..utilities.cache_files import CacheReader, CACHE_CODEC_ENV_VAR
+from ..utilities.validation_cache import VALIDATION_CACHE_ENV_VAR
+from ..utilities.fusion import fuse_flow_steps, FAILED_STEP_MARKER
+from ..utilities.replication import REPLICA_ENV_VAR, ORDERED, UNORDERED
+from ..utilities.step_stats import parse_step_stats, step_stats_enabled, max_rss_stats, STATS_STEPS_KEY, \
+    STATS_LIMITING_STEP_KEY, STATS_MAX_RSS_KEY
+from ..utilities.profiler import profile_mode, collect_profile, PROFILE_ENV_VAR, PROFILE_DIR_ENV_VAR, \
+    PROFILE_ARTIFACT
+from ..utilities.memory_tracing import TRACE_MEMORY_ENV_VAR, TRACE_MEMORY_KEY, traces_memory
+from ..lib.internal.sink import SINK_MAGIC
 
 from .runners import runner_config
+from .backpressure import PipeMonitor, set_pipe_size
+from .trace import Trace, tracing_enabled, TRACE_ARTIFACT
+from .checkpoints import apply_checkpoint_policy, historical_costs, failed_execution_start, \
+    CHECKPOINT_KEY, COST_KEY, STATS_CACHE_HASH_KEY
 
 SINK = os.path.join(os.path.dirname(__file__),
                     '..', 'lib', 'internal', 'sink.py')
+FAN_OUT = os.path.join(os.path.dirname(__file__),
+                       '..', 'lib', 'internal', 'fan_out.py')
+FAN_IN = os.path.join(os.path.dirname(__file__),
+                      '..', 'lib', 'internal', 'fan_in.py')
 
 
-async def enqueue_errors(step, process, queue, debug):
+async def enqueue_errors(step, process, queue, debug, step_stats=None, progress_cb=None):
     out = process.stderr
     errors = []
     while True:
@@ -28,6 +50,13 @@ async def enqueue_errors(step, process, queue, debug):
         if line == b'':
             break
         line = line.decode('utf8').rstrip()
+        reported = parse_step_stats(line)
+        if reported is not None:
+            if step_stats is not None:
+                step_stats.update(reported)
+            continue
+        if progress_cb is not None and line.startswith(SINK_MAGIC):
+            progress_cb(int(line[len(SINK_MAGIC):]))
         if len(line) != 0:
             if len(errors) == 0:
                 if line.startswith('ERROR') or line.startswith('Traceback'):
@@ -36,6 +65,9 @@ async def enqueue_errors(step, process, queue, debug):
                 errors.append(line)
                 if len(errors) > 1000:
                     errors.pop(1)
+                if '__fused' in step and FAILED_STEP_MARKER in line:
+                    # Attribute the failure to the step within the fused step
+                    errors[0] = line.split(FAILED_STEP_MARKER, 1)[1]
             if '__flow' in step:
                 line = "(F) {}: {}".format(step['__flow'], line)
             else:
@@ -43,6 +75,10 @@ async def enqueue_errors(step, process, queue, debug):
             if debug:
                 logging.info(line)
             await queue.put(line)
+    # The process closes stderr when it exits
+    process.end_time = time.time()
+    if step_stats is not None:
+        step_stats['wall_time'] = round(process.end_time - process.start_time, 3)
     return errors
 
 
@@ -93,49 +129,51 @@ async def collect_stats(infile):
     return stats
 
 
-def create_process(args, cwd, wfd, rfd):
-    pass_fds = {rfd, wfd}
-    if None in pass_fds:
-        pass_fds.remove(None)
-    rfd = asyncio.subprocess.PIPE if rfd is None else rfd
-    wfd = asyncio.subprocess.DEVNULL if wfd is None else wfd
-    ret = asyncio.create_subprocess_exec(*args,
-                                         stdin=rfd,
-                                         stdout=wfd,
-                                         stderr=asyncio.subprocess.PIPE,
-                                         pass_fds=pass_fds,
-                                         cwd=cwd)
-    return ret
-
-
 async def process_death_waiter(process):
     return_code = await process.wait()
     return process, return_code
 
 
-def find_caches(pipeline_steps, pipeline_cwd):
-    if not any(step.get('cache') for step in pipeline_steps):
+def find_caches(pipeline_steps, pipeline_cwd, trace=None, checkpoints_since=None):
+    """
+    Skips the steps before the latest step with a valid cache, loading its cache instead.
+    When resuming, checkpoints (see checkpoints.py) written since `checkpoints_since` are used as well.
+    """
+    def reusable(step):
+        return step.get('cache') or (checkpoints_since is not None and step.get(CHECKPOINT_KEY))
+
+    if not any(reusable(step) for step in pipeline_steps):
         # If no step requires caching then bail
         return pipeline_steps
 
     for i, step in reversed(list(enumerate(pipeline_steps))):
+        if not reusable(step):
+            continue
         cache_filename = os.path.join(pipeline_cwd,
                                       '.cache',
                                       step['_cache_hash'])
         if os.path.exists(cache_filename):
+            if not step.get('cache') and os.path.getmtime(cache_filename) < checkpoints_since:
+                # A checkpoint of an earlier execution
+                continue
             try:
-                canary = gzip.open(cache_filename, "rt")
-                canary.seek(1)
-                canary.close()
+                with CacheReader(cache_filename) as cache_file:
+                    cache_file.validate()
             except Exception:  #noqa
                 continue
-            logging.info('Found cache for step %d: %s', i, step['run'])
+            kind = 'cache' if step.get('cache') else 'checkpoint'
+            logging.info('Found %s for step %d: %s', kind, i, step['run'])
+            if trace is not None:
+                trace.instant('{} hit: {}'.format(kind, step['run']), category='cache',
+                              step=i, hash=step['_cache_hash'])
             pipeline_steps = pipeline_steps[i+1:]
             step = {
                 'run': 'cache_loader',
                 'parameters': {
                     'load-from': os.path.join('.cache', step['_cache_hash'])
-                }
+                },
+                # Cache files are stored as JSON lines
+                'framing': JSON_FRAMING,
             }
             step['executor'] = resolve_executor(step, '.', [])
             pipeline_steps.insert(0, step)
@@ -144,11 +182,223 @@ def find_caches(pipeline_steps, pipeline_cwd):
     return pipeline_steps
 
 
-async def construct_process_pipeline(pipeline_steps, pipeline_cwd, errors, debug=False):
+async def create_replicas(step, runner, args, cwd, wfd, rfd, env, framings):
+    """
+    Runs `parallelism` replicas of a step, with a fan-out process dealing the incoming rows
+    to the replicas and a fan-in process merging their outputs.
+    Returns a list of (step, process) tuples.
+    """
+    parallelism = step['parallelism']
+    mode = UNORDERED if step.get('unordered') else ORDERED
+    input_framing, output_framing = framings
+    internal_runner = runner_config.get_runner(None)
+    inputs = [os.pipe() for _ in range(parallelism)]
+    outputs = [os.pipe() for _ in range(parallelism)]
+    ret = []
+    try:
+        fds = [fd for _, fd in inputs]
+        process = await internal_runner.create_process(
+            [sys.executable, FAN_OUT, input_framing, mode] + [str(fd) for fd in fds],
+            cwd, None, rfd, env, pass_fds=fds
+        )
+        ret.append((dict(step, run=step['run'] + ' (fan-out)'), process))
+
+        for i, ((replica_rfd, _), (_, replica_wfd)) in enumerate(zip(inputs, outputs)):
+            process = await runner.create_process(args, cwd, replica_wfd, replica_rfd,
+                                                  dict(env, **{REPLICA_ENV_VAR: str(i)}))
+            ret.append((step, process))
+
+        fds = [fd for fd, _ in outputs]
+        devnull = os.open(os.devnull, os.O_RDONLY)
+        try:
+            process = await internal_runner.create_process(
+                [sys.executable, FAN_IN, output_framing, mode] + [str(fd) for fd in fds],
+                cwd, wfd, devnull, env, pass_fds=fds
+            )
+        finally:
+            os.close(devnull)
+        ret.append((dict(step, run=step['run'] + ' (fan-in)'), process))
+    finally:
+        for pipe in inputs + outputs:
+            for fd in pipe:
+                os.close(fd)
+    return ret
+
+
+def negotiate_framing(pipeline_steps, runners, framing, last_framing=JSON_FRAMING):
+    if framing is None or framing == JSON_FRAMING:
+        return [(JSON_FRAMING, JSON_FRAMING)] * len(pipeline_steps)
+    if not framing_available(framing):
+        logging.warning('Framing %s is not available, falling back to %s', framing, JSON_FRAMING)
+        return [(JSON_FRAMING, JSON_FRAMING)] * len(pipeline_steps)
+
+    # The first step is fed by us and the sink is read by us, both in JSON lines.
+    # Any other connection uses the requested framing only if both sides support it
+    capable = [runner.supports_framing(step)
+               for step, runner in zip(pipeline_steps, runners)]
+    edges = [JSON_FRAMING]
+    for current, following in zip(capable, capable[1:]):
+        edges.append(framing if current and following else JSON_FRAMING)
+    edges.append(last_framing if capable[-1] else JSON_FRAMING)
+    return list(zip(edges[:-1], edges[1:]))
+
+
+async def create_branches(step, index, cwd, wfd, rfd, env, framings, framing, debug):
+    """
+    Runs the branches of a step side by side, each as a chain of processes, with a join process
+    feeding them and combining their outputs.
+    Returns a list of (step, process) tuples.
+    """
+    input_framing, output_framing = framings
+    branches = step['branches']
+    inputs = [os.pipe() for _ in branches]
+    outputs = [os.pipe() for _ in branches]
+    # Branches write their output in the framing of the join's output if they can, so it's copied as-is
+    branch_framings = []
+    for branch in branches:
+        last = branch[-1]
+        capable = runner_config.get_runner(last.get('runner')).supports_framing(last)
+        branch_framings.append(output_framing if capable else JSON_FRAMING)
+    config = {
+        'input': input_framing,
+        'output': output_framing,
+        'branches': [
+            {'input': input_wfd, 'output': output_rfd, 'framing': branch_framing}
+            for (_, input_wfd), (output_rfd, _), branch_framing
+            in zip(inputs, outputs, branch_framings)
+        ]
+    }
+    fds = [fd for _, fd in inputs] + [fd for fd, _ in outputs]
+    try:
+        process = await runner_config.get_runner(None).create_process(
+            [sys.executable, step['executor'], json.dumps(config)],
+            cwd, wfd, rfd, env, pass_fds=fds
+        )
+    finally:
+        for fd in fds:
+            os.close(fd)
+    process.args = step['run']
+    process.start_time = time.time()
+    ret = [(step, process)]
+
+    for branch, (input_rfd, _), (_, output_wfd), branch_framing \
+            in zip(branches, inputs, outputs, branch_framings):
+        # Only steps of the pipeline itself are looked up in the cache, so there's no point caching here
+        ret.extend(await create_chain(branch, cwd, input_rfd, output_wfd, env, framing,
+                                      first_index=index, last_framing=branch_framing,
+                                      cache=False, debug=debug))
+    return ret
+
+
+async def create_step_processes(step, runner, index, cwd, wfd, rfd, env, framings, framing,
+                                cache=True, debug=False):
+    """
+    Starts the process(es) of a single step, reading from `rfd` and writing to `wfd`.
+    Returns a list of (step, process) tuples.
+    """
+    if debug:
+        logging.info("- %s", step['run'])
+    if 'branches' in step:
+        return await create_branches(step, index, cwd, wfd, rfd, env, framings, framing, debug)
+
+    input_framing, output_framing = framings
+    parallel = step.get('parallelism', 1) > 1
+    if parallel and not runner.supports_replication(step):
+        logging.warning('Runner of step %s does not support parallelism, running a single process',
+                        step['run'])
+        parallel = False
+    cached = step.get('cache') or step.get(CHECKPOINT_KEY)
+    if parallel and cached:
+        logging.warning('Step %s runs in parallel, so its output will not be cached', step['run'])
+    mode = profile_mode(step)
+    profile_dir = None
+    if mode is not None:
+        profile_dir = tempfile.mkdtemp(prefix='dpp-profile-')
+        env = dict(env, **{PROFILE_ENV_VAR: mode, PROFILE_DIR_ENV_VAR: profile_dir})
+    if step.get(TRACE_MEMORY_KEY):
+        env = dict(env, **{TRACE_MEMORY_ENV_VAR: '1'})
+    args = runner.get_execution_args(dict(step,
+                                          cache=cache and cached and not parallel,
+                                          __input_framing=input_framing,
+                                          __output_framing=output_framing),
+                                     cwd, index)
+    if parallel:
+        step_processes = await create_replicas(step, runner, args, cwd, wfd, rfd, env, framings)
+    else:
+        step_processes = [(step, await runner.create_process(args, cwd, wfd, rfd, env))]
+    for process_step, process in step_processes:
+        process.args = args[1] if process_step is step else process_step['run']
+        process.start_time = time.time()
+        process.profile = (mode, profile_dir) if profile_dir is not None and process_step is step else None
+    return step_processes
+
+
+async def create_chain(steps, cwd, rfd, wfd, env, framing,
+                       first_index=0, last_framing=JSON_FRAMING, cache=True, debug=False, monitor=None):
+    """
+    Starts the processes of consecutive steps, each piped to the next one. The first step reads
+    from `rfd` (or from a pipe, if it's None) and the last one writes to `wfd`.
+    Both are closed once the processes are started. The pipes between the steps are sampled by
+    `monitor`, if given.
+    Returns a list of (step, process) tuples.
+    """
+    runners = [runner_config.get_runner(step.get('runner'))
+               for step in steps]
+    framings = negotiate_framing(steps, runners, framing, last_framing)
+    ret = []
+    for i, (step, runner) in enumerate(zip(steps, runners)):
+        if i < len(steps) - 1:
+            new_rfd, step_wfd = os.pipe()
+        else:
+            new_rfd, step_wfd = None, wfd
+        if step.get('bursty'):
+            # Let the step run further ahead of the next one
+            set_pipe_size(step_wfd)
+
+        step_processes = await create_step_processes(step, runner, first_index + i, cwd, step_wfd, rfd, env,
+                                                     framings[i], framing, cache, debug)
+        if monitor is not None and i > 0:
+            monitor.watch(rfd, steps[i - 1], step, step_processes[0][1])
+        ret.extend(step_processes)
+        os.close(step_wfd)
+        if rfd is not None:
+            os.close(rfd)
+        rfd = new_rfd
+    return ret
+
+
+def collect_profiles(stats_by_process, profiles):
+    """Appends the profile of each profiled step to `profiles`, and removes its temporary directory"""
+    collected = set()
+    for index, (process, step_stats) in enumerate(stats_by_process.items()):
+        profile = getattr(process, 'profile', None)
+        if profile is None or profile[1] in collected:
+            continue
+        mode, profile_dir = profile
+        collected.add(profile_dir)
+        try:
+            step_profile = collect_profile(profile_dir, mode)
+        except Exception as e:  # noqa
+            logging.warning('Failed to collect the profile of %s: %s', step_stats['step'], e)
+            step_profile = None
+        shutil.rmtree(profile_dir, ignore_errors=True)
+        if step_profile is None:
+            logging.warning('Step %s did not write a profile (is it using the wrapper?)', step_stats['step'])
+            continue
+        profiles.append(dict(step_profile, step=step_stats['step'], index=index))
+
+
+async def construct_process_pipeline(pipeline_steps, pipeline_cwd, errors, debug=False,
+                                     framing=None, json_codec=None, cache_codec=None, trace=None,
+                                     profiles=None, trace_memory=False, progress_cb=None,
+                                     environment=None, record_step_stats=False):
     error_collectors = []
     processes = []
+    # Stats reported by each process, see utilities/step_stats.py
+    all_step_stats = []
+    stats_by_process = {}
+    monitor = PipeMonitor()
     error_queue = asyncio.Queue()
-    rfd = None
 
     error_aggregator = \
         asyncio.ensure_future(dequeue_errors(error_queue, errors))
@@ -159,25 +409,35 @@ async def construct_process_pipeline(pipeline_steps, pipeline_cwd, errors, debug
         '_cache_hash': pipeline_steps[-1]['_cache_hash']
     })
 
-    for i, step in enumerate(pipeline_steps):
-
-        new_rfd, wfd = os.pipe()
-
-        if debug:
-            logging.info("- %s", step['run'])
-        runner = runner_config.get_runner(step.get('runner'))
-        args = runner.get_execution_args(step, pipeline_cwd, i)
-        process = await create_process(args, pipeline_cwd, wfd, rfd)
-        process.args = args[1]
-        if wfd is not None:
-            os.close(wfd)
-        if rfd is not None:
-            os.close(rfd)
-
+    # Shared by all steps, so that each datapackage descriptor is validated only once
+    validation_cache_dir = tempfile.mkdtemp(prefix='dpp-validation-')
+    env_overrides = {VALIDATION_CACHE_ENV_VAR: validation_cache_dir}
+    if json_codec is not None:
+        env_overrides[JSON_CODEC_ENV_VAR] = json_codec
+    if cache_codec is not None:
+        env_overrides[CACHE_CODEC_ENV_VAR] = cache_codec
+    if trace_memory:
+        env_overrides[TRACE_MEMORY_ENV_VAR] = '1'
+    env = dict(os.environ)
+    if environment is not None:
+        env.update((key, str(value)) for key, value in environment.items())
+    env.update(env_overrides)
+
+    rfd, wfd = os.pipe()
+    step_processes = await create_chain(pipeline_steps, pipeline_cwd, None, wfd, env, framing,
+                                        debug=debug, monitor=monitor)
+    monitor.start()
+    for process_step, process in step_processes:
         processes.append(process)
-        rfd = new_rfd
+        step_stats = {'step': process_step['run']}
+        if process_step['executor'] != SINK and '_cache_hash' in process_step:
+            step_stats[STATS_CACHE_HASH_KEY] = process_step['_cache_hash']
+        all_step_stats.append(step_stats)
+        stats_by_process[process] = step_stats
         error_collectors.append(
-            asyncio.ensure_future(enqueue_errors(step, process, error_queue, debug))
+            asyncio.ensure_future(enqueue_errors(process_step, process, error_queue, debug,
+                                                 step_stats,
+                                                 progress_cb if process_step['executor'] == SINK else None))
         )
 
     error_collectors.append(
@@ -186,13 +446,40 @@ async def construct_process_pipeline(pipeline_steps, pipeline_cwd, errors, debug
 
     def wait_for_finish(_error_collectors,
                         _error_queue,
-                        _error_aggregator):
+                        _error_aggregator,
+                        _validation_cache_dir,
+                        _all_step_stats,
+                        _stats_by_process,
+                        _monitor,
+                        _trace,
+                        _profiles,
+                        _record_step_stats):
         async def _func(failed_index=None):
             *errors, count = await asyncio.gather(*_error_collectors)
+            shutil.rmtree(_validation_cache_dir, ignore_errors=True)
+            await _monitor.stop()
             if failed_index is not None:
                 errors = errors[failed_index]
             else:
                 errors = None
+            for edge in _monitor.edges:
+                _stats_by_process[edge.reader_process]['input_pipe'] = edge.stats()
+            if _trace is not None:
+                for index, (process, step_stats) in enumerate(_stats_by_process.items()):
+                    _trace.process(index, step_stats, process.start_time, process.end_time)
+            if _profiles is not None:
+                collect_profiles(_stats_by_process, _profiles)
+            if isinstance(count, dict):
+                count.setdefault(STATS_DPP_KEY, {})[STATS_MAX_RSS_KEY] = max_rss_stats(_all_step_stats)
+            if _record_step_stats:
+                limiting_step, reason = _monitor.limiting_step(_all_step_stats)
+                if limiting_step is not None:
+                    logging.info('Limiting step: %s (%s)', limiting_step, reason)
+                if isinstance(count, dict):
+                    dpp_stats = count.setdefault(STATS_DPP_KEY, {})
+                    dpp_stats[STATS_STEPS_KEY] = _all_step_stats
+                    if limiting_step is not None:
+                        dpp_stats[STATS_LIMITING_STEP_KEY] = limiting_step
             await _error_queue.put(None)
             await _error_aggregator
             return count, errors
@@ -201,7 +488,14 @@ async def construct_process_pipeline(pipeline_steps, pipeline_cwd, errors, debug
     return processes, \
         wait_for_finish(error_collectors,
                         error_queue,
-                        error_aggregator)
+                        error_aggregator,
+                        validation_cache_dir,
+                        all_step_stats,
+                        stats_by_process,
+                        monitor,
+                        trace,
+                        profiles,
+                        record_step_stats)
 
 
 async def async_execute_pipeline(pipeline_id,
@@ -211,7 +505,18 @@ async def async_execute_pipeline(pipeline_id,
                                  execution_id,
                                  use_cache,
                                  dependencies,
-                                 debug):
+                                 debug,
+                                 framing=None,
+                                 json_codec=None,
+                                 cache_codec=None,
+                                 fuse=False,
+                                 trace=None,
+                                 trace_memory=False,
+                                 progress_cb=None,
+                                 environment=None,
+                                 checkpoint=None,
+                                 resume=False,
+                                 record_step_stats=False):
 
     if debug:
         logging.info("%s Async task starting", execution_id[:8])
@@ -219,19 +524,30 @@ async def async_execute_pipeline(pipeline_id,
     if not ps.start_execution(execution_id):
         logging.info("%s START EXECUTION FAILED %s, BAILING OUT", execution_id[:8], pipeline_id)
         return False, {}, []
+    start_time = time.time()
+    if trace is not None:
+        trace.waits(start_time)
 
     ps.update_execution(execution_id, [])
 
+    if checkpoint is not None:
+        pipeline_steps = apply_checkpoint_policy(pipeline_steps, checkpoint, historical_costs(ps))
     if use_cache:
         if debug:
             logging.info("%s Searching for existing caches", execution_id[:8])
-        pipeline_steps = find_caches(pipeline_steps, pipeline_cwd)
+        pipeline_steps = find_caches(pipeline_steps, pipeline_cwd, trace,
+                                     failed_execution_start(ps, execution_id) if resume else None)
+    if fuse:
+        pipeline_steps = fuse_flow_steps(pipeline_steps)
     execution_log = []
+    profiles = []
 
     if debug:
         logging.info("%s Building process chain:", execution_id[:8])
     processes, stop_error_collecting = \
-        await construct_process_pipeline(pipeline_steps, pipeline_cwd, execution_log, debug)
+        await construct_process_pipeline(pipeline_steps, pipeline_cwd, execution_log, debug,
+                                         framing, json_codec, cache_codec, trace, profiles,
+                                         trace_memory, progress_cb, environment, record_step_stats)
 
     processes[0].stdin.write(json.dumps(dependencies).encode('utf8') + b'\n')
     processes[0].stdin.write(b'{"name": "_", "resources": []}\n')
@@ -288,22 +604,36 @@ async def async_execute_pipeline(pipeline_id,
 
     ps.update_execution(execution_id, execution_log, hooks=True)
     ps.finish_execution(execution_id, success, stats, error_log)
+    if trace is not None:
+        trace.complete('execution', start_time, time.time(), success=success)
+        ps.save_execution_artifact(execution_id, TRACE_ARTIFACT, trace.to_dict())
+    if len(profiles) > 0:
+        ps.save_execution_artifact(execution_id, PROFILE_ARTIFACT, profiles)
 
     logging.info("%s DONE %s %s %r", execution_id[:8], 'V' if success else 'X', pipeline_id, stats)
 
     return success, stats, error_log
 
 
-def execute_pipeline(spec,
-                     execution_id,
-                     trigger='manual',
-                     use_cache=True):
+async def async_execute_spec(spec,
+                             execution_id,
+                             trigger='manual',
+                             use_cache=True,
+                             progress_cb=None,
+                             queued=None,
+                             dispatched=None,
+                             resume=False):
+    """
+    Runs a pipeline on the current event loop, returns (success, stats, errors).
+    `progress_cb`, if given, is called with the number of rows which reached the end of the pipeline.
+    `queued` and `dispatched` are the times the pipeline was queued and handed out for execution,
+    for the execution trace.
+    With `resume`, a pipeline whose previous execution failed restarts from its latest checkpoint.
+    """
 
     debug = trigger == 'manual' or os.environ.get('DPP_DEBUG')
     logging.info("%s RUNNING %s", execution_id[:8], spec.pipeline_id)
 
-    loop = asyncio.get_event_loop()
-
     if debug:
         logging.info("%s Collecting dependencies", execution_id[:8])
     dependencies = {}
@@ -316,20 +646,54 @@ def execute_pipeline(spec,
                 if result_dp is not None:
                     dependencies[dep_pipeline_id] = result_dp
 
+    checkpoint = spec.pipeline_details.get(CHECKPOINT_KEY)
+    # A checkpoint policy by cost relies on the step stats of previous executions,
+    # and the results of memory tracing are part of the step stats
+    record_step_stats = step_stats_enabled() or (checkpoint is not None and COST_KEY in checkpoint) or \
+        traces_memory(spec.pipeline_details)
+
     if debug:
         logging.info("%s Running async task", execution_id[:8])
 
+    return await async_execute_pipeline(spec.pipeline_id,
+                                        spec.pipeline_details.get('pipeline', []),
+                                        spec.path,
+                                        trigger,
+                                        execution_id,
+                                        use_cache,
+                                        dependencies,
+                                        debug,
+                                        spec.pipeline_details.get('framing'),
+                                        spec.pipeline_details.get('json-codec'),
+                                        spec.pipeline_details.get('cache-codec'),
+                                        spec.pipeline_details.get('fuse', False),
+                                        Trace(spec.pipeline_id, queued, dispatched) if tracing_enabled() else None,
+                                        spec.pipeline_details.get(TRACE_MEMORY_KEY, False),
+                                        progress_cb,
+                                        spec.environment,
+                                        checkpoint,
+                                        resume,
+                                        record_step_stats)
+
+
+def execute_pipeline(spec,
+                     execution_id,
+                     trigger='manual',
+                     use_cache=True,
+                     progress_cb=None,
+                     resume=False):
+    """
+    Runs a pipeline, returns (success, stats, errors).
+    `progress_cb`, if given, is called with the number of rows which reached the end of the pipeline.
+    """
+
+    loop = asyncio.get_event_loop()
+
     pipeline_task = \
-        asyncio.ensure_future(async_execute_pipeline(spec.pipeline_id,
-                                                     spec.pipeline_details.get('pipeline', []),
-                                                     spec.path,
-                                                     trigger,
-                                                     execution_id,
-                                                     use_cache,
-                                                     dependencies,
-                                                     debug))
+        asyncio.ensure_future(async_execute_spec(spec, execution_id, trigger, use_cache, progress_cb,
+                                                 resume=resume))
     try:
-        if debug:
+        if trigger == 'manual' or os.environ.get('DPP_DEBUG'):
             logging.info("%s Waiting for completion", execution_id[:8])
         return loop.run_until_complete(pipeline_task)
     except KeyboardInterrupt:
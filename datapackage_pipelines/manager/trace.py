@@ -0,0 +1,92 @@
+"""
+Execution traces, in the Chrome trace-event format (https://ui.perfetto.dev or chrome://tracing).
+
+When tracing is enabled (`dpp run --trace`, or DPP_TRACE=1), the trace of each execution is stored
+with the execution record. It shows the time the pipeline waited for its dependencies, cache hits,
+and a track for each process of the pipeline, showing its lifetime and the time each resource
+started and finished passing through it.
+All timestamps are wall-clock times, so traces of several pipelines can be merged (see `dpp trace`).
+"""
+import os
+import time
+
+from ..utilities.step_stats import tracing_enabled  # noqa
+
+# Set by run_pipelines for each pipeline it runs in a worker process
+QUEUED_ENV_VAR = 'DPP_TRACE_QUEUED'
+DISPATCHED_ENV_VAR = 'DPP_TRACE_DISPATCHED'
+
+TRACE_ARTIFACT = 'trace'
+MANAGER_TRACK = '(manager)'
+
+
+def _us(timestamp):
+    return int(timestamp * 1000000)
+
+
+class Trace(object):
+
+    def __init__(self, pipeline_id, queued=None, dispatched=None):
+        self.pipeline_id = pipeline_id
+        self.queued = queued if queued is not None else os.environ.get(QUEUED_ENV_VAR)
+        self.dispatched = dispatched if dispatched is not None else os.environ.get(DISPATCHED_ENV_VAR)
+        self.events = [self._metadata('process_name', 0, name=pipeline_id)]
+        self.tracks = {}
+
+    @staticmethod
+    def _metadata(kind, tid, **args):
+        return {'name': kind, 'ph': 'M', 'pid': 1, 'tid': tid, 'args': args}
+
+    def track(self, name):
+        """Returns the id of a track (a 'thread' in the trace viewer), creating it if needed"""
+        if name not in self.tracks:
+            tid = len(self.tracks) + 1
+            self.tracks[name] = tid
+            self.events.append(self._metadata('thread_name', tid, name=name))
+            self.events.append(self._metadata('thread_sort_index', tid, sort_index=tid))
+        return self.tracks[name]
+
+    def complete(self, name, start, end, track=MANAGER_TRACK, category='pipeline', **args):
+        """An event with a duration, `start` and `end` are unix timestamps"""
+        self.events.append({
+            'name': name, 'cat': category, 'ph': 'X', 'pid': 1, 'tid': self.track(track),
+            'ts': _us(start), 'dur': max(_us(end) - _us(start), 0), 'args': args,
+        })
+
+    def instant(self, name, timestamp=None, track=MANAGER_TRACK, category='pipeline', **args):
+        self.events.append({
+            'name': name, 'cat': category, 'ph': 'i', 's': 't', 'pid': 1, 'tid': self.track(track),
+            'ts': _us(time.time() if timestamp is None else timestamp), 'args': args,
+        })
+
+    def waits(self, start_time):
+        """Records the time between the pipeline being queued by `dpp run` and its execution starting"""
+        queued, dispatched = self.queued, self.dispatched
+        if queued and dispatched:
+            self.complete('waiting for dependencies', float(queued), float(dispatched),
+                          category='dependencies')
+        if dispatched:
+            self.complete('starting', float(dispatched), start_time)
+
+    def process(self, index, stats, start, end):
+        """Records the lifetime of a process, along with the resources it processed"""
+        track = '{} {}'.format(index, stats['step'])
+        resources = stats.pop('resources', [])
+        self.complete(stats['step'], start, end, track=track, category='step', **stats)
+        for name, resource_start, resource_end, rows in resources:
+            self.complete(name, resource_start, resource_end, track=track, category='resource', rows=rows)
+
+    def to_dict(self):
+        return {
+            'traceEvents': self.events,
+            'displayTimeUnit': 'ms',
+            'otherData': {'pipeline_id': self.pipeline_id},
+        }
+
+
+def merge_traces(traces):
+    """Combines the traces of several pipelines into one, each pipeline as a separate process"""
+    events = []
+    for pid, trace in enumerate(traces, 1):
+        events.extend(dict(event, pid=pid) for event in trace['traceEvents'])
+    return {'traceEvents': events, 'displayTimeUnit': 'ms'}
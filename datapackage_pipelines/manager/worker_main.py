@@ -0,0 +1,22 @@
+"""
+Entry point of worker processes which aren't forked from the fork server (see workers.py).
+
+Started as `python -m datapackage_pipelines.manager.worker_main <fd>`, it reads the pickled
+arguments of the pipeline to run from its stdin, runs it, and sends its progress and result back
+over the pipe at file descriptor `fd`.
+It doesn't depend on the `__main__` module of the process which started it.
+"""
+import os
+import sys
+import pickle
+
+from .workers import _worker_main, PickleConnection
+
+
+def main(fd):
+    args = pickle.load(sys.stdin.buffer)
+    _worker_main(*args, conn=PickleConnection(os.fdopen(fd, 'wb')))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]))
@@ -0,0 +1,207 @@
+"""
+Runs pipelines in worker processes.
+
+Each pipeline runs in a fresh process. With `fork_server`, it's forked from a warm multiprocessing
+fork server which has the manager already imported. Like all multiprocessing children, these
+workers import the `__main__` module of the calling process first, so `fork_server` is only used by
+`dpp` (a script calling `run_pipelines` must otherwise guard its code with
+`if __name__ == '__main__'`). Otherwise, or where forking isn't available, the worker is started as
+a new python process running worker_main.py, which doesn't depend on `__main__`.
+The worker gets the spec of the pipeline as it was resolved by `dpp run`, so it doesn't need to
+scan, parse and hash all specs again.
+Progress reports and the result of the execution are sent back over a pipe, as
+(kind, ...) tuples:
+- ('progress', row_count)
+- ('result', success, stats, errors)
+"""
+import os
+import sys
+import time
+import pickle
+import logging
+import threading
+import subprocess
+import multiprocessing
+from collections import namedtuple
+
+from ..utilities.execution_id import gen_execution_id
+from ..status import status_mgr
+from .tasks import execute_pipeline
+from .trace import QUEUED_ENV_VAR, DISPATCHED_ENV_VAR
+
+PROGRESS = 'progress'
+RESULT = 'result'
+
+ProgressReport = namedtuple('ProgressReport',
+                            ['pipeline_id', 'row_count', 'success', 'errors', 'stats'])
+
+_context = None
+
+
+def worker_context():
+    """The multiprocessing context of the fork server, or None if forking isn't available"""
+    global _context
+    if _context is None and 'forkserver' in multiprocessing.get_all_start_methods():
+        _context = multiprocessing.get_context('forkserver')
+        _context.set_forkserver_preload([__name__])
+    return _context
+
+
+class PickleConnection(object):
+    """
+    One end of a pipe to or from a worker started by start_worker_process,
+    with the same interface as a multiprocessing Connection.
+    """
+
+    def __init__(self, file):
+        self.file = file
+
+    def send(self, obj):
+        pickle.dump(obj, self.file)
+        self.file.flush()
+
+    def recv(self):
+        # Raises EOFError once the worker closed the pipe
+        return pickle.load(self.file)
+
+    def close(self):
+        self.file.close()
+
+
+def start_worker_process(args):
+    """
+    Runs _worker_main(*args) in a new python process, returns the process and a connection for
+    reading the messages it sends.
+    """
+    rfd, wfd = os.pipe()
+    env = dict(os.environ)
+    # Lets the worker import the manager like this process did (it restores the pipeline's environment)
+    env['PYTHONPATH'] = os.pathsep.join(path for path in sys.path if path)
+    process = subprocess.Popen([sys.executable, '-m', 'datapackage_pipelines.manager.worker_main', str(wfd)],
+                               stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, pass_fds=(wfd,), env=env)
+    os.close(wfd)
+    pickle.dump(args, process.stdin)
+    process.stdin.close()
+    return process, PickleConnection(os.fdopen(rfd, 'rb'))
+
+
+def queue_spec(spec, status_manager):
+    """Records a pending execution of a pipeline, returns its execution id (or None if it's already running)"""
+    ps = status_manager.get(spec.pipeline_id)
+    ps.init(spec.pipeline_details,
+            spec.source_details,
+            spec.validation_errors,
+            spec.cache_hash)
+    eid = gen_execution_id()
+    if ps.queue_execution(eid, 'manual'):
+        return eid
+    return None
+
+
+def execute_spec(spec, status_manager, use_cache, progress_cb=None, resume=False):
+    """Runs a pipeline in the current process, returns (pipeline_id, success, stats, errors)"""
+    # Set environment variables for the pipeline
+    for key, value in spec.environment.items():
+        os.environ[key] = str(value)
+    eid = queue_spec(spec, status_manager)
+    if eid is not None:
+        success, stats, errors = \
+            execute_pipeline(spec, eid,
+                             use_cache=use_cache,
+                             progress_cb=progress_cb,
+                             resume=resume)
+        return spec.pipeline_id, success, stats, errors
+    else:
+        return spec.pipeline_id, False, None, ['Already Running']
+
+
+def _worker_main(spec, root_dir, environ, use_cache, resume, log_prefix, conn):
+    os.chdir(root_dir)
+    os.environ.clear()
+    os.environ.update(environ)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    if log_prefix is not None:
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(logging.Formatter(log_prefix + '%(levelname)-8s:%(message)s'))
+        root.addHandler(handler)
+    else:
+        root.addHandler(logging.NullHandler())
+    root.setLevel(logging.INFO)
+
+    try:
+        _, success, stats, errors = \
+            execute_spec(spec, status_mgr(), use_cache,
+                         progress_cb=lambda row_count: conn.send((PROGRESS, row_count)),
+                         resume=resume)
+    except Exception as e:  # noqa
+        logging.exception('Failed to execute %s', spec.pipeline_id)
+        success, stats, errors = False, None, ['Crashed', repr(e)]
+    conn.send((RESULT, success, stats, errors))
+    conn.close()
+
+
+def _forked_worker_main(*args):
+    # Like the workers started by start_worker_process, don't write to the manager's stdout
+    sys.stdout.flush()
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, sys.stdout.fileno())
+    os.close(devnull)
+    _worker_main(*args)
+
+
+def worker_execute_pipeline(spec, root_dir, use_cache, verbose, progress_report_queue, queued=None,
+                            resume=False, fork_server=False):
+    """
+    Runs a pipeline in a worker process, reporting its progress to `progress_report_queue`.
+    With `fork_server`, the worker is forked from the fork server, which imports the caller's
+    `__main__` module.
+    Returns (pipeline_id, success, stats, errors).
+    """
+    environ = dict(os.environ)
+    if queued is not None:
+        # Lets the execution trace show how long the pipeline waited
+        environ[QUEUED_ENV_VAR] = str(queued)
+        environ[DISPATCHED_ENV_VAR] = str(time.time())
+    log_prefix = None
+    if verbose:
+        log_prefix = '[%s:%s] >>> ' % (spec.pipeline_id, threading.current_thread().name)
+
+    args = (spec, os.path.abspath(root_dir), environ, use_cache, resume, log_prefix)
+    context = worker_context() if fork_server else None
+    if context is not None:
+        conn, worker_conn = context.Pipe(duplex=False)
+        process = context.Process(target=_forked_worker_main, args=args + (worker_conn,))
+        process.start()
+        worker_conn.close()
+    else:
+        process, conn = start_worker_process(args)
+
+    progress = 0
+    result = None
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message[0] == PROGRESS:
+            progress = message[1]
+            if progress_report_queue is not None:
+                progress_report_queue.put(ProgressReport(spec.pipeline_id, progress, None, None, None))
+        elif message[0] == RESULT:
+            result = message[1:]
+    conn.close()
+    if context is not None:
+        process.join()
+        exit_code = process.exitcode
+    else:
+        exit_code = process.wait()
+
+    if result is None:
+        result = False, {}, ['Crashed', 'Worker exited with code {}'.format(exit_code)]
+    success, stats, errors = result
+    if progress_report_queue is not None:
+        progress_report_queue.put(ProgressReport(spec.pipeline_id, progress, success, errors, stats))
+    return spec.pipeline_id, success, stats, errors
@@ -1,2 +1,2 @@
 from .hash_calculator import HashCalculator
-from .dependency_resolver import resolve_dependencies, DependencyMissingException
+from .dependency_resolver import resolve_dependencies, recheck_dependencies, DependencyMissingException
@@ -12,6 +12,48 @@ class DependencyMissingException(Exception):
         self.missing = missing
 
 
+def check_dependency(pipeline_id, status_mgr):
+    """Returns the errors preventing a pipeline from running, due to the status of its dependency"""
+    errors = []
+    ps = status_mgr.get(pipeline_id)
+    if not ps.runnable():
+        errors.append(
+            SpecError('Invalid dependency',
+                      'Cannot run until dependency passes validation: {}'.format(pipeline_id))
+        )
+    elif ps.dirty():
+        errors.append(
+            SpecError('Dirty dependency',
+                      'Cannot run until dependency is executed: {}'.format(pipeline_id))
+        )
+    elif ps.get_last_execution() is not None and not ps.get_last_execution().success:
+        errors.append(
+            SpecError('Dependency unsuccessful',
+                      'Cannot run until dependency "{}" is successfully '
+                      'executed'.format(pipeline_id))
+        )
+
+    for dep_err in ps.validation_errors:
+        errors.append(
+            SpecError('From {}'.format(pipeline_id), dep_err)
+        )
+    return errors
+
+
+def recheck_dependencies(spec: PipelineSpec, status_mgr):
+    """
+    Updates the errors of a spec which are due to the status of its dependencies
+    (e.g. after these dependencies were executed).
+    """
+    stale = set(id(error) for error in spec.dependency_errors)
+    spec.validation_errors[:] = [error for error in spec.validation_errors if id(error) not in stale]
+    spec.dependency_errors = []
+    for pipeline_id in spec.dependencies:
+        errors = check_dependency(pipeline_id, status_mgr)
+        spec.validation_errors.extend(errors)
+        spec.dependency_errors.extend(errors)
+
+
 def resolve_dependencies(spec: PipelineSpec, all_pipeline_ids, status_mgr):
 
     cache_hash = ''
@@ -25,28 +67,9 @@ def resolve_dependencies(spec: PipelineSpec, all_pipeline_ids, status_mgr):
     for dependency in dependencies:
         if 'pipeline' in dependency:
             pipeline_id = dependency['pipeline']
-            ps = status_mgr.get(pipeline_id)
-            if not ps.runnable():
-                spec.validation_errors.append(
-                    SpecError('Invalid dependency',
-                              'Cannot run until dependency passes validation: {}'.format(pipeline_id))
-                )
-            elif ps.dirty():
-                spec.validation_errors.append(
-                    SpecError('Dirty dependency',
-                              'Cannot run until dependency is executed: {}'.format(pipeline_id))
-                )
-            elif ps.get_last_execution() is not None and not ps.get_last_execution().success:
-                spec.validation_errors.append(
-                    SpecError('Dependency unsuccessful',
-                              'Cannot run until dependency "{}" is successfully '
-                              'executed'.format(pipeline_id))
-                )
-
-            for dep_err in ps.validation_errors:
-                spec.validation_errors.append(
-                    SpecError('From {}'.format(pipeline_id), dep_err)
-                )
+            errors = check_dependency(pipeline_id, status_mgr)
+            spec.validation_errors.extend(errors)
+            spec.dependency_errors.extend(errors)
 
             pipeline_hash = all_pipeline_ids.get(pipeline_id).cache_hash
             assert pipeline_hash is not None
@@ -27,17 +27,27 @@ class HashCalculator(object):
                 cache_hash = resolve_dependencies(spec, self.all_pipeline_ids, status_mgr)
 
             self.all_pipeline_ids[spec.pipeline_id] = spec
-            if len(spec.validation_errors) > 0:
+            # Errors due to the status of dependencies don't affect the hash, and might be gone by the
+            # time the pipeline is executed (see recheck_dependencies)
+            if len(spec.validation_errors) > len(spec.dependency_errors):
                 return cache_hash
 
-            for step in spec.pipeline_details['pipeline']:
-                m = hashlib.md5()
-                m.update(cache_hash.encode('ascii'))
-                with open(step['executor'], 'rb') as f:
-                    m.update(f.read())
-                m.update(json.dumps(step, ensure_ascii=True, sort_keys=True)
-                         .encode('ascii'))
-                cache_hash = m.hexdigest()
-                step['_cache_hash'] = cache_hash
+            cache_hash = self.calculate_steps_hash(spec.pipeline_details['pipeline'], cache_hash)
 
         spec.cache_hash = cache_hash
+
+    @classmethod
+    def calculate_steps_hash(cls, steps, cache_hash):
+        for step in steps:
+            m = hashlib.md5()
+            m.update(cache_hash.encode('ascii'))
+            with open(step['executor'], 'rb') as f:
+                m.update(f.read())
+            # The steps of each branch are hashed as well, so that changing them invalidates the cache
+            for branch in step.get('branches', []):
+                m.update(cls.calculate_steps_hash(branch, cache_hash).encode('ascii'))
+            m.update(json.dumps(step, ensure_ascii=True, sort_keys=True)
+                     .encode('ascii'))
+            cache_hash = m.hexdigest()
+            step['_cache_hash'] = cache_hash
+        return cache_hash
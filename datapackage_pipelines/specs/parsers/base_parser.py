@@ -15,6 +15,8 @@ class PipelineSpec(object):
         self.source_details = source_details
         self.validation_errors = [] if validation_errors is None else validation_errors
         self.dependencies = [] if dependencies is None else dependencies
+        # The part of validation_errors which is due to the status of the dependencies
+        self.dependency_errors = []
         self.cache_hash = cache_hash
         self.schedule = schedule
         self.environment = environment
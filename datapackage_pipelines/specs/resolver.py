@@ -9,6 +9,9 @@ from .errors import SpecError
 
 _processor_path = None
 
+BRANCHES = os.path.join(os.path.dirname(__file__),
+                        '..', 'lib', 'internal', 'branches.py')
+
 
 def processor_path():
     global _processor_path
@@ -78,6 +81,14 @@ def resolve_executor(step, path, errors):
             code_file.write(step['code'])
         return code_path
 
+    if 'branches' in step:
+        step['run'] = 'branches'
+        for branch in step['branches']:
+            for branch_step in branch:
+                if 'executor' not in branch_step:
+                    branch_step['executor'] = resolve_executor(branch_step, path, errors)
+        return BRANCHES
+
     if 'flow' in step:
         step['run'] = 'flow'
         parameters = step.setdefault('parameters', {})
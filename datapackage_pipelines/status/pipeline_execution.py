@@ -5,7 +5,7 @@ class PipelineExecution(object):
 
     def __init__(self, backend, pipeline_id, pipeline_details, cache_hash, trigger, execution_id,
                  log='', queue_time=None, start_time=None, finish_time=None, success=None,
-                 stats=None, error_log=None,
+                 stats=None, error_log=None, artifacts=None,
                  save=True):
         self.backend = backend
         self.pipeline_id = pipeline_id
@@ -20,12 +20,19 @@ class PipelineExecution(object):
         self.success = success
         self.stats = stats or {}
         self.error_log = error_log or []
+        # Names of additional records stored with this execution (e.g. 'trace')
+        self.artifacts = artifacts or []
         if save:
             self.__save()
 
+    @staticmethod
+    def key(execution_id):
+        """Key of the record of an execution in the status backend"""
+        return 'PipelineExecution:' + execution_id
+
     @staticmethod
     def from_execution_id(backend, execution_id):
-        data = backend.get_status('PipelineExecution:' + execution_id)
+        data = backend.get_status(PipelineExecution.key(execution_id))
         return PipelineExecution(
             backend,
             data['pipeline_id'],
@@ -40,6 +47,7 @@ class PipelineExecution(object):
             success=data['success'],
             stats=data['stats'],
             error_log=data['error_log'],
+            artifacts=data.get('artifacts'),
             save=False
         )
 
@@ -56,10 +64,11 @@ class PipelineExecution(object):
         yield 'success', self.success
         yield 'stats', self.stats
         yield 'error_log', self.error_log
+        yield 'artifacts', self.artifacts
 
     def __save(self):
         # logging.debug('SAVING PipelineExecution %s/%s -> %r' % (self.pipeline_id, self.execution_id, dict(self)))
-        self.backend.set_status('PipelineExecution:' + self.execution_id, dict(self))
+        self.backend.set_status(self.key(self.execution_id), dict(self))
 
     def queue_execution(self, trigger):
         if self.queue_time is not None:
@@ -101,8 +110,25 @@ class PipelineExecution(object):
         self.__save()
         return True
 
+    def artifact_key(self, name):
+        return '{}:{}'.format(self.key(self.execution_id), name)
+
+    def save_artifact(self, name, data):
+        self.backend.set_status(self.artifact_key(name), data)
+        if name not in self.artifacts:
+            self.artifacts.append(name)
+            self.__save()
+        return True
+
+    def get_artifact(self, name):
+        if name in self.artifacts:
+            return self.backend.get_status(self.artifact_key(name))
+
     def delete(self):
-        self.backend.del_status(self.execution_id)
+        for name in self.artifacts:
+            self.backend.del_status(self.artifact_key(name))
+        # Executions are stored under their key, not under their bare execution id
+        self.backend.del_status(self.key(self.execution_id))
 
     def is_stale(self):
         long_ago = time.time() - 86400  # a day ago
@@ -2,6 +2,7 @@ from typing import Optional
 
 import logging
 
+from ..utilities.step_stats import hook_stats
 from .hook_sender import hook_sender
 from .pipeline_execution import PipelineExecution
 
@@ -151,7 +152,7 @@ class PipelineStatus(object):
 
     def finish_execution(self, execution_id, success, stats, error_log):
         if self.validate_execution_id(execution_id):
-            self.update_hooks('finish', success=success, errors=error_log, stats=stats)
+            self.update_hooks('finish', success=success, errors=error_log, stats=hook_stats(stats))
             return self.executions[0].finish_execution(success, stats, error_log)
         return False
 
@@ -162,6 +163,11 @@ class PipelineStatus(object):
             return self.executions[0].update_execution(log)
         return False
 
+    def save_execution_artifact(self, execution_id, name, data):
+        if self.validate_execution_id(execution_id):
+            return self.executions[0].save_artifact(name, data)
+        return False
+
     def deregister(self):
         self.backend.deregister_pipeline_id(self.pipeline_id)
 
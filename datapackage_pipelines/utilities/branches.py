@@ -0,0 +1,194 @@
+"""
+Resource-level parallelism within a single pipeline.
+
+A `branches` step runs a number of sub-pipelines (branches) side by side. Each branch starts
+from the datapackage of the previous step without its resources, so it can only add resources
+(e.g. load and process a different source) and change the datapackage's properties.
+A join process feeds the branches, and then combines the output of all of them, so the next
+step receives a single stream: the resources of the previous step come first (as they were),
+followed by the resources of each branch, in the order of the branches in the spec.
+
+While one branch is being copied to the output, the others keep running - their output is
+spooled to temporary files, which are read back as they're being written.
+"""
+import io
+import os
+import tempfile
+import threading
+
+from .extended_json import json
+from .resources import streaming
+from .framing import RESOURCE_END_FRAME
+from .replication import merge_stats
+from .stat_utils import STATS_DPP_KEY
+
+SPOOL_BLOCK_SIZE = 64 * 1024
+
+
+def _bytes(data):
+    return data if isinstance(data, bytes) else data.encode('utf8')
+
+
+def _dump_line(obj):
+    return json.dumps(obj, sort_keys=True, ensure_ascii=True).encode('ascii') + b'\n'
+
+
+def _load_line(line):
+    return json.loads(line.decode('utf8')) if line.strip() else {}
+
+
+class Spool(threading.Thread):
+    """Reads everything written to a file descriptor into a temporary file, as fast as possible"""
+
+    def __init__(self, fd):
+        super().__init__(daemon=True)
+        self.fd = fd
+        self.file = tempfile.TemporaryFile()
+        self.size = 0
+        self.done = False
+        self.error = None
+        self.cond = threading.Condition()
+        self.start()
+
+    def run(self):
+        spool_fd = self.file.fileno()
+        try:
+            while True:
+                data = os.read(self.fd, SPOOL_BLOCK_SIZE)
+                if not data:
+                    break
+                view = memoryview(data)
+                while len(view) > 0:
+                    view = view[os.write(spool_fd, view):]
+                with self.cond:
+                    self.size += len(data)
+                    self.cond.notify_all()
+        except Exception as e:  # noqa
+            self.error = e
+        finally:
+            os.close(self.fd)
+            with self.cond:
+                self.done = True
+                self.cond.notify_all()
+
+    def read_at(self, offset, size):
+        """Blocks until there's data after `offset`, or the spooled stream ended"""
+        with self.cond:
+            while offset >= self.size and not self.done:
+                self.cond.wait()
+            if self.error is not None:
+                raise self.error
+            available = self.size - offset
+        if available <= 0:
+            return b''
+        return os.pread(self.file.fileno(), min(size, available), offset)
+
+    def reader(self):
+        return io.BufferedReader(_SpoolReader(self), SPOOL_BLOCK_SIZE)
+
+
+class _SpoolReader(io.RawIOBase):
+
+    def __init__(self, spool):
+        super().__init__()
+        self.spool = spool
+        self.offset = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.spool.read_at(self.offset, len(buffer))
+        buffer[:len(data)] = data
+        self.offset += len(data)
+        return len(data)
+
+
+def merge_datapackages(dp, branch_input, branch_dps):
+    """
+    Appends the resources of all branches to `dp`. Other properties changed by a branch
+    (compared to the `branch_input` it received) are updated as well, later branches winning.
+    """
+    ret = dict(dp)
+    ret['resources'] = list(dp.get('resources', []))
+    names = set(resource.get('name') for resource in ret['resources'])
+    for i, branch_dp in enumerate(branch_dps):
+        for key, value in branch_dp.items():
+            if key != 'resources' and value != branch_input.get(key):
+                ret[key] = value
+        for resource in branch_dp.get('resources', []):
+            if resource.get('name') in names:
+                raise ValueError('Branch %d produced resource %s, which already exists'
+                                 % (i, resource.get('name')))
+            names.add(resource.get('name'))
+            ret['resources'].append(resource)
+    return ret
+
+
+def copy_resource(infile, in_framing, outfile, out_framing):
+    """Copies the rows of a single resource, converting them only if the framings differ"""
+    if in_framing.NAME == out_framing.NAME:
+        while True:
+            kind, frame = in_framing.read_raw_frame(infile)
+            outfile.write(frame)
+            if kind == RESOURCE_END_FRAME:
+                return
+    while True:
+        row = in_framing.read_row(infile)
+        if row is None:
+            break
+        outfile.write(_bytes(out_framing.encode_row(row)))
+    outfile.write(_bytes(out_framing.end_resource()))
+
+
+def join_branches(infile, in_framing, outfile, out_framing, branches):
+    """
+    Runs the join process of a `branches` step. `branches` is a list of
+    (input file, output file descriptor, framing) tuples, one for each branch.
+    """
+    dependency_line = infile.readline()
+    dp = _load_line(infile.readline())
+    infile.readline()
+
+    # Branches get an empty datapackage (with the same properties) and empty stats
+    branch_input = dict(dp, resources=[])
+    header = dependency_line + _dump_line(branch_input) + b'\n' + b'\n'
+    for branch_infile, _, _ in branches:
+        branch_infile.write(header)
+        branch_infile.close()
+
+    spools = [Spool(fd) for _, fd, _ in branches]
+    readers = [spool.reader() for spool in spools]
+    branch_dps = []
+    for reader in readers:
+        reader.readline()
+        branch_dps.append(_load_line(reader.readline()))
+        reader.readline()
+
+    merged = merge_datapackages(dp, branch_input, branch_dps)
+    outfile.write(dependency_line + _dump_line(merged) + b'\n')
+    outfile.flush()
+
+    for resource in dp.get('resources', []):
+        if streaming(resource):
+            copy_resource(infile, in_framing, outfile, out_framing)
+    stats = _load_line(infile.readline())
+
+    all_stats = []
+    for reader, branch_dp, (_, _, framing) in zip(readers, branch_dps, branches):
+        for resource in branch_dp.get('resources', []):
+            if streaming(resource):
+                copy_resource(reader, framing, outfile, out_framing)
+                outfile.flush()
+        stats_line = reader.readline()
+        if stats_line == b'':
+            raise EOFError('Branch %d ended without sending its stats' % len(all_stats))
+        all_stats.append(_load_line(stats_line))
+    branch_stats = merge_stats(all_stats)
+    # Internal stats of the upstream steps are kept, unless a branch reports the same key
+    dpp_stats = branch_stats.pop(STATS_DPP_KEY, None)
+    stats.update(branch_stats)
+    if dpp_stats is not None:
+        stats[STATS_DPP_KEY] = dict(stats.get(STATS_DPP_KEY) or {}, **dpp_stats)
+    outfile.write(_dump_line(stats))
+    outfile.flush()
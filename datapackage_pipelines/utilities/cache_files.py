@@ -0,0 +1,384 @@
+import io
+import os
+import gzip
+import queue
+import shutil
+import struct
+import logging
+import importlib
+import threading
+
+from .extended_json import json
+from .resources import streaming
+
+
+def _optional_module(name):
+    # Compression libraries are only imported when their codec is used
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
+
+
+CACHE_CODEC_ENV_VAR = 'DPP_CACHE_CODEC'
+CACHE_QUEUE_SIZE_ENV_VAR = 'DPP_CACHE_QUEUE_SIZE'
+DEFAULT_CACHE_CODEC = 'gzip'
+DEFAULT_CACHE_QUEUE_SIZE = 16
+
+# Cache files start with a header line naming the codec used for the rest of the file.
+# Files without that header were written by older versions, and are plain gzip files.
+CACHE_MAGIC = b'DPP-CACHE:'
+CACHE_VERSION = 2
+CACHE_HEADER = CACHE_MAGIC + b'%d:%s\n'
+# The index is stored at the end of the file, followed by its offset and a magic string
+CACHE_TRAILER = struct.Struct('>Q10s')
+CACHE_TRAILER_MAGIC = b'DPP-INDEX\n'
+
+DATAPACKAGE_SECTION = 'datapackage'
+RESOURCE_SECTION = 'resource'
+STATS_SECTION = 'stats'
+DATA_SECTION = 'data'
+
+
+class GzipCacheCodec(object):
+
+    NAME = 'gzip'
+
+    @staticmethod
+    def available():
+        return True
+
+    @staticmethod
+    def writer(fileobj):
+        return gzip.GzipFile(fileobj=fileobj, mode='wb')
+
+    @staticmethod
+    def reader(fileobj):
+        return gzip.GzipFile(fileobj=fileobj, mode='rb')
+
+
+class ZstdCacheCodec(object):
+
+    NAME = 'zstd'
+
+    @staticmethod
+    def available():
+        return _optional_module('zstandard') is not None
+
+    @staticmethod
+    def writer(fileobj):
+        return _optional_module('zstandard').ZstdCompressor().stream_writer(fileobj, closefd=False)
+
+    @staticmethod
+    def reader(fileobj):
+        return _optional_module('zstandard').ZstdDecompressor().stream_reader(
+            fileobj, read_across_frames=True, closefd=False
+        )
+
+
+class LZ4CacheCodec(object):
+
+    NAME = 'lz4'
+
+    @staticmethod
+    def available():
+        return _optional_module('lz4.frame') is not None
+
+    @staticmethod
+    def writer(fileobj):
+        return _optional_module('lz4.frame').LZ4FrameFile(fileobj, mode='wb')
+
+    @staticmethod
+    def reader(fileobj):
+        return _optional_module('lz4.frame').LZ4FrameFile(fileobj, mode='rb')
+
+
+class UncompressedCacheCodec(object):
+
+    NAME = 'none'
+
+    @staticmethod
+    def available():
+        return True
+
+    @staticmethod
+    def writer(fileobj):
+        return None
+
+    @staticmethod
+    def reader(fileobj):
+        return None
+
+
+CACHE_CODECS = dict(
+    (codec.NAME, codec)
+    for codec in (GzipCacheCodec, ZstdCacheCodec, LZ4CacheCodec, UncompressedCacheCodec)
+)
+
+
+def get_cache_codec(name=None):
+    if name is None:
+        name = os.environ.get(CACHE_CODEC_ENV_VAR) or DEFAULT_CACHE_CODEC
+    codec = CACHE_CODECS.get(name)
+    if codec is None:
+        logging.warning('Unknown cache codec %s, falling back to %s', name, DEFAULT_CACHE_CODEC)
+    elif not codec.available():
+        logging.warning('Cache codec %s is not installed, falling back to %s', name, DEFAULT_CACHE_CODEC)
+        codec = None
+    if codec is None:
+        codec = CACHE_CODECS[DEFAULT_CACHE_CODEC]
+    return codec
+
+
+class _SectionFile(io.RawIOBase):
+    """A read-only view of a byte range in a file"""
+
+    def __init__(self, fileobj, offset, length):
+        super().__init__()
+        self.fileobj = fileobj
+        self.fileobj.seek(offset)
+        self.remaining = length
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.fileobj.read(min(len(buffer), self.remaining))
+        buffer[:len(data)] = data
+        self.remaining -= len(data)
+        return len(data)
+
+
+class _CacheFile(object):
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+
+    def close(self):
+        self.fileobj.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class CacheWriter(_CacheFile):
+    """
+    Writes (binary) data to a new cache file, compressed with the requested codec.
+    The data is split into sections (the datapackage, each of the resources and the stats),
+    each compressed separately and listed in an index at the end of the file.
+    """
+
+    def __init__(self, filename, codec=None):
+        self.codec = get_cache_codec(codec)
+        super().__init__(open(filename, 'wb'))
+        self.fileobj.write(CACHE_HEADER % (CACHE_VERSION, self.codec.NAME.encode('ascii')))
+        self.sections = []
+        self.section_offset = self.fileobj.tell()
+        self.stream = None
+
+    def _section_stream(self):
+        if self.stream is None:
+            self.stream = self.codec.writer(self.fileobj) or self.fileobj
+        return self.stream
+
+    def write(self, data):
+        return self._section_stream().write(data)
+
+    def end_section(self, kind, name=None, rows=None):
+        stream = self._section_stream()
+        if stream is not self.fileobj:
+            stream.close()
+        self.stream = None
+        offset = self.fileobj.tell()
+        section = dict(kind=kind, offset=self.section_offset, length=offset - self.section_offset)
+        if name is not None:
+            section['name'] = name
+        if rows is not None:
+            section['rows'] = rows
+        self.sections.append(section)
+        self.section_offset = offset
+
+    def close(self):
+        if self.stream is not None:
+            self.end_section(DATA_SECTION)
+        index = json.dumps(dict(sections=self.sections), sort_keys=True).encode('ascii')
+        self.fileobj.write(index + b'\n' + CACHE_TRAILER.pack(self.section_offset, CACHE_TRAILER_MAGIC))
+        super().close()
+
+
+class CacheReader(_CacheFile):
+    """
+    Reads the (binary, uncompressed) contents of a cache file, written with any codec.
+    Cache files written by older versions have no index, and can only be replayed as a whole.
+    """
+
+    def __init__(self, filename):
+        super().__init__(open(filename, 'rb'))
+        self.filename = filename
+        try:
+            self.version = 0
+            name = GzipCacheCodec.NAME
+            if self.fileobj.peek(len(CACHE_MAGIC)).startswith(CACHE_MAGIC):
+                version, name = \
+                    self.fileobj.readline()[len(CACHE_MAGIC):].strip().decode('ascii').split(':')
+                self.version = int(version)
+            self.codec = CACHE_CODECS.get(name)
+            if self.codec is None or not self.codec.available():
+                raise ValueError('Cache file %s uses an unavailable codec: %s' % (filename, name))
+            self.data_offset = self.fileobj.tell()
+            self.sections = self._read_index() if self.version >= 2 else None
+        except Exception:
+            self.fileobj.close()
+            raise
+
+    def _read_index(self):
+        self.fileobj.seek(0, os.SEEK_END)
+        size = self.fileobj.tell()
+        if size < self.data_offset + CACHE_TRAILER.size:
+            raise ValueError('Cache file %s is truncated' % self.filename)
+        self.fileobj.seek(size - CACHE_TRAILER.size)
+        index_offset, magic = CACHE_TRAILER.unpack(self.fileobj.read(CACHE_TRAILER.size))
+        if magic != CACHE_TRAILER_MAGIC or not self.data_offset <= index_offset < size:
+            raise ValueError('Cache file %s has no index' % self.filename)
+        self.fileobj.seek(index_offset)
+        sections = json.loads(self.fileobj.read(size - CACHE_TRAILER.size - index_offset).decode('ascii'))
+        sections = sections['sections']
+
+        # Sections must cover all the data in the file
+        offset = self.data_offset
+        for section in sections:
+            if section['offset'] != offset or section['length'] < 0:
+                raise ValueError('Cache file %s has an invalid index' % self.filename)
+            offset += section['length']
+        if offset != index_offset:
+            raise ValueError('Cache file %s has an invalid index' % self.filename)
+        return sections
+
+    def validate(self):
+        """Raises an exception if the cache file is broken"""
+        if self.sections is None:
+            # No index, at least make sure that the file can be decompressed
+            self.open_data().read(1)
+
+    def open_data(self):
+        """Returns a stream with the entire (decompressed) contents of the file"""
+        if self.sections is not None:
+            return io.BufferedReader(_SectionsReader(self, self.sections))
+        self.fileobj.seek(self.data_offset)
+        return self.codec.reader(self.fileobj) or self.fileobj
+
+    def open_section(self, section):
+        """Returns a stream with the (decompressed) contents of a single section, from the `sections` list"""
+        section_file = _SectionFile(self.fileobj, section['offset'], section['length'])
+        return self.codec.reader(section_file) or section_file
+
+    def resource_sections(self):
+        return [section for section in self.sections if section['kind'] == RESOURCE_SECTION]
+
+    def replay(self, outfile, resources=None):
+        """
+        Copy the cached stream to `outfile`.
+        When `resources` (a list of resource names) is set, only these streamed resources are copied
+        (and the rest are removed from the datapackage).
+        """
+        if resources is None or self.sections is None:
+            if resources is not None:
+                logging.warning('Cache file %s has no index, replaying all resources', self.filename)
+            shutil.copyfileobj(self.open_data(), outfile)
+            return
+
+        resources = set(resources)
+        skipped = set(section.get('name') for section in self.resource_sections()
+                      if section.get('name') not in resources)
+        for section in self.sections:
+            if section['kind'] == DATAPACKAGE_SECTION:
+                dp_line, *rest = self.open_section(section).read().split(b'\n', 1)
+                dp = json.loads(dp_line.decode('utf8'))
+                dp['resources'] = [resource for resource in dp.get('resources', [])
+                                   if not streaming(resource) or resource.get('name') not in skipped]
+                outfile.write(json.dumps(dp, sort_keys=True, ensure_ascii=True).encode('ascii') + b'\n')
+                outfile.write(b''.join(rest))
+            elif section['kind'] != RESOURCE_SECTION or section.get('name') not in skipped:
+                shutil.copyfileobj(self.open_section(section), outfile)
+
+
+class _SectionsReader(io.RawIOBase):
+    """Reads the decompressed contents of multiple sections, one after the other"""
+
+    def __init__(self, cache_reader, sections):
+        super().__init__()
+        self.cache_reader = cache_reader
+        self.sections = list(sections)
+        self.current = None
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while True:
+            if self.current is None:
+                if len(self.sections) == 0:
+                    return 0
+                self.current = self.cache_reader.open_section(self.sections.pop(0))
+            data = self.current.read(len(buffer))
+            if len(data) > 0:
+                buffer[:len(data)] = data
+                return len(data)
+            self.current = None
+
+
+class AsyncCacheWriter(object):
+    """
+    Writes text to a cache file on a background thread, so encoding and compressing the
+    cache doesn't slow down the processor.
+    Up to `DPP_CACHE_QUEUE_SIZE` chunks are queued, after which writing blocks.
+    """
+
+    def __init__(self, filename, codec=None, queue_size=None):
+        if queue_size is None:
+            queue_size = int(os.environ.get(CACHE_QUEUE_SIZE_ENV_VAR, DEFAULT_CACHE_QUEUE_SIZE))
+        self.writer = CacheWriter(filename, codec)
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.error = None
+        self.thread = threading.Thread(target=self._run, name='cache-writer', daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            chunk = self.queue.get()
+            if chunk is None:
+                break
+            if self.error is None:
+                try:
+                    if isinstance(chunk, dict):
+                        self.writer.end_section(**chunk)
+                    else:
+                        self.writer.write(chunk.encode('utf8'))
+                except Exception as e:  # noqa
+                    # Keep draining the queue so that the processor doesn't block
+                    self.error = e
+        try:
+            self.writer.close()
+        except Exception as e:  # noqa
+            if self.error is None:
+                self.error = e
+
+    def write(self, text):
+        if self.error is not None:
+            raise self.error
+        self.queue.put(text)
+
+    def end_section(self, kind, name=None, rows=None):
+        self.queue.put(dict(kind=kind, name=name, rows=rows))
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
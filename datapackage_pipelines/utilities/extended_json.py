@@ -1,8 +1,11 @@
+import os
+import re
+import sys
+import logging
 import datetime
 import json as _json
 
 import decimal
-import isodate
 
 from .lazy_dict import LazyDict
 
@@ -23,13 +26,16 @@ TIME_P_FORMAT = TIME_F_FORMAT = TIME_FORMAT
 
 class LazyJsonLine(LazyDict):
 
-    def __init__(self, args, kwargs):
+    def __init__(self, args, kwargs, decoder=None):
         super().__init__()
         self.line = args[0]
         self.args = args
         self.kwargs = kwargs
+        self.decoder = decoder
 
     def _evaluate(self):
+        if self.decoder is not None:
+            return self.decoder.loads(self.line)
         return json.loads(*self.args, **self.kwargs)
 
     def __str__(self):
@@ -78,6 +84,7 @@ class CommonJSONDecoder(_json.JSONDecoder):
                 pass
         if 'type{duration}' in obj:
             try:
+                import isodate
                 return isodate.parse_duration(obj["type{duration}"])
             except ValueError:
                 pass
@@ -94,6 +101,71 @@ class CommonJSONDecoder(_json.JSONDecoder):
         super(CommonJSONDecoder, self).__init__(**kwargs)
 
 
+class TypedRowDecoder(object):
+    """
+    Row decoder for a specific resource, built from its schema.
+    Rows are parsed without an object hook, and only fields which might hold
+    tagged values are converted afterwards - untyped fields (strings, integers etc.)
+    are left as-is.
+    Rows which don't match the schema are converted entirely, like with CommonJSONDecoder.
+    """
+
+    # Types which are never encoded as tagged values
+    PLAIN_TYPES = {'string', 'integer', 'boolean', 'year'}
+    # Types which are encoded as a single tagged value
+    TAGGED_TYPES = {'number', 'date', 'time', 'datetime', 'duration'}
+
+    def __init__(self, schema):
+        self.tagged_fields = []
+        self.compound_fields = []
+        fields = schema.get('fields', []) if schema else []
+        for field in fields:
+            field_type = field.get('type', 'string')
+            if field_type in self.PLAIN_TYPES:
+                continue
+            elif field_type in self.TAGGED_TYPES:
+                self.tagged_fields.append(field['name'])
+            else:
+                self.compound_fields.append(field['name'])
+        self.num_fields = len(fields)
+
+    @classmethod
+    def _convert(cls, obj):
+        if isinstance(obj, dict):
+            for k, v in obj.items():
+                if isinstance(v, (dict, list)):
+                    obj[k] = cls._convert(v)
+            return CommonJSONDecoder.object_hook(obj)
+        elif isinstance(obj, list):
+            return [cls._convert(v) if isinstance(v, (dict, list)) else v
+                    for v in obj]
+        return obj
+
+    def convert(self, row):
+        if type(row) is not dict or len(row) != self.num_fields:
+            return self._convert(row)
+        for name in self.tagged_fields:
+            value = row.get(name)
+            if type(value) is dict:
+                row[name] = CommonJSONDecoder.object_hook(value)
+        for name in self.compound_fields:
+            value = row.get(name)
+            if isinstance(value, (dict, list)):
+                row[name] = self._convert(value)
+        return row
+
+    def loads(self, line):
+        return self.convert(row_codec().loads(line))
+
+
+def is_duration(obj):
+    if isinstance(obj, datetime.timedelta):
+        return True
+    # isodate is only loaded when durations are decoded - its Durations can't exist before that
+    isodate = sys.modules.get('isodate')
+    return isodate is not None and isinstance(obj, isodate.Duration)
+
+
 class CommonJSONEncoder(_json.JSONEncoder):
     """
     Common JSON Encoder
@@ -110,7 +182,8 @@ class CommonJSONEncoder(_json.JSONEncoder):
             return {'type{datetime}': obj.strftime(DATETIME_F_FORMAT)}
         elif isinstance(obj, datetime.date):
             return {'type{date}': obj.strftime(DATE_F_FORMAT)}
-        elif isinstance(obj, (isodate.Duration, datetime.timedelta)):
+        elif is_duration(obj):
+            import isodate
             return {'type{duration}': isodate.duration_isoformat(obj)}
         elif isinstance(obj, set):
             return {'type{set}': list(obj)}
@@ -119,22 +192,190 @@ class CommonJSONEncoder(_json.JSONEncoder):
         return super().default(obj)
 
 
-def _dumpl(*args, **kwargs):
-    obj = args[0]
+class StdlibCodec(object):
+    """
+    Row codec based on the standard library json module.
+    Rows are encoded with the json module's default separators, unless `compact` is set -
+    codecs which write compact rows must produce exactly the same output as `StdlibCodec(compact=True)`.
+    """
+
+    NAME = 'json'
+
+    def __init__(self, compact=False):
+        self.compact = compact
+        separators = (',', ':') if compact else None
+        self.encoders = dict(
+            ((sort_keys, ensure_ascii),
+             CommonJSONEncoder(sort_keys=sort_keys, ensure_ascii=ensure_ascii, separators=separators))
+            for sort_keys in (True, False)
+            for ensure_ascii in (True, False)
+        )
+        self.decoder = _json.JSONDecoder()
+
+    def dumps(self, obj, sort_keys=True, ensure_ascii=True):
+        return self.encoders[(sort_keys, ensure_ascii)].encode(obj)
+
+    def loads(self, line):
+        return self.decoder.decode(line)
+
+
+def _floats_in_repr_range(obj):
+    """
+    True if all floats in obj are finite and within the range the stdlib writes without an exponent
+    (other codecs write non-finite floats as null, and exponents in a different format).
+    """
+    if isinstance(obj, float):
+        return obj == 0 or 1e-4 <= abs(obj) < 1e16
+    if isinstance(obj, LazyDict):
+        obj = obj.inner
+    if isinstance(obj, dict):
+        return all(_floats_in_repr_range(value) for value in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return all(_floats_in_repr_range(value) for value in obj)
+    return True
+
+
+class OrjsonCodec(StdlibCodec):
+    """
+    orjson writes NaN and Infinity as null and formats exponents differently (e.g. 1e16 vs. 1e+16),
+    doesn't support integers beyond 64 bits and decodes them as floats.
+    Rows which might contain any of these are left to the stdlib.
+    """
+
+    NAME = 'orjson'
+    # Output that may come from a non-finite float or a float in exponent notation
+    SUSPECT_OUTPUT = re.compile(rb'null|[0-9]e|0\.0000')
+    # Input that may contain an integer beyond 64 bits
+    SUSPECT_INPUT = re.compile(r'[0-9]{19}')
+    # Characters the stdlib escapes when ensure_ascii is set
+    UNESCAPED_OUTPUT = re.compile(rb'[^\x20-\x7e]')
+
+    def __init__(self):
+        super().__init__(compact=True)
+        import orjson
+        self.orjson = orjson
+        self.default = CommonJSONEncoder().default
+        self.options = {
+            True: orjson.OPT_SORT_KEYS | orjson.OPT_PASSTHROUGH_DATETIME,
+            False: orjson.OPT_PASSTHROUGH_DATETIME,
+        }
+
+    def dumps(self, obj, sort_keys=True, ensure_ascii=True):
+        try:
+            ret = self.orjson.dumps(obj, default=self.default, option=self.options[sort_keys])
+            if (not ensure_ascii or self.UNESCAPED_OUTPUT.search(ret) is None) and \
+                    (self.SUSPECT_OUTPUT.search(ret) is None or _floats_in_repr_range(obj)):
+                return ret.decode('utf8')
+        except TypeError:
+            pass
+        # Non-ASCII and control characters, too large integers and floats orjson formats differently
+        return super().dumps(obj, sort_keys, ensure_ascii)
+
+    def loads(self, line):
+        if self.SUSPECT_INPUT.search(line) is not None:
+            return super().loads(line)
+        try:
+            return self.orjson.loads(line)
+        except ValueError:
+            # NaN, Infinity etc.
+            return super().loads(line)
+
+
+class RapidjsonCodec(StdlibCodec):
+
+    NAME = 'rapidjson'
+    # Output that rapidjson escapes differently from the stdlib (control characters in upper case hex)
+    SUSPECT_OUTPUT = {
+        True: re.compile(r'[^\x20-\x7e]|\\u00[01]'),
+        False: re.compile(r'\\u00[01]'),
+    }
+
+    def __init__(self):
+        super().__init__(compact=True)
+        import rapidjson
+        self.rapidjson = rapidjson
+        self.default = CommonJSONEncoder().default
+
+    def dumps(self, obj, sort_keys=True, ensure_ascii=True):
+        try:
+            # rapidjson escapes non-ASCII and control characters slightly differently,
+            # so we leave that to the stdlib
+            ret = self.rapidjson.dumps(obj, default=self.default, sort_keys=sort_keys,
+                                       ensure_ascii=False, number_mode=self.rapidjson.NM_NAN)
+            if self.SUSPECT_OUTPUT[ensure_ascii].search(ret) is None:
+                return ret
+        except (TypeError, ValueError, OverflowError):
+            pass
+        return super().dumps(obj, sort_keys, ensure_ascii)
+
+    def loads(self, line):
+        try:
+            return self.rapidjson.loads(line, number_mode=self.rapidjson.NM_NAN)
+        except ValueError:
+            return super().loads(line)
+
+
+class UjsonCodec(StdlibCodec):
+    """
+    ujson serializes decimals and dates on its own, so it's only used for decoding.
+    """
+
+    NAME = 'ujson'
+
+    def __init__(self):
+        super().__init__()
+        import ujson
+        self.ujson = ujson
+
+    def loads(self, line):
+        try:
+            return self.ujson.loads(line)
+        except ValueError:
+            return super().loads(line)
+
+
+JSON_CODEC_ENV_VAR = 'DPP_JSON_CODEC'
+JSON_CODECS = dict(
+    (codec.NAME, codec)
+    for codec in (StdlibCodec, OrjsonCodec, RapidjsonCodec, UjsonCodec)
+)
+_row_codec = None
+
+
+def get_codec(name=None):
+    codec = JSON_CODECS.get(name or StdlibCodec.NAME)
+    if codec is None:
+        logging.warning('Unknown JSON codec %s, using %s', name, StdlibCodec.NAME)
+        codec = StdlibCodec
+    try:
+        return codec()
+    except ImportError:
+        logging.warning('JSON codec %s is not installed, using %s', name, StdlibCodec.NAME)
+        return StdlibCodec()
+
+
+def row_codec():
+    global _row_codec
+    if _row_codec is None:
+        _row_codec = get_codec(os.environ.get(JSON_CODEC_ENV_VAR))
+    return _row_codec
+
+
+def _dumpl(obj, sort_keys=False, ensure_ascii=True, **kwargs):
     if isinstance(obj, LazyJsonLine):
         if not obj.dirty:
             return obj.line
-        else:
-            kwargs['cls'] = CommonJSONEncoder
-            return _json.dumps(obj.inner, **kwargs)
-    kwargs['cls'] = CommonJSONEncoder
-    return _json.dumps(*args, **kwargs)
+        obj = obj.inner
+    if kwargs:
+        kwargs['cls'] = CommonJSONEncoder
+        return _json.dumps(obj, sort_keys=sort_keys, ensure_ascii=ensure_ascii, **kwargs)
+    return row_codec().dumps(obj, sort_keys, ensure_ascii)
 
 
-def _loadl(*args, **kwargs):
+def _loadl(*args, decoder=None, **kwargs):
     if args[0][0] == '{':
         kwargs['cls'] = CommonJSONDecoder
-        return LazyJsonLine(args, kwargs)
+        return LazyJsonLine(args, kwargs, decoder)
     else:
         return _loads(*args, **kwargs)
 
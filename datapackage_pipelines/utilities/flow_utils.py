@@ -1,8 +1,11 @@
-from dataflows import Flow, load, update_package
+from dataflows import Flow, load, update_package, DataStreamProcessor
+from dataflows.base.datastream import DataStream
+from dataflows.base.datastream_processor import LazyIterator
+from dataflows.base.resource_wrapper import ResourceWrapper
 from dataflows.helpers.resource_matcher import ResourceMatcher
 
 from datapackage_pipelines.wrapper import ProcessorContext
-from datapackage_pipelines.utilities.extended_json import LazyJsonLine
+from datapackage_pipelines.utilities.lazy_dict import LazyDict
 
 
 def load_lazy_json(resources):
@@ -14,7 +17,7 @@ def load_lazy_json(resources):
             if matcher.match(rows.res.name):
                 yield (
                     row.inner
-                    if isinstance(row, LazyJsonLine)
+                    if isinstance(row, LazyDict)
                     else row
                     for row in rows
                 )
@@ -47,3 +50,61 @@ def spew_flow(flow, ctx: ProcessorContext):
     ctx.datapackage = datastream.dp.descriptor
     ctx.resource_iterator = datastream.res_iter
     ctx.stats = MergeableStats(datastream.stats, ctx.stats)
+
+
+FAILED_STEP_ATTR = '_dpp_failed_step'
+
+
+def _mark_failed_step(exception, run):
+    if getattr(exception, FAILED_STEP_ATTR, None) is None:
+        setattr(exception, FAILED_STEP_ATTR, run)
+
+
+def failed_step(exception):
+    """Find the step which raised `exception` (or any exception it was raised from)"""
+    while exception is not None:
+        run = getattr(exception, FAILED_STEP_ATTR, None)
+        if run is not None:
+            return run
+        exception = exception.__cause__ or exception.__context__
+    return None
+
+
+class step_boundary(DataStreamProcessor):
+    """
+    Placed after the flow of each step in a fused flow, passes everything through unchanged
+    and marks exceptions coming from the preceding steps with the step that raised them.
+    """
+
+    def __init__(self, run):
+        super().__init__()
+        self.run = run
+
+    def _process(self):
+        try:
+            datastream = self.source._process()
+        except Exception as e:
+            _mark_failed_step(e, self.run)
+            raise
+        return DataStream(datastream.dp,
+                          LazyIterator(lambda: self._guard_resources(datastream.res_iter)),
+                          datastream.stats)
+
+    def _guard_resources(self, res_iter):
+        res_iter = iter(res_iter)
+        while True:
+            try:
+                rw = next(res_iter)
+            except StopIteration:
+                return
+            except Exception as e:
+                _mark_failed_step(e, self.run)
+                raise
+            yield ResourceWrapper(rw.res, self._guard_rows(rw))
+
+    def _guard_rows(self, rows):
+        try:
+            yield from rows
+        except Exception as e:
+            _mark_failed_step(e, self.run)
+            raise
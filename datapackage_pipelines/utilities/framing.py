@@ -0,0 +1,490 @@
+import os
+import time
+import codecs
+import struct
+
+from .extended_json import json, CommonJSONDecoder, CommonJSONEncoder
+from .lazy_dict import LazyDict
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+JSON_FRAMING = 'json'
+MSGPACK_FRAMING = 'msgpack'
+COLUMNAR_FRAMING = 'columnar'
+
+DEFAULT_BATCH_SIZE = 1024
+PASSTHROUGH_BLOCK_SIZE = 256 * 1024
+DEFAULT_WRITE_BUFFER_SIZE = 256 * 1024
+
+
+def batch_size():
+    return int(os.environ.get('DPP_BATCH_SIZE', DEFAULT_BATCH_SIZE))
+
+
+def write_buffer_size():
+    return int(os.environ.get('DPP_WRITE_BUFFER_SIZE', DEFAULT_WRITE_BUFFER_SIZE))
+
+
+class BufferedOutput(object):
+    """
+    Collects encoded rows and writes them to the underlying stream in large chunks,
+    once more than `threshold` bytes (`DPP_WRITE_BUFFER_SIZE`) were collected.
+    Keeps count of the written bytes, and of the time spent writing them (i.e. blocked on the stream).
+    """
+
+    def __init__(self, stream, binary=False, threshold=None):
+        self.stream = stream
+        self.threshold = write_buffer_size() if threshold is None else threshold
+        self.empty = b'' if binary else ''
+        self.chunks = []
+        self.size = 0
+        self.bytes = 0
+        self.blocked = 0.0
+
+    def _write(self, data):
+        start = time.perf_counter()
+        self.stream.write(data)
+        self.blocked += time.perf_counter() - start
+        self.bytes += len(data)
+
+    def write(self, chunk):
+        if len(chunk) >= self.threshold:
+            # No point in copying large chunks around
+            self.flush_buffer()
+            self._write(chunk)
+            return
+        self.chunks.append(chunk)
+        self.size += len(chunk)
+        if self.size >= self.threshold:
+            self.flush_buffer()
+
+    def flush_buffer(self):
+        """Write all collected chunks to the underlying stream (without flushing it)"""
+        if self.size > 0:
+            self._write(self.empty.join(self.chunks))
+        self.chunks.clear()
+        self.size = 0
+
+    def flush(self):
+        self.flush_buffer()
+        start = time.perf_counter()
+        self.stream.flush()
+        self.blocked += time.perf_counter() - start
+
+
+class RecordBatch(object):
+    """
+    A block of rows of a single resource, stored as column arrays.
+    Processors may yield record batches instead of rows from their resource iterators.
+    """
+
+    def __init__(self, fields, columns, length=None):
+        self.fields = list(fields)
+        self.columns = list(columns)
+        if length is None:
+            length = len(self.columns[0]) if len(self.columns) > 0 else 0
+        self.length = length
+
+    @classmethod
+    def from_rows(cls, rows, fields=None):
+        rows = [row.inner if isinstance(row, LazyDict) else row
+                for row in rows]
+        if fields is None:
+            fields = list(rows[0].keys()) if len(rows) > 0 else []
+        return cls(fields, [[row.get(field) for row in rows] for field in fields], len(rows))
+
+    def column(self, field):
+        return self.columns[self.fields.index(field)]
+
+    def rows(self):
+        fields = self.fields
+        if len(fields) == 0:
+            return [{} for _ in range(self.length)]
+        return [dict(zip(fields, values)) for values in zip(*self.columns)]
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        return iter(self.rows())
+
+
+# Kinds of frames, as returned by `read_raw_frame`
+ROW_FRAME = 'row'
+CHUNK_END_FRAME = 'chunk-end'
+RESOURCE_END_FRAME = 'resource-end'
+
+
+class BaseFraming(object):
+
+    NAME = None
+    BINARY = False
+    # Raw terminator of a resource
+    END_OF_RESOURCE = None
+    # Raw marker placed after each chunk of rows sent to the replicas of a parallel step
+    CHUNK_END = None
+
+    # Called whenever a chunk marker is read (and skipped) by `read_row`
+    on_chunk_end = None
+    # While filling a batch, reading stops at a chunk marker, which is only reported on the next read -
+    # once the rows produced from the batch were written
+    stop_at_chunk_end = False
+    chunk_end_pending = False
+
+    def chunk_ended(self):
+        """Called when a chunk marker is read, returns whether reading should stop at the marker"""
+        if self.stop_at_chunk_end:
+            self.chunk_end_pending = True
+            return True
+        if self.on_chunk_end is not None:
+            self.on_chunk_end()
+        return False
+
+    def report_chunk_end(self):
+        """Reports a chunk marker at which the previous batch ended"""
+        if self.chunk_end_pending:
+            self.chunk_end_pending = False
+            if self.on_chunk_end is not None:
+                self.on_chunk_end()
+
+    def output_stream(self, stdout):
+        return stdout
+
+    def encode_text(self, text):
+        return text
+
+    def encode_line(self, line):
+        return self.encode_text(line + '\n')
+
+    def encode_row(self, row):
+        raise NotImplementedError()
+
+    def encode_batch(self, batch: RecordBatch):
+        return self.encode_text('').join(self.encode_row(row) for row in batch.rows())
+
+    def end_resource(self):
+        raise NotImplementedError()
+
+    def end_chunk(self):
+        """Marks that all rows produced from a chunk of input rows were written"""
+        return self.CHUNK_END
+
+    def read_row(self, infile, decoder=None):
+        raise NotImplementedError()
+
+    def read_raw_frame(self, infile):
+        """Returns a tuple of (kind of frame, its raw bytes) without parsing it"""
+        raise NotImplementedError()
+
+    def read_batch(self, infile, size, decoder=None):
+        """Returns a tuple of (batch or None, whether the end of the resource was reached)"""
+        rows = []
+        finished = False
+        self.stop_at_chunk_end = True
+        try:
+            while len(rows) < size:
+                row = self.read_row(infile, decoder)
+                if row is None:
+                    if self.chunk_end_pending:
+                        if len(rows) == 0:
+                            continue
+                        # The batch ends with its chunk
+                        break
+                    finished = True
+                    break
+                rows.append(row)
+        finally:
+            self.stop_at_chunk_end = False
+        if len(rows) == 0:
+            return None, finished
+        return RecordBatch.from_rows(rows), finished
+
+    def copy_resource(self, infile, outputs):
+        """Copy the rest of a resource as-is (including its terminator) to all outputs.
+        Returns the number of copied rows."""
+        raise NotImplementedError()
+
+
+class JSONLinesFraming(BaseFraming):
+    """
+    The classic protocol - one JSON object per line, resources are
+    terminated by an empty line.
+    """
+
+    NAME = JSON_FRAMING
+    END_OF_RESOURCE = b'\n'
+    CHUNK_END = b'#\n'
+
+    def encode_row(self, row):
+        return json.dumpl(row, sort_keys=True, ensure_ascii=True) + '\n'
+
+    def end_resource(self):
+        return '\n'
+
+    def end_chunk(self):
+        return self.CHUNK_END.decode('ascii')
+
+    def read_row(self, infile, decoder=None):
+        self.report_chunk_end()
+        line = infile.readline().strip()
+        while line == b'#':
+            if self.chunk_ended():
+                return None
+            line = infile.readline().strip()
+        if line == b'':
+            return None
+        return json.loadl(line.decode('utf8'), decoder=decoder)
+
+    def read_raw_frame(self, infile):
+        line = infile.readline()
+        if line == b'':
+            raise EOFError('Input stream ended in the middle of a resource')
+        if line == self.CHUNK_END:
+            return CHUNK_END_FRAME, line
+        if line.strip() == b'':
+            return RESOURCE_END_FRAME, line
+        return ROW_FRAME, line
+
+    def copy_resource(self, infile, outputs):
+        decoder = codecs.getincrementaldecoder('utf8')()
+        count = 0
+        at_line_start = True
+        while True:
+            block = infile.peek(PASSTHROUGH_BLOCK_SIZE)[:PASSTHROUGH_BLOCK_SIZE]
+            if len(block) == 0:
+                raise EOFError('Input stream ended in the middle of a resource')
+            if at_line_start and block[:1] == b'\n':
+                end = 1
+            else:
+                end = block.find(b'\n\n')
+                end = end + 2 if end >= 0 else None
+            if end is not None:
+                # The resource ends within this block
+                block = infile.read(end)
+            else:
+                # Copy complete lines only, unless a single line is larger than the block
+                last = block.rfind(b'\n')
+                block = infile.read(last + 1 if last >= 0 else len(block))
+                at_line_start = last >= 0
+            count += block.count(b'\n')
+            text = decoder.decode(block)
+            for output in outputs:
+                output.write(text)
+            if end is not None:
+                # The terminating empty line isn't a row
+                return count - 1
+
+
+class LazyMsgpackFrame(LazyDict):
+
+    def __init__(self, frame, decoder=None):
+        super().__init__()
+        self.frame = frame
+        self.decoder = decoder
+
+    def _evaluate(self):
+        if self.decoder is not None:
+            return self.decoder.convert(msgpack.unpackb(self.frame, raw=False, strict_map_key=False))
+        return MsgpackFraming.unpack(self.frame)
+
+
+class MsgpackFraming(BaseFraming):
+    """
+    Binary protocol - each row is a msgpack payload prefixed by its
+    length (4 bytes, big endian), resources are terminated by an empty frame.
+    Typed values are tagged exactly like in the JSON protocol.
+    """
+
+    NAME = MSGPACK_FRAMING
+    BINARY = True
+    HEADER = struct.Struct('>I')
+    END_OF_RESOURCE = HEADER.pack(0)
+    CHUNK_END_LENGTH = 0xFFFFFFFF
+    CHUNK_END = HEADER.pack(CHUNK_END_LENGTH)
+
+    _encoder = CommonJSONEncoder()
+
+    def __init__(self):
+        self.packer = msgpack.Packer(default=self._encoder.default)
+
+    @staticmethod
+    def unpack(frame):
+        return msgpack.unpackb(frame,
+                               object_hook=CommonJSONDecoder.object_hook,
+                               raw=False, strict_map_key=False)
+
+    def output_stream(self, stdout):
+        stdout.flush()
+        return stdout.buffer
+
+    def encode_text(self, text):
+        return text.encode('utf8')
+
+    def encode_frame(self, frame):
+        return self.HEADER.pack(len(frame)) + frame
+
+    def encode_row(self, row):
+        if isinstance(row, LazyMsgpackFrame) and not row.dirty:
+            return self.encode_frame(row.frame)
+        return self.encode_frame(self.packer.pack(row))
+
+    def end_resource(self):
+        return self.END_OF_RESOURCE
+
+    def read_header(self, infile):
+        header = infile.read(self.HEADER.size)
+        if len(header) < self.HEADER.size:
+            raise EOFError('Input stream ended in the middle of a resource')
+        return header, self.HEADER.unpack(header)[0]
+
+    def read_frame(self, infile):
+        self.report_chunk_end()
+        _, length = self.read_header(infile)
+        while length == self.CHUNK_END_LENGTH:
+            if self.chunk_ended():
+                return None
+            _, length = self.read_header(infile)
+        if length == 0:
+            return None
+        return infile.read(length)
+
+    def read_raw_frame(self, infile):
+        header, length = self.read_header(infile)
+        if length == self.CHUNK_END_LENGTH:
+            return CHUNK_END_FRAME, header
+        if length == 0:
+            return RESOURCE_END_FRAME, header
+        return ROW_FRAME, header + infile.read(length)
+
+    def read_row(self, infile, decoder=None):
+        frame = self.read_frame(infile)
+        if frame is None:
+            return None
+        return LazyMsgpackFrame(frame, decoder)
+
+    def frame_row_count(self, frame):
+        return 1
+
+    def copy_resource(self, infile, outputs):
+        count = 0
+        while True:
+            frame = self.read_frame(infile)
+            chunk = self.END_OF_RESOURCE if frame is None else self.encode_frame(frame)
+            for output in outputs:
+                output.write(chunk)
+            if frame is None:
+                return count
+            count += self.frame_row_count(frame)
+
+
+class ColumnarFraming(MsgpackFraming):
+    """
+    Binary protocol - rows are shipped in blocks of up to `DPP_BATCH_SIZE` rows,
+    each block is a msgpack frame holding the number of rows, a list of field names and a list of columns.
+    Rows with a different set of keys start a new block.
+    """
+
+    NAME = COLUMNAR_FRAMING
+
+    def __init__(self):
+        super().__init__()
+        self.batch_size = batch_size()
+        # Values of the rows of the pending block, copied as the rows are encoded,
+        # as processors may reuse or modify a row after yielding it
+        self.pending_columns = []
+        self.pending_length = 0
+        self.pending_fields = None
+        self.incoming = []
+
+    def _flush(self):
+        if self.pending_length == 0:
+            return b''
+        batch = RecordBatch(self.pending_fields, self.pending_columns, self.pending_length)
+        self.pending_columns = []
+        self.pending_length = 0
+        self.pending_fields = None
+        return self._encode_batch(batch)
+
+    def _encode_batch(self, batch):
+        return self.encode_frame(self.packer.pack([batch.length, batch.fields, batch.columns]))
+
+    def encode_row(self, row):
+        if isinstance(row, LazyDict):
+            row = row.inner
+        fields = list(row.keys())
+        ret = b''
+        if self.pending_fields is not None and fields != self.pending_fields:
+            ret = self._flush()
+        if self.pending_fields is None:
+            self.pending_fields = fields
+            self.pending_columns = [[] for _ in fields]
+        for column, value in zip(self.pending_columns, row.values()):
+            column.append(value)
+        self.pending_length += 1
+        if self.pending_length >= self.batch_size:
+            ret += self._flush()
+        return ret
+
+    def encode_batch(self, batch: RecordBatch):
+        return self._flush() + self._encode_batch(batch)
+
+    def end_resource(self):
+        return self._flush() + self.END_OF_RESOURCE
+
+    def end_chunk(self):
+        return self._flush() + self.CHUNK_END
+
+    def _read_next_batch(self, infile):
+        frame = self.read_frame(infile)
+        if frame is None:
+            return None
+        length, fields, columns = self.unpack(frame)
+        return RecordBatch(fields, columns, length)
+
+    def frame_row_count(self, frame):
+        unpacker = msgpack.Unpacker()
+        unpacker.feed(frame)
+        unpacker.read_array_header()
+        return unpacker.unpack()
+
+    def read_row(self, infile, decoder=None):
+        if len(self.incoming) == 0:
+            batch = self._read_next_batch(infile)
+            if batch is None:
+                return None
+            self.incoming = batch.rows()
+            self.incoming.reverse()
+        return self.incoming.pop()
+
+    def read_batch(self, infile, size, decoder=None):
+        if len(self.incoming) > 0:
+            # Leftovers from row-by-row reading
+            self.incoming.reverse()
+            batch = RecordBatch.from_rows(self.incoming)
+            self.incoming = []
+            return batch, False
+        batch = self._read_next_batch(infile)
+        return batch, batch is None
+
+
+FRAMINGS = {
+    JSON_FRAMING: JSONLinesFraming,
+    MSGPACK_FRAMING: MsgpackFraming,
+    COLUMNAR_FRAMING: ColumnarFraming,
+}
+
+
+def framing_available(name):
+    if name in (MSGPACK_FRAMING, COLUMNAR_FRAMING):
+        return msgpack is not None
+    return name in FRAMINGS
+
+
+def get_framing(name=None):
+    if not name:
+        name = JSON_FRAMING
+    return FRAMINGS[name]()
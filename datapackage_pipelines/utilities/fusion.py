@@ -0,0 +1,84 @@
+import os
+import ast
+import functools
+
+LIB_PATH = os.path.realpath(os.path.join(os.path.dirname(__file__), '..', 'lib'))
+FUSED_FLOW = os.path.join(LIB_PATH, 'internal', 'fused_flow.py')
+
+# Logged by a fused step before failing, followed by the `run` of the step that failed
+FAILED_STEP_MARKER = 'FAILED FUSED STEP: '
+
+
+@functools.lru_cache(maxsize=None)
+def flow_arity(executor):
+    """
+    Returns the number of arguments of the top-level `flow()` function of a standard processor
+    (1 for `flow(parameters)`, 2 for `flow(parameters, stats)`) or None if it has none.
+    """
+    if os.path.dirname(os.path.realpath(executor)) != LIB_PATH:
+        return None
+    try:
+        with open(executor, 'rb') as f:
+            tree = ast.parse(f.read(), executor)
+    except (OSError, SyntaxError):
+        return None
+    for node in tree.body:
+        if isinstance(node, ast.FunctionDef) and node.name == 'flow':
+            arity = len(node.args.args)
+            return arity if arity in (1, 2) else None
+    return None
+
+
+def fusable(step):
+    return (
+        flow_arity(step['executor']) is not None and
+        not step.get('cache') and
+        not step.get('checkpoint') and
+        not step.get('validate') and
+        step.get('parallelism', 1) == 1 and
+        step.get('runner') is None and
+        not step.get('profile') and
+        not step.get('trace-memory')
+    )
+
+
+def fuse_flow_steps(pipeline_steps):
+    """
+    Replace runs of adjacent standard processors which are implemented as dataflows flows
+    with a single step, running all of these flows in one process.
+    """
+    ret = []
+    run = []
+
+    def flush():
+        if len(run) > 1:
+            ret.append({
+                'run': '+'.join(step['run'] for step in run),
+                'executor': FUSED_FLOW,
+                'parameters': {
+                    'steps': [
+                        {
+                            'run': step['run'],
+                            'executor': step['executor'],
+                            'parameters': step.get('parameters', {}),
+                        }
+                        for step in run
+                    ]
+                },
+                '_cache_hash': run[-1]['_cache_hash'],
+                '__fused': [step['run'] for step in run],
+            })
+        else:
+            ret.extend(run)
+        run.clear()
+
+    for step in pipeline_steps:
+        if 'branches' in step:
+            step = dict(step, branches=[fuse_flow_steps(branch) for branch in step['branches']])
+        if fusable(step):
+            run.append(step)
+        else:
+            flush()
+            ret.append(step)
+    flush()
+    return ret
@@ -0,0 +1,97 @@
+"""
+Memory tracing of steps, using tracemalloc.
+
+Every step reports its peak RSS (`max_rss`, see step_stats.py), which is always stored in the
+stats of the execution. Steps with `trace-memory: true`
+(or all steps of a pipeline with `trace-memory: true`) also trace the allocations of the
+processor, and report the peak of traced memory and the lines which allocated most of the memory
+held around that peak. As tracemalloc can't tell what was allocated at the peak itself, a thread
+takes a snapshot of the traced memory whenever it grows by more than SNAPSHOT_GROWTH since the
+previous snapshot - so the reported sites are from a snapshot taken close to the peak.
+Tracing slows processors down noticeably, and adds to their memory usage.
+The stats of all steps are stored when a pipeline traces memory, as the results are part of them.
+"""
+import os
+import threading
+
+TRACE_MEMORY_ENV_VAR = 'DPP_TRACE_MEMORY'
+TRACE_MEMORY_KEY = 'trace-memory'
+CHECK_INTERVAL = 0.2
+SNAPSHOT_GROWTH = 1.2
+TOP_ALLOCATIONS = 10
+
+STATS_TRACED_PEAK_KEY = 'traced_peak'
+STATS_TOP_ALLOCATIONS_KEY = 'top_allocations'
+
+
+def traces_memory(pipeline_details):
+    """True if the pipeline, or any of its steps (including steps within branches), traces memory"""
+    def traced(steps):
+        return any(step.get(TRACE_MEMORY_KEY) or any(traced(branch) for branch in step.get('branches', []))
+                   for step in steps)
+    return bool(pipeline_details.get(TRACE_MEMORY_KEY)) or traced(pipeline_details.get('pipeline', []))
+
+
+def memory_tracing_enabled():
+    return os.environ.get(TRACE_MEMORY_ENV_VAR, '') not in ('', '0')
+
+
+def top_allocations(snapshot, limit=TOP_ALLOCATIONS):
+    """The lines which allocated most of the memory held in `snapshot`"""
+    import tracemalloc
+    snapshot = snapshot.filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+        tracemalloc.Filter(False, '<unknown>'),
+    ])
+    return [
+        {
+            'site': '{}:{}'.format(stat.traceback[0].filename, stat.traceback[0].lineno),
+            'size': stat.size,
+            'count': stat.count,
+        }
+        for stat in snapshot.statistics('lineno')[:limit]
+    ]
+
+
+class MemoryTracer(threading.Thread):
+    """Traces the allocations of the current process, keeping a snapshot taken close to the peak"""
+
+    def __init__(self, interval=CHECK_INTERVAL):
+        super().__init__(daemon=True)
+        import tracemalloc
+        self.tracemalloc = tracemalloc
+        self.interval = interval
+        self.snapshot = None
+        self.snapshot_size = 0
+        self.stopped = threading.Event()
+        tracemalloc.start()
+        self.start()
+
+    @classmethod
+    def from_env(cls):
+        return cls() if memory_tracing_enabled() else None
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.check()
+
+    def check(self):
+        current, _ = self.tracemalloc.get_traced_memory()
+        if current > self.snapshot_size * SNAPSHOT_GROWTH:
+            self.snapshot = self.tracemalloc.take_snapshot()
+            self.snapshot_size = current
+
+    def stop(self):
+        """Stops tracing, returns the stats to report"""
+        self.stopped.set()
+        self.join()
+        self.check()
+        _, peak = self.tracemalloc.get_traced_memory()
+        allocations = top_allocations(self.snapshot)
+        self.tracemalloc.stop()
+        return {
+            STATS_TRACED_PEAK_KEY: peak,
+            STATS_TOP_ALLOCATIONS_KEY: allocations,
+        }
@@ -0,0 +1,176 @@
+"""
+Profiling of single steps.
+
+A step with `profile: true` (or `profile: cprofile`) runs its processor under cProfile, and a step
+with `profile: sample` is sampled by a thread which records the stack of the processor every
+few milliseconds - a much lower overhead, at the price of precision.
+The manager passes the mode and a directory to the processor in environment variables, and the
+processor (see wrapper.py) writes its profile to that directory before exiting. Once the pipeline
+is done, the manager combines the profiles of each step (e.g. of all replicas of a parallel step)
+and stores them with the execution.
+
+Profiles are either pstats (cProfile) or collapsed stacks, one line per stack with its frames
+separated by ';' followed by the number of samples (the input format of flamegraph.pl, speedscope
+and others).
+"""
+import os
+import sys
+import base64
+import threading
+import collections
+
+PROFILE_ENV_VAR = 'DPP_PROFILE'
+PROFILE_DIR_ENV_VAR = 'DPP_PROFILE_DIR'
+SAMPLE_INTERVAL_ENV_VAR = 'DPP_PROFILE_INTERVAL'
+DEFAULT_SAMPLE_INTERVAL = 0.005
+
+CPROFILE = 'cprofile'
+SAMPLE = 'sample'
+PROFILE_ARTIFACT = 'profile'
+# Number of functions (or stacks) in the text report of a profile
+REPORT_LINES = 50
+
+
+def profile_mode(step):
+    """The profiling mode of a step, or None if it's not profiled"""
+    profile = step.get('profile', False)
+    if profile is True:
+        return CPROFILE
+    if profile in (CPROFILE, SAMPLE):
+        return profile
+    return None
+
+
+def frame_name(frame):
+    code = frame.f_code
+    return '{} ({}:{})'.format(code.co_name, code.co_filename, code.co_firstlineno)
+
+
+def collapse(frame):
+    stack = []
+    while frame is not None:
+        stack.append(frame_name(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(stack))
+
+
+class StackSampler(threading.Thread):
+    """Counts the stacks of a thread (by default, the main thread), sampled at a fixed interval"""
+
+    def __init__(self, interval=None, thread_id=None):
+        super().__init__(daemon=True)
+        if interval is None:
+            interval = float(os.environ.get(SAMPLE_INTERVAL_ENV_VAR, DEFAULT_SAMPLE_INTERVAL))
+        self.interval = interval
+        self.thread_id = thread_id or threading.main_thread().ident
+        self.stacks = collections.Counter()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[collapse(frame)] += 1
+
+    def disable(self):
+        self.stopped.set()
+        self.join()
+
+    def dump_stats(self, filename):
+        with open(filename, 'w') as f:
+            for stack, count in self.stacks.items():
+                f.write('{} {}\n'.format(stack, count))
+
+
+class Profiler(object):
+    """Profiles the current process, if the manager asked for it"""
+
+    def __init__(self, mode, directory):
+        self.mode = mode
+        self.directory = directory
+        if mode == CPROFILE:
+            import cProfile
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        else:
+            self.profiler = StackSampler()
+            self.profiler.start()
+
+    @classmethod
+    def from_env(cls):
+        mode = os.environ.get(PROFILE_ENV_VAR)
+        directory = os.environ.get(PROFILE_DIR_ENV_VAR)
+        if mode in (CPROFILE, SAMPLE) and directory:
+            return cls(mode, directory)
+        return None
+
+    def stop(self):
+        self.profiler.disable()
+        self.profiler.dump_stats(os.path.join(self.directory, '{}.{}'.format(os.getpid(), self.mode)))
+
+
+def _profile_files(directory, mode):
+    return sorted(os.path.join(directory, filename)
+                  for filename in os.listdir(directory)
+                  if filename.endswith('.' + mode))
+
+
+def collect_profile(directory, mode):
+    """
+    Combines the profiles written to `directory` by the processes of a step.
+    Returns a dict with a text `report` and the combined profile (`pstats`, base64 encoded, or
+    `collapsed` stacks), or None if no profiles were written.
+    """
+    filenames = _profile_files(directory, mode)
+    if len(filenames) == 0:
+        return None
+    if mode == CPROFILE:
+        import io
+        import pstats
+        import marshal
+        report = io.StringIO()
+        stats = pstats.Stats(*filenames, stream=report)
+        stats.sort_stats('cumulative').print_stats(REPORT_LINES)
+        return {
+            'mode': mode,
+            'processes': len(filenames),
+            'report': report.getvalue(),
+            'pstats': base64.b64encode(marshal.dumps(stats.stats)).decode('ascii'),
+        }
+
+    stacks = collections.Counter()
+    for filename in filenames:
+        with open(filename) as f:
+            for line in f:
+                stack, _, count = line.rstrip('\n').rpartition(' ')
+                stacks[stack] += int(count)
+    collapsed = ''.join('{} {}\n'.format(stack, count) for stack, count in sorted(stacks.items()))
+    return {
+        'mode': mode,
+        'processes': len(filenames),
+        'report': sampled_report(stacks),
+        'collapsed': collapsed,
+    }
+
+
+def sampled_report(stacks):
+    """The functions found on most samples, along with the share of samples they were running"""
+    total = sum(stacks.values())
+    inclusive = collections.Counter()
+    own = collections.Counter()
+    for stack, count in stacks.items():
+        frames = stack.split(';')
+        for frame in set(frames):
+            inclusive[frame] += count
+        own[frames[-1]] += count
+    lines = ['{} samples'.format(total), '', '{:>8} {:>8}  function'.format('total%', 'self%')]
+    for frame, count in inclusive.most_common(REPORT_LINES):
+        lines.append('{:>8.1f} {:>8.1f}  {}'.format(100 * count / total, 100 * own[frame] / total, frame))
+    return '\n'.join(lines) + '\n'
+
+
+def profile_data(profile):
+    """The combined profile, as stored in a file: pstats (binary) or collapsed stacks (text)"""
+    if profile['mode'] == CPROFILE:
+        return base64.b64decode(profile['pstats'])
+    return profile['collapsed'].encode('utf8')
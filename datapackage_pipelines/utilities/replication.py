@@ -0,0 +1,280 @@
+"""
+Data-parallel execution of a single step.
+
+A step with `parallelism: N` runs as N replicas of its processor, between a fan-out process
+(which deals the rows of each resource to the replicas in chunks, each followed by a chunk marker)
+and a fan-in process (which merges the outputs of the replicas back into a single stream).
+The wrapper of each replica echoes every chunk marker it reads to its output, once all rows
+produced from that chunk were written - so the fan-in process knows where each chunk ends,
+and can restore the original order of the rows.
+"""
+import os
+import queue
+import decimal
+import threading
+
+from .extended_json import json
+from .resources import streaming
+from .framing import ROW_FRAME, RESOURCE_END_FRAME
+
+REPLICA_ENV_VAR = 'DPP_REPLICA'
+CHUNK_SIZE_ENV_VAR = 'DPP_PARALLEL_CHUNK_SIZE'
+# Number of rows (frames, with columnar framing) in each chunk dealt to the replicas
+DEFAULT_CHUNK_SIZE = 128
+# Chunks are also cut once they're this large (in bytes)
+MAX_CHUNK_BYTES = 64 * 1024
+# Chunks waiting to be written to (or merged from) each replica
+QUEUE_SIZE = 4
+
+ORDERED = 'ordered'
+UNORDERED = 'unordered'
+
+PARTIAL_CHUNK = 'partial'
+FAILED = 'failed'
+
+
+def chunk_size():
+    return int(os.environ.get(CHUNK_SIZE_ENV_VAR, DEFAULT_CHUNK_SIZE))
+
+
+def replica_index():
+    """Index of the current process among the replicas of a parallel step, or None"""
+    index = os.environ.get(REPLICA_ENV_VAR)
+    return int(index) if index else None
+
+
+def count_streamed_resources(dp_line):
+    dp = json.loads(dp_line.decode('utf8'))
+    return len([resource for resource in dp.get('resources', []) if streaming(resource)])
+
+
+def _is_number(value):
+    return isinstance(value, (int, float, decimal.Decimal)) and not isinstance(value, bool)
+
+
+def merge_stats(all_stats):
+    """
+    Combines the stats of all replicas: numbers are summed and dicts are merged recursively.
+    For any other value, the value of the first replica is used.
+    """
+    ret = {}
+    for stats in all_stats:
+        for key, value in stats.items():
+            if key not in ret:
+                ret[key] = value
+            elif isinstance(value, dict) and isinstance(ret[key], dict):
+                ret[key] = merge_stats([ret[key], value])
+            elif _is_number(value) and _is_number(ret[key]):
+                ret[key] += value
+    return ret
+
+
+class _ChunkWriter(threading.Thread):
+    """Writes to a single replica, so that a busy replica doesn't hold back the others"""
+
+    def __init__(self, outfile):
+        super().__init__(daemon=True)
+        self.outfile = outfile
+        self.queue = queue.Queue(QUEUE_SIZE)
+        self.error = None
+        self.start()
+
+    def run(self):
+        while True:
+            data = self.queue.get()
+            if data is None:
+                break
+            if self.error is None:
+                try:
+                    self.outfile.write(data)
+                    self.outfile.flush()
+                except Exception as e:  # noqa
+                    self.error = e
+
+    def put(self, data):
+        if self.error is not None:
+            raise self.error
+        self.queue.put(data)
+
+    def close(self):
+        self.queue.put(None)
+        self.join()
+        if self.error is None:
+            self.outfile.close()
+        else:
+            raise self.error
+
+
+def fan_out(infile, outfiles, framing, mode=ORDERED, size=None):
+    """
+    Deals the rows of each resource read from `infile` to the replicas' `outfiles`, in chunks of
+    `size` rows. In ordered mode, chunks are dealt round robin, otherwise each chunk goes
+    to the replica with the least chunks waiting for it.
+    """
+    size = chunk_size() if size is None else size
+    writers = [_ChunkWriter(outfile) for outfile in outfiles]
+
+    def least_busy(_):
+        return min(writers, key=lambda writer: writer.queue.qsize())
+
+    def round_robin(index):
+        return writers[index % len(writers)]
+
+    select = round_robin if mode == ORDERED else least_busy
+    try:
+        dependency_line = infile.readline()
+        dp_line = infile.readline()
+        header = dependency_line + dp_line + infile.readline()
+        for writer in writers:
+            writer.put(header)
+        num_resources = count_streamed_resources(dp_line)
+
+        for _ in range(num_resources):
+            index = 0
+            chunk = []
+            chunk_bytes = 0
+            while True:
+                kind, frame = framing.read_raw_frame(infile)
+                if kind == ROW_FRAME:
+                    chunk.append(frame)
+                    chunk_bytes += len(frame)
+                if len(chunk) >= size or chunk_bytes >= MAX_CHUNK_BYTES or \
+                        (kind == RESOURCE_END_FRAME and len(chunk) > 0):
+                    chunk.append(framing.CHUNK_END)
+                    select(index).put(b''.join(chunk))
+                    index += 1
+                    chunk = []
+                    chunk_bytes = 0
+                if kind == RESOURCE_END_FRAME:
+                    for writer in writers:
+                        writer.put(frame)
+                    break
+
+        # Stats of previous steps are passed to one replica only, so they're not counted N times
+        stats_line = infile.readline()
+        if stats_line != b'':
+            writers[0].put(stats_line)
+            for writer in writers[1:]:
+                writer.put(b'\n')
+    finally:
+        for writer in writers:
+            writer.close()
+
+
+class _ChunkReader(threading.Thread):
+    """Reads the chunks of a single replica, in advance"""
+
+    def __init__(self, infile, framing, num_resources, chunks, resume=None):
+        super().__init__(daemon=True)
+        self.infile = infile
+        self.framing = framing
+        self.num_resources = num_resources
+        self.chunks = chunks
+        self.resume = resume
+        self.start()
+
+    def run(self):
+        try:
+            for _ in range(self.num_resources):
+                self.read_resource()
+                if self.resume is not None:
+                    self.resume.acquire()
+        except Exception as e:  # noqa
+            self.chunks.put((self, FAILED, e))
+
+    def read_resource(self):
+        chunk = []
+        chunk_bytes = 0
+        while True:
+            kind, frame = self.framing.read_raw_frame(self.infile)
+            if kind == ROW_FRAME:
+                chunk.append(frame)
+                chunk_bytes += len(frame)
+                if chunk_bytes >= MAX_CHUNK_BYTES:
+                    # Don't hold on to too much data
+                    kind = PARTIAL_CHUNK
+                else:
+                    continue
+            self.chunks.put((self, kind, b''.join(chunk)))
+            if kind == RESOURCE_END_FRAME:
+                return
+            chunk = []
+            chunk_bytes = 0
+
+    def get(self):
+        _, kind, data = self.chunks.get()
+        if kind == FAILED:
+            raise data
+        return kind, data
+
+
+def _merge_ordered(readers, outfile):
+    finished = set()
+    index = 0
+    while len(finished) < len(readers):
+        reader = readers[index % len(readers)]
+        index += 1
+        if reader in finished:
+            continue
+        kind = PARTIAL_CHUNK
+        while kind == PARTIAL_CHUNK:
+            kind, data = reader.get()
+            outfile.write(data)
+        if kind == RESOURCE_END_FRAME:
+            finished.add(reader)
+
+
+def _merge_unordered(chunks, num_readers, outfile):
+    finished = 0
+    while finished < num_readers:
+        _, kind, data = chunks.get()
+        if kind == FAILED:
+            raise data
+        outfile.write(data)
+        if kind == RESOURCE_END_FRAME:
+            finished += 1
+
+
+def fan_in(infiles, outfile, framing, mode=ORDERED):
+    """
+    Merges the outputs of all replicas (`infiles`) into `outfile`. In ordered mode, the chunks
+    are merged in the same order they were dealt by `fan_out`, otherwise as they arrive.
+    """
+    headers = [(infile.readline(), infile.readline(), infile.readline()) for infile in infiles]
+    dependency_line, dp_line, empty_line = headers[0]
+    for i, (_, other_dp_line, _) in enumerate(headers[1:], 1):
+        if other_dp_line != dp_line:
+            raise ValueError('Replica %d produced a different datapackage than replica 0' % i)
+    outfile.write(dependency_line + dp_line + empty_line)
+    outfile.flush()
+    num_resources = count_streamed_resources(dp_line)
+
+    if mode == ORDERED:
+        readers = [_ChunkReader(infile, framing, num_resources, queue.Queue(QUEUE_SIZE))
+                   for infile in infiles]
+    else:
+        chunks = queue.Queue(QUEUE_SIZE * len(infiles))
+        readers = [_ChunkReader(infile, framing, num_resources, chunks, threading.Semaphore(0))
+                   for infile in infiles]
+
+    for _ in range(num_resources):
+        if mode == ORDERED:
+            _merge_ordered(readers, outfile)
+        else:
+            _merge_unordered(chunks, len(readers), outfile)
+            for reader in readers:
+                reader.resume.release()
+        outfile.write(framing.END_OF_RESOURCE)
+        outfile.flush()
+    for reader in readers:
+        reader.join()
+
+    all_stats = []
+    for i, infile in enumerate(infiles):
+        stats_line = infile.readline()
+        if stats_line == b'':
+            raise EOFError('Replica %d ended without sending its stats' % i)
+        all_stats.append(json.loads(stats_line.decode('utf8')) if stats_line.strip() else {})
+    stats_json = json.dumps(merge_stats(all_stats), sort_keys=True, ensure_ascii=True)
+    outfile.write(stats_json.encode('ascii') + b'\n')
+    outfile.flush()
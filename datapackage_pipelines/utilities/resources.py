@@ -1,3 +1,6 @@
+import re
+
+
 def is_a_url(path):
     return (path is not None and isinstance(path, str) and
             (path.startswith('http://') or
@@ -34,3 +37,31 @@ def get_path(descriptor):
 PATH_PLACEHOLDER = '_'
 PROP_STREAMED_FROM = 'dpp:streamedFrom'
 PROP_STREAMING = 'dpp:streaming'
+
+
+class ResourceMatcher(object):
+    """
+    Same as dataflows' ResourceMatcher, for processors that would
+    otherwise import all of dataflows (which is slow) just for it.
+    """
+
+    def __init__(self, resources, datapackage):
+        self.resources = resources
+        self.re = False
+        if isinstance(resources, str):
+            self.resources = re.compile('^' + resources + '$')
+            self.re = True
+        elif isinstance(resources, int):
+            if isinstance(datapackage, dict):
+                self.resources = [datapackage['resources'][resources]['name']]
+            else:
+                self.resources = [datapackage.resources[resources].name]
+        else:
+            assert resources is None or isinstance(resources, list)
+
+    def match(self, name):
+        if self.resources is None:
+            return True
+        if self.re:
+            return self.resources.match(name) is not None
+        return name in self.resources
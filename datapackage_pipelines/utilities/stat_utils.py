@@ -1,5 +1,6 @@
 STATS_DPP_KEY = '.dpp'
 STATS_OUT_DP_URL_KEY = 'out-datapackage-url'
+STATS_VALIDATION_KEY = 'validation'
 
 
 def user_facing_stats(stats):
@@ -0,0 +1,114 @@
+"""
+Per-step instrumentation.
+
+Each processor measures how many rows and bytes it read and wrote, and how long it spent
+waiting for its input (i.e. for the previous step) and for its output (i.e. for the next step).
+Before exiting, it reports these along with its CPU time and peak memory on stderr, in a single
+line starting with STEP_STATS_MAGIC. The manager adds the wall time of each process, and when
+step stats are enabled (`dpp run --step-stats`, DPP_STEP_STATS=1, tracing or memory tracing),
+stores the stats of all steps in the stats of the execution, under STATS_DPP_KEY.
+The peak memory of each step is always stored (under STATS_MAX_RSS_KEY), but isn't sent to hooks.
+"""
+import io
+import os
+import sys
+import time
+
+from .extended_json import json
+from .stat_utils import STATS_DPP_KEY
+
+STEP_STATS_MAGIC = '>>> STEP STATS: '
+STATS_STEPS_KEY = 'steps'
+STATS_LIMITING_STEP_KEY = 'limiting_step'
+STATS_MAX_RSS_KEY = 'max_rss'
+INPUT_BUFFER_SIZE = 64 * 1024
+# When set, processors also report when each resource started and finished passing through them
+TRACE_ENV_VAR = 'DPP_TRACE'
+# When set, the stats of each step are stored in the stats of the execution
+STEP_STATS_ENV_VAR = 'DPP_STEP_STATS'
+
+
+def tracing_enabled():
+    return os.environ.get(TRACE_ENV_VAR, '') not in ('', '0')
+
+
+def step_stats_enabled():
+    return os.environ.get(STEP_STATS_ENV_VAR, '') not in ('', '0') or tracing_enabled()
+
+
+class MeteredReader(io.RawIOBase):
+    """Counts the bytes read from a raw stream and the time spent waiting for them"""
+
+    def __init__(self, raw):
+        super().__init__()
+        self.raw = raw
+        self.bytes = 0
+        self.blocked = 0.0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        start = time.perf_counter()
+        count = self.raw.readinto(buffer)
+        self.blocked += time.perf_counter() - start
+        if count:
+            self.bytes += count
+        return count
+
+
+def metered_input(stream):
+    """Returns a buffered reader on the same file as `stream` (e.g. sys.stdin.buffer), and its meter"""
+    meter = MeteredReader(getattr(stream, 'raw', stream))
+    return io.BufferedReader(meter, INPUT_BUFFER_SIZE), meter
+
+
+def resource_usage():
+    """CPU time (in seconds) and peak memory usage (in bytes) of the current process"""
+    try:
+        import resource
+    except ImportError:
+        return {}
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    # ru_maxrss is in kilobytes, except on macOS
+    max_rss = usage.ru_maxrss if sys.platform == 'darwin' else usage.ru_maxrss * 1024
+    return {
+        'cpu_time': round(usage.ru_utime + usage.ru_stime, 3),
+        'max_rss': max_rss,
+    }
+
+
+def report_step_stats(**stats):
+    stats.update(resource_usage())
+    for key, value in stats.items():
+        if isinstance(value, float):
+            stats[key] = round(value, 3)
+    # Written to the original stderr, as processors may redirect sys.stderr to the log
+    stream = sys.__stderr__
+    stream.write(STEP_STATS_MAGIC + json.dumps(stats, sort_keys=True) + '\n')
+    stream.flush()
+
+
+def max_rss_stats(all_step_stats):
+    """The peak memory of each step, from the stats reported by its process"""
+    return [{'step': step_stats['step'], STATS_MAX_RSS_KEY: step_stats[STATS_MAX_RSS_KEY]}
+            for step_stats in all_step_stats
+            if STATS_MAX_RSS_KEY in step_stats]
+
+
+def hook_stats(stats):
+    """The stats of an execution as sent to hooks, without the peak memory of each step"""
+    if not isinstance(stats, dict) or STATS_MAX_RSS_KEY not in stats.get(STATS_DPP_KEY, {}):
+        return stats
+    dpp_stats = dict((key, value) for key, value in stats[STATS_DPP_KEY].items() if key != STATS_MAX_RSS_KEY)
+    return dict(stats, **{STATS_DPP_KEY: dpp_stats})
+
+
+def parse_step_stats(line):
+    """Returns the stats reported in a line of a processor's stderr, or None if it's not a stats line"""
+    if not line.startswith(STEP_STATS_MAGIC):
+        return None
+    try:
+        return json.loads(line[len(STEP_STATS_MAGIC):])
+    except json.JSONDecodeError:
+        return None
@@ -0,0 +1,30 @@
+import os
+import hashlib
+import logging
+
+# Directory in which the processors of a single pipeline execution record
+# the datapackage descriptors that were already validated
+VALIDATION_CACHE_ENV_VAR = 'DPP_VALIDATION_CACHE'
+
+
+def _cache_path(descriptor_line):
+    cache_dir = os.environ.get(VALIDATION_CACHE_ENV_VAR)
+    if not cache_dir:
+        return None
+    return os.path.join(cache_dir, hashlib.sha256(descriptor_line).hexdigest())
+
+
+def is_validated(descriptor_line):
+    """Was this descriptor (as serialized bytes) already validated during the current execution?"""
+    path = _cache_path(descriptor_line)
+    return path is not None and os.path.exists(path)
+
+
+def mark_validated(descriptor_line):
+    path = _cache_path(descriptor_line)
+    if path is None:
+        return
+    try:
+        open(path, 'ab').close()
+    except OSError:
+        logging.warning('Failed to record validated descriptor in %s', path)
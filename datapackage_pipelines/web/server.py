@@ -19,6 +19,8 @@ from flask_basicauth import BasicAuth
 
 from datapackage_pipelines.status import status_mgr
 from datapackage_pipelines.utilities.stat_utils import user_facing_stats
+from datapackage_pipelines.utilities.profiler import PROFILE_ARTIFACT
+from datapackage_pipelines.manager.trace import TRACE_ARTIFACT
 
 YAML_DUMPER = yaml.CDumper if 'CDumper' in yaml.__dict__ else yaml.Dumper
 
@@ -137,6 +139,7 @@ def main(pipeline_path=None):
             'message': pipeline_status.state().capitalize(),
             'dirty': pipeline_status.dirty(),
             'runnable': pipeline_status.runnable(),
+            'profiled': ex is not None and PROFILE_ARTIFACT in ex.artifacts,
             'class': {'INIT': 'primary',
                       'QUEUED': 'primary',
                       'INVALID': 'danger',
@@ -224,6 +227,18 @@ def pipeline_raw_api(pipeline_id):
     return jsonify(ret)
 
 
+@blueprint.route("api/trace/<path:pipeline_id>")
+@basic_auth_required
+def pipeline_trace_api(pipeline_id):
+    if not pipeline_id.startswith('./'):
+        pipeline_id = './' + pipeline_id
+    last_execution = status.get(pipeline_id).get_last_execution()
+    trace = last_execution.get_artifact(TRACE_ARTIFACT) if last_execution else None
+    if trace is None:
+        abort(404)
+    return jsonify(trace)
+
+
 @blueprint.route("api/<field>/<path:pipeline_id>")
 @basic_auth_required
 def pipeline_api(field, pipeline_id):
@@ -244,6 +259,11 @@ def pipeline_api(field, pipeline_id):
     elif field == 'log':
         ex = pipeline_status.get_last_execution()
         ret = ex.log if ex else ''
+    elif field == 'profile':
+        ex = pipeline_status.get_last_execution()
+        profiles = (ex.get_artifact(PROFILE_ARTIFACT) if ex else None) or []
+        ret = '\n'.join('{index} {step} ({mode}):\n{report}'.format(**profile)
+                        for profile in profiles)
     else:
         abort(400)
 
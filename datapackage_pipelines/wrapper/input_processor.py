@@ -2,25 +2,42 @@ import sys
 import copy
 import logging
 
-import datapackage
-from tableschema.exceptions import ValidationError, CastError
-from tableschema import Schema
-
 from ..utilities.resources import PATH_PLACEHOLDER, streaming
-from ..utilities.extended_json import json
+from ..utilities.extended_json import json, TypedRowDecoder
+from ..utilities.framing import get_framing, batch_size, RecordBatch
+from ..utilities.validation_cache import is_validated, mark_validated
+
+from .validation import ResourceValidator, parse_validation_mode
 
 
 class ResourceIterator(object):
 
     def __init__(self, infile, spec, orig_spec,
-                 validate=False, debug=False):
+                 validate=False, debug=False, framing=None, validation_stats=None):
         self.spec = spec
-        self.table_schema = Schema(orig_spec['schema'])
+        self.orig_spec = orig_spec
+        self._table_schema = None
         self.field_names = [f['name'] for f in orig_spec['schema']['fields']]
-        self.validate = validate
+        self.validate = parse_validation_mode(validate) is not None
+        self.validator = ResourceValidator(self.table_schema, validate) if self.validate else None
+        self.validation_stats = validation_stats
+        self.orig_name = orig_spec.get('name')
         self.infile = infile
         self.debug = debug
+        self.framing = framing if framing is not None else get_framing()
+        self.decoder = TypedRowDecoder(orig_spec['schema'])
+        self.started = False
         self.stopped = False
+        # Number of rows read from the input
+        self.rows = 0
+
+    @property
+    def table_schema(self):
+        if self._table_schema is None:
+            # tableschema is slow to import, so only load it when actually needed
+            from tableschema import Schema
+            self._table_schema = Schema(self.orig_spec['schema'])
+        return self._table_schema
 
     def __iter__(self):
         return self
@@ -28,50 +45,102 @@ class ResourceIterator(object):
     def __next__(self):
         if self.stopped:
             raise StopIteration()
+        self.started = True
         if self.debug:
             logging.error('WAITING')
-        line = self.infile.readline().strip()
+        line = self.framing.read_row(self.infile, self.decoder)
         if self.debug:
             logging.error('INGESTING: %r', line)
-        if line == '':
+        if line is None:
+            if self.framing.chunk_end_pending:
+                # The batch being filled ends with its chunk (see `batches`)
+                raise StopIteration()
             self.stopped = True
+            if self.validate:
+                self.validator.finish()
+                if self.validation_stats is not None:
+                    self.validation_stats[self.orig_name] = self.validator.stats()
             raise StopIteration()
-        line = json.loadl(line)
         if self.validate:
-            to_validate = [line.get(f) for f in self.field_names]
-            try:
-                self.table_schema.cast_row(to_validate)
-            except CastError as e:
-                logging.error('Failed to validate row: %s', e)
-                for i, err in enumerate(e.errors):
-                    logging.error('%d) %s', i+1, err.message)
-                raise ValueError('Casting failed for row %r' % line) from e
-            except TypeError as e:
-                raise ValueError('Validation failed for row %r' % line) from e
+            self.validator.check_row(line)
 
+        self.rows += 1
         return line
 
     def next(self):
         return self.__next__()
 
-
-def read_json(infile, proxy=False):
-    line_json = infile.readline().strip()
-    if line_json == '':
+    def batches(self, size=None):
+        """Iterate on the resource's rows in blocks (RecordBatch instances) instead of one by one.
+
+        With columnar framing, blocks are passed as they were received
+        from the previous processor (and `size` is ignored).
+        """
+        self.started = True
+        if size is None:
+            size = batch_size()
+        while not self.stopped:
+            if self.validate:
+                batch = []
+                self.framing.stop_at_chunk_end = True
+                try:
+                    for row in self:
+                        batch.append(row)
+                        if len(batch) >= size:
+                            break
+                finally:
+                    self.framing.stop_at_chunk_end = False
+                batch = RecordBatch.from_rows(batch) if len(batch) > 0 else None
+            else:
+                batch, self.stopped = self.framing.read_batch(self.infile, size, self.decoder)
+                if batch is not None:
+                    self.rows += len(batch)
+            if batch is not None:
+                yield batch
+
+    def can_passthrough(self, framing):
+        return not self.started and not self.validate and self.framing.NAME == framing.NAME
+
+    def passthrough(self, outputs):
+        """Copy all rows of this resource to the outputs without parsing them.
+        Returns the number of copied rows."""
+        self.started = True
+        count = self.framing.copy_resource(self.infile, outputs)
+        self.stopped = True
+        self.rows += count
+        return count
+
+
+def binary_input(infile):
+    """Rows are read as bytes, so text streams (e.g. sys.stdin) are read through their binary buffer"""
+    return getattr(infile, 'buffer', infile)
+
+
+def read_line(infile):
+    line_json = binary_input(infile).readline().strip()
+    if line_json == b'':
         sys.exit(-3)
-    if proxy:
-        print(line_json)
+    return line_json
+
+
+def parse_json(line_json):
     try:
         return json.loads(line_json)
     except json.JSONDecodeError:
         logging.exception("Failed to decode line %r\nPerhaps there's a rogue print statement somewhere?", line_json)
 
 
-def process_input(infile, validate=False, debug=False):
-    dependency_dp = read_json(infile, True)
-    dp = read_json(infile)
-    resources = dp.get('resources', [])
-    original_resources = copy.deepcopy(resources)
+def read_json(infile, proxy=False):
+    line_json = read_line(infile)
+    if proxy:
+        print(line_json.decode('utf8'))
+    return parse_json(line_json)
+
+
+def validate_datapackage(dp, dp_line):
+    if is_validated(dp_line):
+        # An earlier step of this execution already validated this exact descriptor
+        return
 
     if len(dp.get('resources', [])) == 0:
         # Currently datapackages with no resources are disallowed in the schema.
@@ -84,6 +153,9 @@ def process_input(infile, validate=False, debug=False):
         }]
     else:
         dp_to_validate = dp
+
+    import datapackage
+    from tableschema.exceptions import ValidationError
     try:
         datapackage.validate(dp_to_validate)
     except ValidationError as e:
@@ -96,6 +168,20 @@ def process_input(infile, validate=False, debug=False):
             except AttributeError:
                 logging.error("Data Package validation error: %s", e)
         raise
+    mark_validated(dp_line)
+
+
+def process_input(infile, validate=False, debug=False, framing=None, validation_stats=None,
+                  resource_iterators=None):
+    infile = binary_input(infile)
+    dependency_dp = read_json(infile, True)
+    dp_line = read_line(infile)
+    dp = parse_json(dp_line)
+    resources = dp.get('resources', [])
+    # Parsing the line again is cheaper than a deep copy
+    original_resources = parse_json(dp_line).get('resources', [])
+
+    validate_datapackage(dp, dp_line)
 
     infile.readline().strip()
 
@@ -110,8 +196,10 @@ def process_input(infile, validate=False, debug=False):
 
             res_iter = ResourceIterator(infile,
                                         resource, orig_resource,
-                                        validate, debug)
+                                        validate, debug, framing, validation_stats)
             ret.append(res_iter)
+        if resource_iterators is not None:
+            resource_iterators.extend(ret)
         return iter(ret)
 
     return dp, resources_iterator(resources, original_resources), dependency_dp
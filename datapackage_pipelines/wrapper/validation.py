@@ -0,0 +1,168 @@
+import random
+import logging
+import datetime
+import decimal
+
+
+FULL_VALIDATION = 'full'
+FIRST_ROWS_VALIDATION = 'first'
+EVERY_NTH_VALIDATION = 'every'
+SAMPLE_VALIDATION = 'sample'
+
+
+class FullValidation(object):
+    """Validate all rows"""
+
+    def __init__(self, mode):
+        self.mode = mode
+
+    def select(self, index, row):
+        return True
+
+    def remaining(self):
+        return []
+
+
+class FirstRowsValidation(FullValidation):
+    """Validate the first N rows of each resource"""
+
+    def __init__(self, mode, count):
+        super().__init__(mode)
+        self.count = count
+
+    def select(self, index, row):
+        return index < self.count
+
+
+class EveryNthValidation(FirstRowsValidation):
+    """Validate every N-th row of each resource (starting with the first)"""
+
+    def select(self, index, row):
+        return index % self.count == 0
+
+
+class SampleValidation(FirstRowsValidation):
+    """Validate a uniform random sample of N rows of each resource, once the resource is done"""
+
+    def __init__(self, mode, count):
+        super().__init__(mode, count)
+        self.reservoir = []
+        self.random = random.Random()
+
+    def select(self, index, row):
+        # Keep a copy, as the processor might modify the row
+        if index < self.count:
+            self.reservoir.append(dict(row))
+        else:
+            position = self.random.randint(0, index)
+            if position < self.count:
+                self.reservoir[position] = dict(row)
+        return False
+
+    def remaining(self):
+        reservoir, self.reservoir = self.reservoir, []
+        return reservoir
+
+
+VALIDATION_MODES = {
+    FIRST_ROWS_VALIDATION: FirstRowsValidation,
+    EVERY_NTH_VALIDATION: EveryNthValidation,
+    SAMPLE_VALIDATION: SampleValidation,
+}
+
+
+def parse_validation_mode(mode):
+    """
+    Returns the normalized validation mode for the `validate` property of a step -
+    `None` (no validation), 'full' or a `<kind>-<N>` string (e.g. 'first-1000').
+    Accepts booleans as well as their string representation (as passed on the command line).
+    """
+    if mode in (None, False, '', 'False'):
+        return None
+    if mode in (True, 'True', FULL_VALIDATION):
+        return FULL_VALIDATION
+    kind, _, count = str(mode).partition('-')
+    if kind not in VALIDATION_MODES or not count.isdigit() or int(count) == 0:
+        raise ValueError('Unknown validation mode %r' % mode)
+    return mode
+
+
+def _fast_check(field):
+    """
+    Returns a function which quickly checks if a (decoded) value is valid for a field,
+    or None if the value should always go through the field's cast function.
+    A failed fast check isn't an error - it just means the value needs to be cast.
+    """
+    if field.constraints:
+        return None
+    if field.type == 'any':
+        return lambda value: True
+    types = {
+        'string': str,
+        'integer': int,
+        'number': decimal.Decimal,
+        'boolean': bool,
+        'date': datetime.date,
+        'datetime': datetime.datetime,
+    }
+    if field.type not in types or (field.type == 'string' and field.format not in ('default', None)):
+        return None
+    expected = types[field.type]
+    return lambda value: value is None or type(value) is expected
+
+
+class ResourceValidator(object):
+    """
+    Validates the rows of a single resource against its schema.
+    Per-field checks are prepared once, and only the rows selected by the validation mode are checked.
+    """
+
+    def __init__(self, table_schema, mode):
+        from tableschema.exceptions import CastError
+        self.cast_error = CastError
+        self.mode = parse_validation_mode(mode)
+        if self.mode == FULL_VALIDATION:
+            self.sampler = FullValidation(self.mode)
+        else:
+            kind, count = self.mode.split('-')
+            self.sampler = VALIDATION_MODES[kind](self.mode, int(count))
+        self.fields = [(field.name, _fast_check(field), field.cast_value)
+                       for field in table_schema.fields]
+        self.rows = 0
+        self.checked = 0
+
+    def check_row(self, row):
+        """Called for each row of the resource"""
+        index = self.rows
+        self.rows += 1
+        if self.sampler.select(index, row):
+            self.validate(row)
+
+    def finish(self):
+        """Called once the resource is done"""
+        for row in self.sampler.remaining():
+            self.validate(row)
+
+    def validate(self, row):
+        self.checked += 1
+        errors = []
+        try:
+            for name, fast_check, cast in self.fields:
+                value = row.get(name)
+                if fast_check is not None and fast_check(value):
+                    continue
+                try:
+                    cast(value)
+                except self.cast_error as e:
+                    errors.append(e)
+        except TypeError as e:
+            raise ValueError('Validation failed for row %r' % row) from e
+        if errors:
+            e = self.cast_error('There are %s cast errors (see exception.errors)' % len(errors), errors=errors)
+            logging.error('Failed to validate row: %s', e)
+            for i, err in enumerate(errors):
+                logging.error('%d) %s', i+1, getattr(err, 'message', err))
+            raise ValueError('Casting failed for row %r' % row) from e
+
+    def stats(self):
+        return {'mode': self.mode, 'rows': self.rows, 'checked': self.checked}
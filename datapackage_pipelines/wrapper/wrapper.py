@@ -1,16 +1,22 @@
-import gzip
 import sys
 import os
+import time
 import logging
 from contextlib import ExitStack, redirect_stderr, redirect_stdout
 
-from tableschema.exceptions import CastError
-
 from ..utilities.extended_json import json
+from ..utilities.framing import get_framing, RecordBatch, BufferedOutput
+from ..utilities.cache_files import AsyncCacheWriter, \
+    DATAPACKAGE_SECTION, RESOURCE_SECTION, STATS_SECTION
 
-from .input_processor import process_input
+from .input_processor import process_input, ResourceIterator
 
 from ..utilities.resources import streaming
+from ..utilities.stat_utils import STATS_DPP_KEY, STATS_VALIDATION_KEY
+from ..utilities.replication import replica_index
+from ..utilities.step_stats import metered_input, report_step_stats, tracing_enabled
+from ..utilities.profiler import Profiler
+from ..utilities.memory_tracing import MemoryTracer
 
 
 logging.basicConfig(level=logging.DEBUG,
@@ -19,11 +25,26 @@ logging.basicConfig(level=logging.DEBUG,
 
 cache = ''
 first = True
+input_framing = None
+output_framing = None
+input_reader = None
+input_file = None
+input_meter = None
+input_resources = []
+profiler = None
+memory_tracer = None
+validation_stats = {}
 stdout = sys.stdout
 
 dependency_datapackage_urls = {}
 
 
+def is_cast_error(e):
+    # A CastError can only be raised if tableschema was already imported by someone
+    exceptions = sys.modules.get('tableschema.exceptions')
+    return exceptions is not None and isinstance(e, exceptions.CastError)
+
+
 def get_dependency_datapackage_url(pipeline_id):
     return dependency_datapackage_urls.get(pipeline_id)
 
@@ -33,62 +54,139 @@ def get_dependency_datapackage_url(pipeline_id):
 def _ingest(debug=False):
     global cache
     global first
+    global input_framing
+    global output_framing
+    global input_reader
+    global input_file
+    global input_meter
+    global profiler
+    global memory_tracer
+    profiler = Profiler.from_env()
+    memory_tracer = MemoryTracer.from_env()
     params = None
     validate = False
     if len(sys.argv) > 4:
         first = sys.argv[1] == '0'
         params = json.loads(sys.argv[2])
-        validate = sys.argv[3] == 'True'
+        validate = sys.argv[3]
         cache = sys.argv[4]
-
-    datapackage, resource_iterator, dependency_dp = process_input(sys.stdin, validate, debug)
+    if len(sys.argv) > 6:
+        input_framing = sys.argv[5]
+        output_framing = sys.argv[6]
+
+    input_reader = get_framing(input_framing)
+    input_file, input_meter = metered_input(sys.stdin.buffer)
+    datapackage, resource_iterator, dependency_dp = \
+        process_input(input_file, validate, debug, input_reader,
+                      validation_stats, input_resources)
     dependency_datapackage_urls.update(dependency_dp)
 
     return params, datapackage, resource_iterator
 
 
 def spew(dp, resources_iterator, stats=None, finalizer=None):
-    files = [stdout]
-
+    framing = get_framing(output_framing)
+    out = BufferedOutput(framing.output_stream(stdout), framing.BINARY)
+
+    replica = replica_index() is not None
+    if replica and input_reader is not None:
+        # Running as one replica of a parallel step - let the fan-in process
+        # know once all rows produced from each chunk of input rows were written
+        def end_chunk():
+            out.write(framing.end_chunk())
+            out.flush()
+        input_reader.on_chunk_end = end_chunk
+
+    cache_writer = None
+    cache_file = None
+    cache_framing = get_framing()
     cache_filename = ''
     if len(cache) > 0:
         if not os.path.exists('.cache'):
             os.mkdir('.cache')
         cache_filename = os.path.join('.cache', cache)
-        files.append(gzip.open(cache_filename+'.ongoing', 'wt'))
-
-    expected_resources = \
-        len(list(filter(streaming, dp.get('resources', []))))
+        cache_writer = AsyncCacheWriter(cache_filename+'.ongoing')
+        cache_file = BufferedOutput(cache_writer)
+
+    def end_cache_section(kind, name=None, rows=None):
+        if cache_file is not None:
+            cache_file.flush_buffer()
+            cache_writer.end_section(kind, name, rows)
+
+    def write_line(line):
+        out.write(framing.encode_line(line))
+        if cache_file is not None:
+            cache_file.write(cache_framing.encode_line(line))
+
+    resource_names = [resource.get('name')
+                      for resource in dp.get('resources', [])
+                      if streaming(resource)]
+    expected_resources = len(resource_names)
     row_count = 0
+    # (name, start time, end time, rows) of each resource, when tracing
+    traced_resources = [] if tracing_enabled() else None
+
+    def trace_resource(name, start, rows):
+        if traced_resources is not None:
+            traced_resources.append((name, start, time.time(), rows))
     try:
-        for f in files:
-            f.write(json.dumps(dp, sort_keys=True, ensure_ascii=True)+'\n')
-            f.flush()
+        write_line(json.dumps(dp, sort_keys=True, ensure_ascii=True))
+        out.flush()
+        write_line('')
+        end_cache_section(DATAPACKAGE_SECTION)
         num_resources = 0
         for res in resources_iterator:
             if hasattr(res, 'it') and res.it is None:
                 continue
             num_resources += 1
-            for f in files:
-                f.write('\n')
+            resource_name = resource_names[num_resources - 1] \
+                if num_resources <= expected_resources else None
+            resource_rows = 0
+            resource_start = time.time()
+            if isinstance(res, ResourceIterator) and res.can_passthrough(framing) and not replica and \
+                    (cache_file is None or cache_framing.NAME == framing.NAME):
+                # Resource was not touched by the processor, copy it as-is
+                outputs = [out] if cache_file is None else [out, cache_file]
+                resource_rows = res.passthrough(outputs)
+                row_count += resource_rows
+                out.flush()
+                end_cache_section(RESOURCE_SECTION, resource_name, resource_rows)
+                trace_resource(resource_name, resource_start, resource_rows)
+                continue
             try:
                 for rec in res:
                     try:
-                        line = json.dumpl(rec,
-                                        sort_keys=True,
-                                        ensure_ascii=True)
+                        if isinstance(rec, RecordBatch):
+                            line = framing.encode_batch(rec)
+                            if cache_file is not None:
+                                cache_line = cache_framing.encode_batch(rec)
+                        else:
+                            line = framing.encode_row(rec)
+                            if cache_file is not None:
+                                cache_line = line if framing.NAME == cache_framing.NAME \
+                                    else cache_framing.encode_row(rec)
                     except TypeError as e:
                         logging.error('Failed to encode row to JSON: %s\nOffending row: %r', e, rec)
                         raise
                     # logging.error('SPEWING: {}'.format(line))
-                    for f in files:
-                        f.write(line+'\n')
+                    out.write(line)
+                    if cache_file is not None:
+                        cache_file.write(cache_line)
                     # logging.error('WROTE')
-                    row_count += 1
-            except CastError as e:
-                for err in e.errors:
-                    logging.error('Failed to cast row: %s', err)
+                    resource_rows += len(rec) if isinstance(rec, RecordBatch) else 1
+            except Exception as e:
+                if is_cast_error(e):
+                    for err in e.errors:
+                        logging.error('Failed to cast row: %s', err)
                 raise
+            row_count += resource_rows
+            out.write(framing.end_resource())
+            # Let the next processor see the complete resource
+            out.flush()
+            if cache_file is not None:
+                cache_file.write(cache_framing.end_resource())
+            end_cache_section(RESOURCE_SECTION, resource_name, resource_rows)
+            trace_resource(resource_name, resource_start, resource_rows)
         if num_resources != expected_resources:
             logging.error('Expected to see %d resource(s) but spewed %d',
                           expected_resources, num_resources)
@@ -96,7 +194,7 @@ def spew(dp, resources_iterator, stats=None, finalizer=None):
 
         aggregated_stats = {}
         if not first:
-            stats_line = sys.stdin.readline().strip()
+            stats_line = (input_file or sys.stdin.buffer).readline().strip()
             if len(stats_line) > 0:
                 try:
                     aggregated_stats = json.loads(stats_line)
@@ -106,36 +204,63 @@ def spew(dp, resources_iterator, stats=None, finalizer=None):
                     logging.error('Failed to parse stats: %r', stats_line)
         if stats is not None:
             aggregated_stats.update(stats)
+        if len(validation_stats) > 0:
+            aggregated_stats.setdefault(STATS_DPP_KEY, {}) \
+                .setdefault(STATS_VALIDATION_KEY, {}).update(validation_stats)
         stats_json = json.dumps(aggregated_stats,
                                 sort_keys=True,
                                 ensure_ascii=True)
-        for f in files:
-            f.write('\n'+stats_json)
+        out.write(framing.encode_text(stats_json))
+        if cache_file is not None:
+            cache_file.write(stats_json)
 
     except BrokenPipeError:
         logging.error('Output pipe disappeared!')
         sys.stderr.flush()
         sys.exit(1)
 
-    stdout.flush()
+    out.flush()
     if row_count > 0:
         logging.info('Processed %d rows', row_count)
 
     if finalizer is not None:
         finalizer()
 
-    for f in files:
-        f.write('\n')  # Signal to other processors that we're done
-        if f == stdout:
-            # Can't close sys.stdout, otherwise any subsequent
-            # call to print() will throw an exception
-            f.flush()
-        else:
-            f.close()
+    # Signal to other processors that we're done
+    out.write(framing.encode_text('\n'))
+    # Can't close sys.stdout, otherwise any subsequent
+    # call to print() will throw an exception
+    out.flush()
+    if cache_file is not None:
+        cache_file.write('\n')
+        end_cache_section(STATS_SECTION)
+        cache_writer.close()
 
     if len(cache) > 0:
         os.rename(cache_filename+'.ongoing', cache_filename)
 
+    if profiler is not None:
+        profiler.stop()
+
+    step_stats = dict(
+        rows_in=sum(resource.rows for resource in input_resources),
+        rows_out=row_count,
+        bytes_in=input_meter.bytes if input_meter is not None else 0,
+        bytes_out=out.bytes,
+        blocked_on_input=input_meter.blocked if input_meter is not None else 0.0,
+        blocked_on_output=out.blocked,
+    )
+    if traced_resources is not None:
+        step_stats['resources'] = traced_resources
+    if memory_tracer is not None:
+        memory_stats = memory_tracer.stop()
+        step_stats.update(memory_stats)
+        logging.info('Peak traced memory: %.1f MB', memory_stats['traced_peak'] / 1024 / 1024)
+        for allocation in memory_stats['top_allocations'][:3]:
+            logging.info('  %.1f MB in %d blocks allocated at %s',
+                         allocation['size'] / 1024 / 1024, allocation['count'], allocation['site'])
+    report_step_stats(**step_stats)
+
 
 class StdoutWriter:
 
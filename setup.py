@@ -46,6 +46,10 @@ INSTALL_REQUIRES = [
 ]
 SPEEDUP_REQUIRES = [
     'dataflows[speedup]',
+    'msgpack',
+    'orjson',
+    'zstandard',
+    'lz4',
 ]
 LINT_REQUIRES = [
     'pylama',
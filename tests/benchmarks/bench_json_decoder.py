@@ -0,0 +1,46 @@
+"""
+Compares the schema-driven TypedRowDecoder to the generic CommonJSONDecoder.
+
+Run with:
+    python tests/benchmarks/bench_json_decoder.py [num-rows]
+"""
+import sys
+import time
+import datetime
+import decimal
+
+from datapackage_pipelines.utilities.extended_json import json, TypedRowDecoder
+
+
+def make_rows(num_rows, num_plain_fields=20):
+    schema = {'fields': [{'name': 'f%d' % i, 'type': 'string' if i % 2 else 'integer'}
+                         for i in range(num_plain_fields)] +
+                        [{'name': 'amount', 'type': 'number'},
+                         {'name': 'date', 'type': 'date'}]}
+    rows = []
+    for i in range(num_rows):
+        row = dict(('f%d' % j, 'value-%d' % i if j % 2 else i)
+                   for j in range(num_plain_fields))
+        row['amount'] = decimal.Decimal(i) / 100
+        row['date'] = datetime.date(2000, 1, 1) + datetime.timedelta(days=i % 1000)
+        rows.append(row)
+    return schema, [json.dumpl(row, sort_keys=True, ensure_ascii=True) for row in rows]
+
+
+def timed(name, func, lines):
+    start = time.perf_counter()
+    for line in lines:
+        func(line)
+    elapsed = time.perf_counter() - start
+    print('%-20s %8.3fs %10.0f rows/sec' % (name, elapsed, len(lines) / elapsed))
+    return elapsed
+
+
+if __name__ == '__main__':
+    num_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    schema, lines = make_rows(num_rows)
+    decoder = TypedRowDecoder(schema)
+    assert decoder.loads(lines[-1]) == json.loads(lines[-1])
+    common = timed('CommonJSONDecoder', json.loads, lines)
+    typed = timed('TypedRowDecoder', decoder.loads, lines)
+    print('speedup: x%.2f' % (common / typed))
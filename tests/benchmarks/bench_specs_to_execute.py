@@ -0,0 +1,68 @@
+"""
+Measures how long `dpp run` takes to schedule pipelines, over synthetic spec trees of growing size.
+
+Each tree has one directory per 10 pipelines, and every pipeline but the first in each directory
+depends on the previous one. Scheduling is timed with all pipelines completing instantly, so the
+time is spent only on discovering, parsing and hashing specs and on resolving dependencies -
+it should grow linearly with the number of pipelines.
+
+Run with:
+    python tests/benchmarks/bench_specs_to_execute.py [max-pipelines]
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+from datapackage_pipelines.status import status_mgr
+from datapackage_pipelines.manager.runner import specs_to_execute
+
+PIPELINES_PER_DIR = 10
+
+
+def make_tree(root_dir, num_pipelines):
+    for i in range(0, num_pipelines, PIPELINES_PER_DIR):
+        dirname = os.path.join(root_dir, 'dir%d' % i)
+        os.makedirs(dirname)
+        with open(os.path.join(dirname, 'pipeline-spec.yaml'), 'w') as spec:
+            for j in range(i, min(i + PIPELINES_PER_DIR, num_pipelines)):
+                spec.write('p%d:\n' % j)
+                if j > i:
+                    spec.write('  dependencies:\n    - pipeline: ./dir%d/p%d\n' % (i, j - 1))
+                spec.write('  pipeline:\n'
+                           '    - run: load\n'
+                           '      parameters: {from: data.csv, name: p%d}\n'
+                           '    - run: dump_to_path\n'
+                           '      parameters: {out-path: out%d}\n' % (j, j))
+
+
+def schedule_all(root_dir):
+    """Consumes all specs, completing each pipeline as soon as it's handed out"""
+    specs = specs_to_execute('all', root_dir, status_mgr(root_dir), False, False, [])
+    scheduled = 0
+    completed = None
+    while True:
+        spec = specs.send(completed)
+        if spec is None:
+            return scheduled
+        scheduled += 1
+        completed = spec.pipeline_id
+
+
+if __name__ == '__main__':
+    max_pipelines = int(sys.argv[1]) if len(sys.argv) > 1 else 800
+    num_pipelines = 50
+    while num_pipelines <= max_pipelines:
+        root_dir = tempfile.mkdtemp(prefix='dpp-bench-')
+        try:
+            make_tree(root_dir, num_pipelines)
+            start = time.perf_counter()
+            scheduled = schedule_all(root_dir)
+            elapsed = time.perf_counter() - start
+            assert scheduled == num_pipelines
+            print('%6d pipelines %8.3fs %8.2fms/pipeline' % (num_pipelines, elapsed,
+                                                             1000 * elapsed / num_pipelines))
+        finally:
+            shutil.rmtree(root_dir)
+        num_pipelines *= 2
@@ -0,0 +1,53 @@
+"""
+Guards the start-up time of processors, using `python -X importtime`.
+
+Every processor is a new python process, so anything imported by the wrapper is paid for by every
+step of every pipeline. The budget can be changed with DPP_IMPORT_BUDGET_MS (e.g. on slow machines).
+
+Run on its own with:
+    pytest tests/benchmarks/test_import_time.py -s
+"""
+import os
+import sys
+import subprocess
+
+import pytest
+
+IMPORT_BUDGET_MS = float(os.environ.get('DPP_IMPORT_BUDGET_MS', 250))
+
+# Heavy dependencies, which should only be loaded by processors that actually use them
+HEAVY_MODULES = {'tableschema', 'datapackage', 'dataflows', 'tabulator', 'requests', 'jsonschema',
+                 'isodate', 'redis', 'sqlalchemy', 'zstandard', 'lz4',
+                 'datapackage_pipelines.specs', 'datapackage_pipelines.manager',
+                 'datapackage_pipelines.status'}
+
+
+def import_times(statement):
+    """Returns the cumulative import time (in ms) of each top-level module imported by the statement"""
+    output = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement],
+                            stderr=subprocess.PIPE, check=True).stderr.decode('utf8')
+    times = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative) / 1000
+    return times
+
+
+@pytest.mark.parametrize('module', [
+    'datapackage_pipelines.wrapper',
+    'datapackage_pipelines.utilities.extended_json',
+    'datapackage_pipelines.utilities.framing',
+    'datapackage_pipelines.utilities.cache_files',
+])
+def test_wrapper_import_time(module):
+    times = import_times('import ' + module)
+    heavy = sorted(name for name in times
+                   if name in HEAVY_MODULES or name.split('.')[0] in HEAVY_MODULES)
+    assert heavy == [], '%s should not import %s' % (module, ', '.join(heavy))
+    print('%s: %.1fms' % (module, times[module]))
+    # Measure the best of a few runs, to be less sensitive to noise
+    best = min([times[module]] + [import_times('import ' + module)[module] for _ in range(2)])
+    assert best < IMPORT_BUDGET_MS, \
+        'Importing %s took %.1fms, more than the budget of %.0fms' % (module, best, IMPORT_BUDGET_MS)
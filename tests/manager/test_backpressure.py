@@ -0,0 +1,70 @@
+import os
+
+import pytest
+
+from datapackage_pipelines.manager.backpressure import PipeMonitor, PipeEdge, set_pipe_size, \
+    pipe_size, pipe_fill
+
+
+class FakeProcess(object):
+    returncode = None
+
+
+@pytest.fixture
+def pipe():
+    rfd, wfd = os.pipe()
+    yield rfd, wfd
+    os.close(rfd)
+    os.close(wfd)
+
+
+def test_pipe_fill(pipe):
+    rfd, wfd = pipe
+    assert pipe_fill(rfd) == 0
+    os.write(wfd, b'x' * 1000)
+    assert pipe_fill(rfd) == 1000
+
+
+def test_set_pipe_size(pipe):
+    rfd, wfd = pipe
+    size = set_pipe_size(wfd, 256 * 1024)
+    if size is None:
+        pytest.skip('Pipe size can not be changed on this system')
+    assert pipe_size(rfd) == size >= 256 * 1024
+
+
+def test_edge_sampling(pipe):
+    rfd, wfd = pipe
+    process = FakeProcess()
+    edge = PipeEdge(os.dup(rfd), {'run': 'a'}, {'run': 'b'}, process)
+    edge.sample()
+    os.write(wfd, b'x' * edge.capacity)
+    edge.sample()
+    assert edge.stats() == {'capacity': edge.capacity, 'samples': 2, 'max_fill': edge.capacity,
+                            'average_fill': 0.5, 'full': 0.5}
+    # Once the reader is gone, the pipe is released
+    process.returncode = 0
+    edge.sample()
+    assert edge.fd is None
+    assert edge.stats()['samples'] == 2
+
+
+def test_limiting_step(pipe):
+    rfd, _ = pipe
+    steps = [{'run': name} for name in ('load', 'slow', 'dump', '(sink)')]
+    monitor = PipeMonitor()
+    for writer, reader, full in zip(steps, steps[1:], (8, 1, 0)):
+        edge = PipeEdge(rfd, writer, reader, FakeProcess())
+        edge.samples = 10
+        edge.full = full
+        monitor.edges.append(edge)
+    assert monitor.limiting_step([]) == ('slow', 'input pipe was full 80% of the time')
+
+    # No pipe was ever full - the step which was busy the longest is limiting
+    for edge in monitor.edges:
+        edge.full = 0
+    assert monitor.limiting_step([
+        {'step': 'load', 'wall_time': 10, 'blocked_on_input': 0, 'blocked_on_output': 1},
+        {'step': 'slow', 'wall_time': 10, 'blocked_on_input': 8, 'blocked_on_output': 0},
+        {'step': 'branches', 'wall_time': 10},
+    ]) == ('load', 'busy for 9.0 seconds')
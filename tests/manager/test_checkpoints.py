@@ -0,0 +1,108 @@
+import os
+import time
+from collections import namedtuple
+
+from datapackage_pipelines.manager.checkpoints import apply_checkpoint_policy, historical_costs, \
+    failed_execution_start, step_cost
+from datapackage_pipelines.manager.tasks import find_caches
+from datapackage_pipelines.utilities.cache_files import AsyncCacheWriter, DATAPACKAGE_SECTION, \
+    RESOURCE_SECTION, STATS_SECTION
+
+Execution = namedtuple('Execution', ['execution_id', 'success', 'stats', 'start_time'])
+Status = namedtuple('Status', ['pipeline_id', 'executions'])
+
+
+def _steps(count, extra=None):
+    extra = extra or {}
+    return [dict({'run': 'step%d' % i, '_cache_hash': 'h%d' % i}, **extra.get(i, {}))
+            for i in range(count)]
+
+
+def _checkpointed(steps):
+    return [i for i, step in enumerate(steps) if step.get('checkpoint')]
+
+
+def test_checkpoint_every():
+    assert _checkpointed(apply_checkpoint_policy(_steps(7), {'every': 2}, {})) == [1, 3, 5]
+    # Explicit checkpoints and caches restart the count, and no checkpoint is added after the last step
+    steps = _steps(7, {2: {'cache': True}})
+    assert _checkpointed(apply_checkpoint_policy(steps, {'every': 2}, {})) == [1, 4]
+
+
+def test_checkpoint_cost():
+    costs = {'h0': 1, 'h1': 50, 'h2': 5, 'h3': 5, 'h4': 1, 'h5': 1}
+    assert _checkpointed(apply_checkpoint_policy(_steps(6), {'cost': 10}, costs)) == [1, 4]
+    # Parallel steps and branches aren't checkpointed, the following step is
+    steps = _steps(6, {1: {'parallelism': 2}})
+    assert _checkpointed(apply_checkpoint_policy(steps, {'cost': 10}, costs)) == [2]
+
+
+def test_checkpoint_policy_copies_steps():
+    steps = _steps(3)
+    apply_checkpoint_policy(steps, {'every': 1}, {})
+    assert _checkpointed(steps) == []
+
+
+def test_historical_costs():
+    stats = {'.dpp': {'steps': [
+        {'step': 'a', 'cache_hash': 'h0', 'wall_time': 10, 'blocked_on_input': 2, 'blocked_on_output': 3},
+        {'step': 'b (fan-out)', 'cache_hash': 'h1', 'cpu_time': 1},
+        {'step': 'b', 'cache_hash': 'h1', 'wall_time': 10, 'blocked_on_input': 1, 'blocked_on_output': 0},
+        {'step': '(sink)', 'wall_time': 10},
+    ]}}
+    older = {'.dpp': {'steps': [{'step': 'a', 'cache_hash': 'h0', 'cpu_time': 100},
+                                {'step': 'c', 'cache_hash': 'h2', 'cpu_time': 7}]}}
+    ps = Status('./p', [Execution('3', False, None, 3.0), Execution('2', True, stats, 2.0),
+                        Execution('1', True, older, 1.0)])
+    assert historical_costs(ps) == {'h0': 5, 'h1': 10, 'h2': 7}
+    assert step_cost({'cpu_time': 1.5}) == 1.5
+
+
+def test_failed_execution_start():
+    ps = Status('./p', [Execution('3', None, None, None), Execution('2', False, None, 2.0),
+                        Execution('1', True, {}, 1.0)])
+    assert failed_execution_start(ps, '3') == 2.0
+    ps = Status('./p', [Execution('3', None, None, None), Execution('2', True, {}, 2.0)])
+    assert failed_execution_start(ps, '3') is None
+    assert failed_execution_start(Status('./p', [Execution('3', None, None, None)]), '3') is None
+    # Resuming again after a failed resume uses the checkpoints of the first failed execution as well
+    ps = Status('./p', [Execution('4', None, None, None), Execution('3', False, None, 3.0),
+                        Execution('2', False, None, 2.0), Execution('1', True, {}, 1.0)])
+    assert failed_execution_start(ps, '4') == 2.0
+
+
+def _write_checkpoint(filename):
+    writer = AsyncCacheWriter(filename)
+    writer.write('{"name": "_", "resources": []}\n\n')
+    writer.end_section(DATAPACKAGE_SECTION)
+    writer.end_section(RESOURCE_SECTION)
+    writer.write('{}\n')
+    writer.end_section(STATS_SECTION)
+    writer.close()
+
+
+def test_find_caches_resumes_from_checkpoints(tmpdir):
+    tmpdir.mkdir('.cache')
+    _write_checkpoint(str(tmpdir.join('.cache', 'h1')))
+    steps = _steps(4, {1: {'checkpoint': True}})
+    # Checkpoints are only used when resuming, if they were written by the failed execution
+    assert find_caches(steps, str(tmpdir)) == steps
+    assert find_caches(steps, str(tmpdir), checkpoints_since=time.time() + 60) == steps
+    resumed = find_caches(steps, str(tmpdir), checkpoints_since=time.time() - 60)
+    assert resumed[0]['run'] == 'cache_loader'
+    assert resumed[0]['parameters']['load-from'].endswith('h1')
+    assert resumed[1:] == steps[2:]
+
+
+def test_find_caches_resumes_twice(tmpdir):
+    tmpdir.mkdir('.cache')
+    checkpoint = str(tmpdir.join('.cache', 'h1'))
+    _write_checkpoint(checkpoint)
+    # Written by execution 1, loaded by execution 2 which failed as well
+    os.utime(checkpoint, (150.0, 150.0))
+    ps = Status('./p', [Execution('3', None, None, None), Execution('2', False, None, 200.0),
+                        Execution('1', False, None, 100.0), Execution('0', True, {}, 10.0)])
+    steps = _steps(4, {1: {'checkpoint': True}})
+    resumed = find_caches(steps, str(tmpdir), checkpoints_since=failed_execution_start(ps, '3'))
+    assert resumed[0]['parameters']['load-from'].endswith('h1')
+    assert resumed[1:] == steps[2:]
@@ -0,0 +1,101 @@
+from datapackage_pipelines.specs import PipelineSpec
+from datapackage_pipelines.specs.errors import SpecError
+from datapackage_pipelines.manager.execution_graph import ExecutionGraph
+
+
+class FakeExecution(object):
+
+    def __init__(self, duration):
+        self.start_time = 1000.0
+        self.finish_time = 1000.0 + duration
+
+
+class FakeStatus(object):
+
+    def __init__(self, executed, duration=None):
+        self.executed = executed
+        self.duration = duration
+        self.validation_errors = []
+
+    def runnable(self):
+        return True
+
+    def dirty(self):
+        return not self.executed
+
+    def get_last_execution(self):
+        return FakeExecution(self.duration) if self.duration is not None else None
+
+    def get_last_successful_execution(self):
+        return self.get_last_execution()
+
+
+class FakeStatusManager(object):
+
+    def __init__(self, durations=None):
+        self.executed = set()
+        self.durations = durations or {}
+
+    def get(self, pipeline_id):
+        return FakeStatus(pipeline_id in self.executed, self.durations.get(pipeline_id))
+
+
+def _spec(pipeline_id, *dependencies, errors=()):
+    spec = PipelineSpec(pipeline_id=pipeline_id, dependencies=list(dependencies),
+                        validation_errors=list(errors))
+    spec.dependency_errors = [error for error in errors if error.short_msg == 'Dirty dependency']
+    return spec
+
+
+def _drain(graph):
+    ret = []
+    while True:
+        spec = graph.pop_ready()
+        if spec is None:
+            return ret
+        ret.append(spec.pipeline_id)
+
+
+def test_ready_in_discovery_order():
+    graph = ExecutionGraph([_spec('c', 'a'), _spec('a'), _spec('b', 'outside'), _spec('d', 'a', 'b')],
+                           FakeStatusManager())
+    assert len(graph) == 4
+    # Dependencies which aren't executed in this run aren't waited for
+    assert _drain(graph) == ['a', 'b']
+    graph.complete('b')
+    assert _drain(graph) == []
+    graph.complete('a')
+    assert _drain(graph) == ['c', 'd']
+    assert len(graph) == 0
+
+
+def test_critical_path_first():
+    # a -> b -> c is the longest chain, even though d and e took longer on their own
+    durations = {'a': 10, 'b': 20, 'c': 30, 'd': 40, 'e': 45}
+    graph = ExecutionGraph([_spec('d'), _spec('e'), _spec('a'), _spec('b', 'a'), _spec('c', 'b'),
+                            _spec('f')],
+                           FakeStatusManager(durations))
+    assert graph.priority['a'] == 60
+    # f has no history, so it's assumed to take the median time of the others
+    assert graph.durations['f'] == 30
+    assert _drain(graph) == ['a', 'e', 'd', 'f']
+
+
+def test_duplicate_ids():
+    first, second = _spec('a'), _spec('a', errors=[SpecError('Duplicate Pipeline Id', '')])
+    graph = ExecutionGraph([first, second], FakeStatusManager())
+    assert len(graph) == 1
+    assert graph.pop_ready() is first
+
+
+def test_dependency_errors_rechecked():
+    status_manager = FakeStatusManager()
+    dirty = SpecError('Dirty dependency', 'Cannot run until dependency is executed: a')
+    other = SpecError('Invalid Pipeline', 'Other')
+    graph = ExecutionGraph([_spec('a'), _spec('b', 'a', errors=[other, dirty])], status_manager)
+    assert _drain(graph) == ['a']
+    status_manager.executed.add('a')
+    graph.complete('a')
+    spec = graph.pop_ready()
+    assert spec.validation_errors == [other]
+    assert spec.dependency_errors == []
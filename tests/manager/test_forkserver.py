@@ -0,0 +1,95 @@
+import os
+import sys
+import asyncio
+
+from datapackage_pipelines.manager.runners.forkserver import ForkServerRunner
+
+SCRIPT = '''
+import sys
+import json
+sys.stdout.write(json.dumps(dict(argv=sys.argv[1:], stdin=sys.stdin.read())))
+sys.stderr.write('to stderr\\n')
+sys.exit(int(sys.argv[1]))
+'''
+
+
+def _run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+def test_forkserver_runner(tmpdir):
+    script = tmpdir.join('script.py')
+    script.write(SCRIPT)
+    out = tmpdir.join('out')
+    runner = ForkServerRunner('warm', {'preload': ['json']})
+
+    async def run(exit_code):
+        wfd = os.open(str(out), os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+        process = await runner.create_process([sys.executable, str(script), str(exit_code)],
+                                              str(tmpdir), wfd, None)
+        os.close(wfd)
+        process.stdin.write(b'input')
+        process.stdin.close()
+        stderr = await process.stderr.read()
+        return await process.wait(), stderr
+
+    assert _run(run(0)) == (0, b'to stderr\n')
+    assert out.read() == '{"argv": ["0"], "stdin": "input"}'
+    assert _run(run(3)) == (3, b'to stderr\n')
+
+
+def test_forkserver_runner_kill(tmpdir):
+    script = tmpdir.join('script.py')
+    script.write('import time\ntime.sleep(60)\n')
+    runner = ForkServerRunner('warm', {'preload': []})
+
+    async def run():
+        process = await runner.create_process([sys.executable, str(script)], str(tmpdir), None, None)
+        process.kill()
+        process.stdin.close()
+        return await process.wait()
+
+    assert _run(run()) == -9
+
+
+PROCESSOR = '''
+import atexit
+import threading
+from datapackage_pipelines.wrapper import ingest, spew
+
+params, dp, res_iter = ingest()
+dp['resources'] = [{'name': 'r', 'path': 'r.csv', 'dpp:streaming': True,
+                    'schema': {'fields': [{'name': 'i', 'type': 'integer'}]}}]
+# The child exits like a python process: after its threads finish, and running its atexit handlers
+threading.Thread(target=lambda: open('thread.txt', 'w').write('done')).start()
+atexit.register(lambda: open('atexit.txt', 'w').write('done'))
+spew(dp, [({'i': i} for i in range(3))], {'processed': True})
+'''
+
+
+def test_forkserver_runner_wrapper_processor(tmpdir):
+    script = tmpdir.join('processor.py')
+    script.write(PROCESSOR)
+    out = tmpdir.join('out')
+    runner = ForkServerRunner('warm', {'preload': ['datapackage_pipelines.wrapper']})
+
+    async def run():
+        wfd = os.open(str(out), os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+        args = runner.get_execution_args({'executor': str(script)}, str(tmpdir), 0)
+        process = await runner.create_process(args, str(tmpdir), wfd, None)
+        os.close(wfd)
+        process.stdin.write(b'{}\n{"name": "_", "resources": []}\n\n')
+        process.stdin.close()
+        await process.stderr.read()
+        return await process.wait()
+
+    assert _run(run()) == 0
+    lines = out.read().split('\n')
+    assert lines[3:7] == ['{"i": 0}', '{"i": 1}', '{"i": 2}', '']
+    assert lines[7] == '{"processed": true}'
+    assert tmpdir.join('thread.txt').read() == 'done'
+    assert tmpdir.join('atexit.txt').read() == 'done'
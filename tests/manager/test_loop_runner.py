@@ -0,0 +1,130 @@
+import asyncio
+
+from datapackage_pipelines.specs import PipelineSpec
+from datapackage_pipelines.status import status_mgr
+from datapackage_pipelines.manager.loop_runner import pipeline_demand, ExecutionLimits, run_specs, \
+    PROCESSES, CPU_SLOTS
+
+PROCESSOR = '''
+from datapackage_pipelines.wrapper import ingest, spew
+
+params, dp, res_iter = ingest()
+if params.get('fail'):
+    raise RuntimeError('failed on purpose')
+dp['resources'] = [{'name': 'r', 'path': 'r.csv', 'dpp:streaming': True,
+                    'schema': {'fields': [{'name': 'i', 'type': 'integer'}]}}]
+spew(dp, [({'i': i} for i in range(250))], {'env': __import__('os').environ.get('LOOP_TEST')})
+'''
+
+
+def _spec(tmpdir, pipeline_id, **parameters):
+    executor = tmpdir.join('processor.py')
+    executor.write(PROCESSOR)
+    return PipelineSpec(path=str(tmpdir),
+                        pipeline_id=pipeline_id,
+                        pipeline_details={'pipeline': [{'run': 'processor', 'executor': str(executor),
+                                                        'parameters': parameters, '_cache_hash': 'x'}]},
+                        source_details={},
+                        cache_hash='x',
+                        environment={'LOOP_TEST': pipeline_id})
+
+
+def _all_specs(specs):
+    """Hands out all specs at once, like runner.specs_to_execute with no dependencies"""
+    for spec in specs:
+        yield spec
+    yield None
+
+
+def test_pipeline_demand():
+    assert pipeline_demand([{'run': 'a'}, {'run': 'b'}]) == {PROCESSES: 3, CPU_SLOTS: 1}
+    assert pipeline_demand([{'run': 'a'}, {'run': 'b', 'parallelism': 4}]) == {PROCESSES: 8, CPU_SLOTS: 4}
+    branches = {'branches': [[{'run': 'a'}, {'run': 'b'}],
+                             [{'run': 'c', 'parallelism': 2}]]}
+    assert pipeline_demand([{'run': 'a'}, branches]) == {PROCESSES: 9, CPU_SLOTS: 3}
+
+
+def test_execution_limits():
+    limits = ExecutionLimits(max_processes=4)
+    running = []
+    peak = []
+
+    async def pipeline(name, processes):
+        share = await limits.acquire({PROCESSES: processes, CPU_SLOTS: 1})
+        running.append(name)
+        peak.append(limits.in_use[PROCESSES])
+        await asyncio.sleep(0.01)
+        running.remove(name)
+        await limits.release(share)
+        return share
+
+    async def main():
+        return await asyncio.gather(pipeline('a', 3), pipeline('b', 3), pipeline('c', 10))
+
+    shares = asyncio.get_event_loop().run_until_complete(main())
+    assert max(peak) <= 4
+    # A pipeline larger than the limit takes all of it
+    assert shares[2][PROCESSES] == 4
+    assert limits.in_use == {PROCESSES: 0, CPU_SLOTS: 0}
+
+
+def test_run_specs(tmpdir, monkeypatch):
+    monkeypatch.chdir(tmpdir)
+    specs = [_spec(tmpdir, './loop-test-%d' % i) for i in range(4)] + \
+        [_spec(tmpdir, './loop-test-fail', fail=True)]
+    reports = []
+    results = run_specs(_all_specs(specs), status_mgr(), False, concurrency=3,
+                        max_processes=4, progress_cb=reports.append)
+    results = dict((pipeline_id, (success, stats, errors)) for pipeline_id, success, stats, errors in results)
+    assert len(results) == 5
+    for i in range(4):
+        success, stats, _ = results['./loop-test-%d' % i]
+        assert success
+        # Each pipeline gets its own environment, although they all run in this process
+        assert stats['env'] == './loop-test-%d' % i
+    success, _, errors = results['./loop-test-fail']
+    assert not success
+    assert any('failed on purpose' in line for line in errors)
+    finished = [report for report in reports if report.success is not None]
+    assert len(finished) == 5
+    assert all(report.row_count == 250 for report in finished if report.success)
+
+
+def test_step_stats_are_opt_in(tmpdir, monkeypatch):
+    monkeypatch.chdir(tmpdir)
+    # The status manager is shared with the previous tests, and its directory is relative
+    tmpdir.mkdir('.dpp')
+    monkeypatch.delenv('DPP_TRACE', raising=False)
+    monkeypatch.delenv('DPP_STEP_STATS', raising=False)
+    [(_, success, stats, _)] = run_specs(_all_specs([_spec(tmpdir, './step-stats-off')]),
+                                         status_mgr(), False, concurrency=1)
+    assert success
+    assert 'steps' not in stats['.dpp']
+    assert 'limiting_step' not in stats['.dpp']
+    # The peak memory of each step is always kept
+    assert [step['step'] for step in stats['.dpp']['max_rss']] == ['processor', '(sink)']
+    assert all(step['max_rss'] > 0 for step in stats['.dpp']['max_rss'])
+
+    monkeypatch.setenv('DPP_STEP_STATS', '1')
+    [(_, success, stats, _)] = run_specs(_all_specs([_spec(tmpdir, './step-stats-on')]),
+                                         status_mgr(), False, concurrency=1)
+    assert success
+    steps = stats['.dpp']['steps']
+    assert [step['step'] for step in steps] == ['processor', '(sink)']
+    assert steps[0]['rows_out'] == 250
+    assert stats['.dpp']['limiting_step'] in ('processor', '(sink)')
+
+
+def test_memory_tracing_keeps_step_stats(tmpdir, monkeypatch):
+    monkeypatch.chdir(tmpdir)
+    tmpdir.mkdir('.dpp')
+    monkeypatch.delenv('DPP_TRACE', raising=False)
+    monkeypatch.delenv('DPP_STEP_STATS', raising=False)
+    spec = _spec(tmpdir, './trace-memory')
+    spec.pipeline_details['pipeline'][0]['trace-memory'] = True
+    [(_, success, stats, _)] = run_specs(_all_specs([spec]), status_mgr(), False, concurrency=1)
+    assert success
+    step = stats['.dpp']['steps'][0]
+    assert step['traced_peak'] > 0
+    assert len(step['top_allocations']) > 0
+    assert step['max_rss'] > 0
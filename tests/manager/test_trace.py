@@ -0,0 +1,41 @@
+from datapackage_pipelines.manager.trace import Trace, merge_traces, QUEUED_ENV_VAR, DISPATCHED_ENV_VAR
+
+
+def _events(trace, phase):
+    return [event for event in trace.to_dict()['traceEvents'] if event['ph'] == phase]
+
+
+def test_trace_process():
+    trace = Trace('./test')
+    trace.process(0, {'step': 'load', 'rows_out': 10,
+                      'resources': [['a', 100.0, 100.5, 5], ['b', 100.5, 101.0, 5]]},
+                  99.5, 101.25)
+    trace.process(1, {'step': 'dump_to_path', 'rows_in': 10}, 99.5, 101.5)
+    events = _events(trace, 'X')
+    assert [(event['name'], event['cat'], event['tid']) for event in events] == [
+        ('load', 'step', 1), ('a', 'resource', 1), ('b', 'resource', 1), ('dump_to_path', 'step', 2)
+    ]
+    assert events[0]['ts'] == 99500000
+    assert events[0]['dur'] == 1750000
+    assert events[0]['args'] == {'step': 'load', 'rows_out': 10}
+    assert events[1]['args'] == {'rows': 5}
+    names = {event['args']['name'] for event in _events(trace, 'M') if 'name' in event['args']}
+    assert names == {'./test', '0 load', '1 dump_to_path'}
+
+
+def test_trace_waits(monkeypatch):
+    monkeypatch.setenv(QUEUED_ENV_VAR, '10.0')
+    monkeypatch.setenv(DISPATCHED_ENV_VAR, '12.0')
+    trace = Trace('./test')
+    trace.waits(12.5)
+    assert [(event['name'], event['dur']) for event in _events(trace, 'X')] == \
+        [('waiting for dependencies', 2000000), ('starting', 500000)]
+
+
+def test_merge_traces():
+    first, second = Trace('./first'), Trace('./second')
+    first.instant('cache hit', 1.0)
+    second.complete('execution', 1.0, 2.0)
+    merged = merge_traces([first.to_dict(), second.to_dict()])
+    assert {event['pid'] for event in merged['traceEvents'] if event['ph'] == 'i'} == {1}
+    assert {event['pid'] for event in merged['traceEvents'] if event['ph'] == 'X'} == {2}
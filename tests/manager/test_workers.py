@@ -0,0 +1,94 @@
+import os
+import sys
+import subprocess
+from queue import Queue
+
+import pytest
+
+from datapackage_pipelines.specs import PipelineSpec
+from datapackage_pipelines.manager.workers import worker_execute_pipeline
+
+PROCESSOR = '''
+from datapackage_pipelines.wrapper import ingest, spew
+
+params, dp, res_iter = ingest()
+if params.get('fail'):
+    raise RuntimeError('failed on purpose')
+dp['resources'] = [{'name': 'r', 'path': 'r.csv', 'dpp:streaming': True,
+                    'schema': {'fields': [{'name': 'i', 'type': 'integer'}]}}]
+spew(dp, [({'i': i} for i in range(250))], {'env': __import__('os').environ.get('WORKER_TEST')})
+'''
+
+
+def _spec(tmpdir, pipeline_id, **parameters):
+    executor = tmpdir.join('processor.py')
+    executor.write(PROCESSOR)
+    return PipelineSpec(path=str(tmpdir),
+                        pipeline_id=pipeline_id,
+                        pipeline_details={'pipeline': [{'run': 'processor', 'executor': str(executor),
+                                                        'parameters': parameters, '_cache_hash': 'x'}]},
+                        source_details={},
+                        cache_hash='x',
+                        environment={'WORKER_TEST': 'value'})
+
+
+def _reports(queue):
+    ret = []
+    while not queue.empty():
+        ret.append(queue.get())
+    return ret
+
+
+@pytest.mark.parametrize('fork_server', [False, True])
+def test_worker_execute_pipeline(tmpdir, fork_server):
+    queue = Queue()
+    pipeline_id, success, stats, errors = \
+        worker_execute_pipeline(_spec(tmpdir, './worker-test'), str(tmpdir), False, False, queue,
+                                fork_server=fork_server)
+    assert pipeline_id == './worker-test'
+    assert success
+    assert stats['env'] == 'value'
+    reports = _reports(queue)
+    assert [report.row_count for report in reports if report.success is None][-1] == 250
+    assert reports[-1].success is True
+    assert reports[-1].stats == stats
+
+
+def test_worker_execute_pipeline_failure(tmpdir):
+    pipeline_id, success, stats, errors = \
+        worker_execute_pipeline(_spec(tmpdir, './worker-test-fail', fail=True), str(tmpdir), False, False,
+                                None)
+    assert not success
+    assert errors[0] == 'processor'
+    assert any('failed on purpose' in line for line in errors)
+
+
+SCRIPT = '''
+from datapackage_pipelines.manager import run_pipelines
+
+# No main guard - workers mustn't run this script again
+with open('script-runs.txt', 'a') as runs:
+    runs.write('run\\n')
+results = run_pipelines('all', '.', use_cache=False, concurrency=2, verbose_logs=False)
+print(sorted((result.pipeline_id, result.success, result.stats['env']) for result in results))
+'''
+
+SPEC = '''
+worker-test-1:
+  pipeline:
+    - run: processor
+worker-test-2:
+  pipeline:
+    - run: processor
+'''
+
+
+def test_run_pipelines_as_library(tmpdir):
+    tmpdir.join('processor.py').write(PROCESSOR)
+    tmpdir.join('pipeline-spec.yaml').write(SPEC)
+    tmpdir.join('script.py').write(SCRIPT)
+    env = dict(os.environ, WORKER_TEST='value')
+    output = subprocess.check_output([sys.executable, 'script.py'], cwd=str(tmpdir), env=env, timeout=120)
+    assert output.decode('utf8').strip() == \
+        "[('./worker-test-1', True, 'value'), ('./worker-test-2', True, 'value')]"
+    assert tmpdir.join('script-runs.txt').read() == 'run\n'
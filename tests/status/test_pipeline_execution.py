@@ -0,0 +1,14 @@
+from datapackage_pipelines.status.backend_filesystem import FilesystemBackend
+from datapackage_pipelines.status.pipeline_execution import PipelineExecution
+
+
+def test_delete_execution(tmpdir):
+    backend = FilesystemBackend(str(tmpdir))
+    execution = PipelineExecution(backend, './p', {}, 'hash', 'manual', 'eid')
+    execution.save_artifact('trace', {'traceEvents': []})
+    assert PipelineExecution.from_execution_id(backend, 'eid').get_artifact('trace') == {'traceEvents': []}
+
+    execution.delete()
+    assert backend.get_status(PipelineExecution.key('eid')) is None
+    assert backend.get_status(execution.artifact_key('trace')) is None
+    assert tmpdir.join('.dpp').listdir() == []
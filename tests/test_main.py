@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import csv
 import json
 import threading
 import time
@@ -56,4 +57,61 @@ def test_pipeline():
                    'bytes': 15787, 'count_of_rows': 40,
                    'dataset_name': 'hook-tests', 'hash': '9fc202087094c7becf98228a1327b21c'}}
     ]
-    assert progresses >= 1
\ No newline at end of file
+    assert progresses >= 1
+
+
+def test_parallel_step_keeps_row_order():
+    results = run_pipelines('./tests/env/dummy/pipeline-test-parallel', '.',
+                            use_cache=False,
+                            dirty=False,
+                            force=False,
+                            concurrency=1,
+                            verbose_logs=True)
+    assert [result.success for result in results] == [True]
+    with open('tests/env/dummy/parallel-tests-output/numbers.csv') as output:
+        values = [int(row['i']) for row in csv.DictReader(output)]
+    assert values == [i * 2 for i in range(1000)]
+
+
+def test_columnar_step_output():
+    results = run_pipelines('./tests/env/dummy/pipeline-test-columnar', '.',
+                            use_cache=False,
+                            dirty=False,
+                            force=False,
+                            concurrency=1,
+                            verbose_logs=True)
+    assert [result.success for result in results] == [True]
+    with open('tests/env/dummy/types.csv') as source:
+        expected = list(csv.DictReader(source))
+    with open('tests/env/dummy/type-tests-output-columnar/data/types.csv') as output:
+        rows = list(csv.DictReader(output))
+    assert [int(row['integer']) for row in rows] == [int(row['integer']) * 2 for row in expected]
+    assert [row['date'] for row in rows] == [row['date'] for row in expected]
+
+
+def test_validation_stats():
+    results = run_pipelines('./tests/env/dummy/pipeline-test-validation', '.',
+                            use_cache=False,
+                            dirty=False,
+                            force=False,
+                            concurrency=1,
+                            verbose_logs=True)
+    assert [result.success for result in results] == [True]
+    stats = results[0].stats
+    assert 'validation' not in stats
+    assert stats['.dpp']['validation'] == {'numbers': {'mode': 'every-10', 'rows': 100, 'checked': 10}}
+
+
+def test_fused_steps(monkeypatch):
+    monkeypatch.setenv('DPP_STEP_STATS', '1')
+    results = run_pipelines('./tests/env/dummy/pipeline-test-fused', '.',
+                            use_cache=False,
+                            dirty=False,
+                            force=False,
+                            concurrency=1,
+                            verbose_logs=True)
+    assert [result.success for result in results] == [True]
+    steps = [step['step'] for step in results[0].stats['.dpp']['steps']]
+    assert 'set_types+filter+dump_to_path' in steps
+    with open('tests/env/dummy/fused-tests-output/data/types.csv') as output:
+        assert [row['integer'] for row in csv.DictReader(output)] == ['0'] * 4
@@ -0,0 +1,87 @@
+import os
+
+import pytest
+
+from datapackage_pipelines.utilities.extended_json import json
+from datapackage_pipelines.utilities.framing import get_framing, framing_available
+from datapackage_pipelines.utilities.branches import join_branches, merge_datapackages
+
+
+def _bytes(data):
+    return data if isinstance(data, bytes) else data.encode('utf8')
+
+
+def _stream(framing, dp, resources, stats):
+    ret = b'{}\n' + json.dumps(dp, sort_keys=True).encode('utf8') + b'\n\n'
+    for rows in resources:
+        ret += b''.join(_bytes(framing.encode_row(row)) for row in rows)
+        ret += _bytes(framing.end_resource())
+    return ret + json.dumps(stats).encode('utf8') + b'\n'
+
+
+def _resource(name):
+    return {'name': name, 'path': name + '.csv', 'dpp:streaming': True,
+            'schema': {'fields': [{'name': 'i', 'type': 'integer'}]}}
+
+
+def _read_resource(framing, infile):
+    rows = []
+    while True:
+        row = framing.read_row(infile)
+        if row is None:
+            return rows
+        rows.append(row['i'])
+
+
+@pytest.mark.parametrize('framing_name', ['json', 'msgpack', 'columnar'])
+@pytest.mark.parametrize('branch_framing_name', ['json', 'same'])
+def test_join_branches(tmpdir, framing_name, branch_framing_name):
+    if not framing_available(framing_name):
+        pytest.skip('%s framing is not available' % framing_name)
+    framing = get_framing(framing_name)
+    branch_framing_name = framing_name if branch_framing_name == 'same' else branch_framing_name
+    upstream = tmpdir.join('upstream')
+    upstream.write_binary(_stream(framing, {'name': 'test', 'resources': [_resource('a')]},
+                                  [[{'i': i} for i in range(10)]], {'upstream': 1, 'rows': 10, '.dpp': {'upstream': 1, 'shared': 1}}))
+    branches = [
+        ({'name': 'test', 'title': 'Branched', 'resources': [_resource('b'), _resource('c')]},
+         [[{'i': i} for i in range(100, 150)], []], {'rows': 50, '.dpp': {'shared': 2}}),
+        ({'name': 'test', 'resources': [_resource('d')]},
+         [[{'i': i} for i in range(200, 205)]], {'rows': 5, 'other': 'x', '.dpp': {'branch': 'x'}}),
+    ]
+    for i, branch in enumerate(branches):
+        tmpdir.join('branch-out%d' % i).write_binary(_stream(get_framing(branch_framing_name), *branch))
+
+    with upstream.open('rb') as infile, tmpdir.join('joined').open('wb') as outfile:
+        join_branches(infile, get_framing(framing_name), outfile, get_framing(framing_name),
+                      [(tmpdir.join('branch-in%d' % i).open('wb'),
+                        os.open(str(tmpdir.join('branch-out%d' % i)), os.O_RDONLY),
+                        get_framing(branch_framing_name))
+                       for i in range(len(branches))])
+
+    # Each branch got the datapackage without its resources, and empty stats
+    for i in range(len(branches)):
+        assert tmpdir.join('branch-in%d' % i).read_binary() == \
+            b'{}\n{"name": "test", "resources": []}\n\n\n'
+
+    framing = get_framing(framing_name)
+    with tmpdir.join('joined').open('rb') as joined:
+        assert joined.readline() == b'{}\n'
+        dp = json.loads(joined.readline().decode('utf8'))
+        assert joined.readline() == b'\n'
+        assert dp['title'] == 'Branched'
+        assert [resource['name'] for resource in dp['resources']] == ['a', 'b', 'c', 'd']
+        assert _read_resource(framing, joined) == list(range(10))
+        assert _read_resource(framing, joined) == list(range(100, 150))
+        assert _read_resource(framing, joined) == []
+        assert _read_resource(framing, joined) == list(range(200, 205))
+        stats = json.loads(joined.readline().decode('utf8'))
+        assert stats == {'upstream': 1, 'rows': 55, 'other': 'x',
+                         '.dpp': {'upstream': 1, 'shared': 2, 'branch': 'x'}}
+        assert joined.read() == b''
+
+
+def test_merge_datapackages_duplicate_resource():
+    with pytest.raises(ValueError):
+        merge_datapackages({'resources': [_resource('a')]}, {'resources': []},
+                           [{'resources': [_resource('b')]}, {'resources': [_resource('a')]}])
@@ -0,0 +1,101 @@
+import io
+import gzip
+import json
+
+import pytest
+
+from datapackage_pipelines.utilities.cache_files import CacheReader, AsyncCacheWriter, \
+    CACHE_CODECS, DATAPACKAGE_SECTION, RESOURCE_SECTION, STATS_SECTION
+
+
+DATAPACKAGE = {
+    'name': 'test',
+    'resources': [
+        {'name': 'first', 'path': 'first.csv', 'dpp:streaming': True},
+        {'name': 'static', 'path': 'static.csv'},
+        {'name': 'second', 'path': 'second.csv', 'dpp:streaming': True},
+    ]
+}
+HEAD = json.dumps(DATAPACKAGE, sort_keys=True) + '\n\n'
+FIRST = '{"a": 1}\n{"a": "שלום"}\n\n'
+SECOND = '{"b": 2}\n\n'
+TAIL = '{}\n'
+CONTENTS = HEAD + FIRST + SECOND + TAIL
+
+
+def _available_codecs():
+    return [pytest.param(name, marks=pytest.mark.skipif(not codec.available(), reason='not installed'))
+            for name, codec in CACHE_CODECS.items()]
+
+
+def _write_cache(filename, codec):
+    writer = AsyncCacheWriter(filename, codec, queue_size=1)
+    writer.write(HEAD)
+    writer.end_section(DATAPACKAGE_SECTION)
+    for _ in range(100):
+        writer.write(FIRST[:-1])
+    writer.write('\n')
+    writer.end_section(RESOURCE_SECTION, 'first', 200)
+    writer.write(SECOND)
+    writer.end_section(RESOURCE_SECTION, 'second', 1)
+    writer.write(TAIL)
+    writer.end_section(STATS_SECTION)
+    writer.close()
+
+
+@pytest.mark.parametrize('codec', _available_codecs())
+def test_cache_roundtrip(codec, tmpdir):
+    filename = str(tmpdir.join('cache'))
+    _write_cache(filename, codec)
+
+    with open(filename, 'rb') as f:
+        assert f.readline() == ('DPP-CACHE:2:%s\n' % codec).encode('ascii')
+    with CacheReader(filename) as reader:
+        reader.validate()
+        assert reader.codec.NAME == codec
+        assert [(s['kind'], s.get('name'), s.get('rows')) for s in reader.sections] == [
+            (DATAPACKAGE_SECTION, None, None),
+            (RESOURCE_SECTION, 'first', 200),
+            (RESOURCE_SECTION, 'second', 1),
+            (STATS_SECTION, None, None),
+        ]
+        second = reader.resource_sections()[1]
+        assert reader.open_section(second).read().decode('utf8') == SECOND
+
+        out = io.BytesIO()
+        reader.replay(out)
+        assert out.getvalue().decode('utf8') == HEAD + FIRST[:-1] * 100 + '\n' + SECOND + TAIL
+
+
+def test_replay_some_resources(tmpdir):
+    filename = str(tmpdir.join('cache'))
+    _write_cache(filename, 'gzip')
+    with CacheReader(filename) as reader:
+        out = io.BytesIO()
+        reader.replay(out, ['second'])
+    dp_line, rest = out.getvalue().decode('utf8').split('\n', 1)
+    assert [res['name'] for res in json.loads(dp_line)['resources']] == ['static', 'second']
+    assert rest == '\n' + SECOND + TAIL
+
+
+def test_legacy_gzip_cache(tmpdir):
+    filename = str(tmpdir.join('cache'))
+    with gzip.open(filename, 'wt') as f:
+        f.write(CONTENTS)
+    with CacheReader(filename) as reader:
+        reader.validate()
+        assert reader.sections is None
+        out = io.BytesIO()
+        reader.replay(out, ['second'])
+        assert out.getvalue().decode('utf8') == CONTENTS
+
+
+def test_truncated_cache(tmpdir):
+    filename = str(tmpdir.join('cache'))
+    _write_cache(filename, 'gzip')
+    with open(filename, 'rb') as f:
+        data = f.read()
+    with open(filename, 'wb') as f:
+        f.write(data[:-10])
+    with pytest.raises(ValueError):
+        CacheReader(filename)
@@ -0,0 +1,92 @@
+import datetime
+import decimal
+import json as _json
+import math
+
+import pytest
+
+from datapackage_pipelines.utilities.extended_json import json, TypedRowDecoder, StdlibCodec, get_codec
+
+
+SCHEMA = {
+    'fields': [
+        {'name': 'id', 'type': 'integer'},
+        {'name': 'name', 'type': 'string'},
+        {'name': 'amount', 'type': 'number'},
+        {'name': 'date', 'type': 'date'},
+        {'name': 'when', 'type': 'datetime'},
+        {'name': 'duration', 'type': 'duration'},
+        {'name': 'tags', 'type': 'array'},
+        {'name': 'extra', 'type': 'object'},
+    ]
+}
+
+ROW = {
+    'id': 1,
+    'name': 'name',
+    'amount': decimal.Decimal('12.34'),
+    'date': datetime.date(2017, 3, 1),
+    'when': datetime.datetime(2017, 3, 1, 10, 11, 12),
+    'duration': datetime.timedelta(days=3),
+    'tags': [decimal.Decimal('1.5'), 'a', {'b': datetime.time(10, 11, 12)}],
+    'extra': {'a': {'b': {1, 2}}},
+}
+
+
+def test_typed_decoder_matches_common_decoder():
+    decoder = TypedRowDecoder(SCHEMA)
+    line = json.dumpl(ROW, sort_keys=True, ensure_ascii=True)
+    assert decoder.loads(line) == json.loads(line) == ROW
+
+
+def test_typed_decoder_handles_rows_not_matching_schema():
+    decoder = TypedRowDecoder(SCHEMA)
+    row = dict(ROW, unknown=decimal.Decimal('1'))
+    line = json.dumpl(row, sort_keys=True, ensure_ascii=True)
+    assert decoder.loads(line) == row
+
+
+def test_lazy_json_line_uses_decoder():
+    line = json.dumpl(ROW, sort_keys=True, ensure_ascii=True)
+    lazy = json.loadl(line, decoder=TypedRowDecoder(SCHEMA))
+    assert json.dumpl(lazy) == line
+    assert lazy['amount'] == ROW['amount']
+
+
+def test_default_codec_keeps_json_module_output():
+    row = {'name': 'name', 'id': 1, 'amount': 1.5, 'tags': ['a', 'b'], 'unicode': 'שלום'}
+    assert get_codec('json').dumps(row) == _json.dumps(row, sort_keys=True)
+    assert json.dumpl(row, sort_keys=True) == _json.dumps(row, sort_keys=True)
+    assert json.dumpl(row, separators=(',', ':')) == _json.dumps(row, separators=(',', ':'))
+
+
+@pytest.mark.parametrize('codec_name', ['orjson', 'rapidjson', 'ujson'])
+def test_codecs_are_byte_identical(codec_name):
+    pytest.importorskip(codec_name)
+    codec = get_codec(codec_name)
+    reference = StdlibCodec(compact=codec.compact)
+    assert codec.NAME == codec_name
+    row = dict(ROW, unicode='שלום', big=2 ** 70, none=None, flag=True, float=1.5, control='\x7f\x1f\n')
+    line = reference.dumps(row)
+    assert codec.dumps(row) == line
+    assert codec.dumps(row, sort_keys=False, ensure_ascii=False) == \
+        reference.dumps(row, sort_keys=False, ensure_ascii=False)
+    assert TypedRowDecoder(SCHEMA).convert(codec.loads(line)) == row
+
+
+@pytest.mark.parametrize('value', [float('nan'), float('inf'), -float('inf'),
+                                   2 ** 64, -2 ** 63 - 1, 123456789012345678901234567890,
+                                   1e16, -1.5e-7, 5e-5])
+def test_orjson_falls_back_for_values_it_cannot_round_trip(value):
+    pytest.importorskip('orjson')
+    codec = get_codec('orjson')
+    reference = StdlibCodec(compact=True)
+    row = {'value': value, 'nested': [{'value': value}], 'text': 'null'}
+    line = codec.dumps(row)
+    assert line == reference.dumps(row)
+    decoded = codec.loads(line)
+    if value != value:
+        assert math.isnan(decoded['value']) and math.isnan(decoded['nested'][0]['value'])
+    else:
+        assert decoded == row
+        assert type(decoded['value']) is type(value)
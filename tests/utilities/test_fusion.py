@@ -0,0 +1,69 @@
+import os
+
+import pytest
+from dataflows import Flow
+
+from datapackage_pipelines.utilities.fusion import fuse_flow_steps, LIB_PATH, FUSED_FLOW
+from datapackage_pipelines.utilities.flow_utils import step_boundary, failed_step
+
+
+def _step(run, **kw):
+    return dict(run=run, executor=os.path.join(LIB_PATH, run + '.py'), _cache_hash=run, **kw)
+
+
+def test_fuse_flow_steps():
+    steps = [
+        _step('add_resource'),
+        _step('set_types'),
+        _step('filter', parameters={'in': [{'a': 1}]}),
+        _step('sort', cache=True),
+        _step('concatenate'),
+        _step('dump_to_path'),
+        _step('stream_remote_resources'),
+        _step('printer'),
+    ]
+    fused = fuse_flow_steps(steps)
+    assert [step['run'] for step in fused] == [
+        'add_resource', 'set_types+filter', 'sort', 'concatenate+dump_to_path',
+        'stream_remote_resources', 'printer'
+    ]
+    assert fused[1]['executor'] == FUSED_FLOW
+    assert fused[1]['_cache_hash'] == 'filter'
+    assert fused[1]['parameters']['steps'][1] == {
+        'run': 'filter', 'executor': steps[2]['executor'], 'parameters': {'in': [{'a': 1}]}
+    }
+
+
+def test_user_processors_are_not_fused(tmpdir):
+    executor = tmpdir.join('set_types.py')
+    executor.write('def flow(parameters):\n    pass\n')
+    steps = [_step('set_types'), dict(_step('filter'), executor=str(executor))]
+    assert fuse_flow_steps(steps) == steps
+
+
+def test_profiled_steps_are_not_fused():
+    steps = [_step('set_types'), _step('filter', profile='sample'), _step('sort')]
+    assert fuse_flow_steps(steps) == steps
+
+
+def test_checkpointed_steps_are_not_fused():
+    steps = [_step('set_types', checkpoint=True), _step('sort')]
+    assert fuse_flow_steps(steps) == steps
+
+
+def test_failed_step():
+    def fail(row):
+        if row['a'] == 2:
+            raise ValueError('boom')
+
+    flow = Flow(
+        [{'a': 1}, {'a': 2}],
+        step_boundary('load'),
+        fail,
+        step_boundary('failing'),
+        lambda row: None,
+        step_boundary('last'),
+    )
+    with pytest.raises(Exception) as e:
+        flow.results()
+    assert failed_step(e.value) == 'failing'
@@ -0,0 +1,35 @@
+from datapackage_pipelines.utilities.memory_tracing import MemoryTracer, memory_tracing_enabled, traces_memory, \
+    TRACE_MEMORY_ENV_VAR
+
+
+def allocate():
+    return [bytes(1024) for _ in range(10000)]
+
+
+def test_memory_tracing_enabled(monkeypatch):
+    monkeypatch.delenv(TRACE_MEMORY_ENV_VAR, raising=False)
+    assert not memory_tracing_enabled()
+    assert MemoryTracer.from_env() is None
+    monkeypatch.setenv(TRACE_MEMORY_ENV_VAR, '1')
+    assert memory_tracing_enabled()
+
+
+def test_memory_tracer():
+    # Checked explicitly, as a periodic check might catch the allocation half way
+    tracer = MemoryTracer(interval=3600)
+    held = allocate()
+    tracer.check()
+    # Released before the tracer stops, so only the snapshot taken near the peak holds it
+    del held
+    stats = tracer.stop()
+    assert stats['traced_peak'] > 10 * 1024 * 1024
+    top = stats['top_allocations'][0]
+    assert top['site'].endswith('test_memory_tracing.py:%d' % (allocate.__code__.co_firstlineno + 1))
+    assert top['count'] >= 10000
+
+
+def test_traces_memory():
+    assert not traces_memory({'pipeline': [{'run': 'a'}]})
+    assert traces_memory({'trace-memory': True, 'pipeline': [{'run': 'a'}]})
+    assert traces_memory({'pipeline': [{'run': 'a'}, {'run': 'b', 'trace-memory': True}]})
+    assert traces_memory({'pipeline': [{'branches': [[{'run': 'a'}], [{'run': 'b', 'trace-memory': True}]]}]})
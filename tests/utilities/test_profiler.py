@@ -0,0 +1,57 @@
+import os
+import time
+import pstats
+
+import pytest
+
+from datapackage_pipelines.utilities.profiler import Profiler, StackSampler, collect_profile, \
+    profile_mode, profile_data, CPROFILE, SAMPLE
+
+
+def busy(seconds):
+    end = time.time() + seconds
+    while time.time() < end:
+        pass
+
+
+def test_profile_mode():
+    assert profile_mode({}) is None
+    assert profile_mode({'profile': False}) is None
+    assert profile_mode({'profile': True}) == CPROFILE
+    assert profile_mode({'profile': 'sample'}) == SAMPLE
+
+
+def test_stack_sampler():
+    sampler = StackSampler(0.001)
+    sampler.start()
+    busy(0.2)
+    sampler.disable()
+    assert sum(sampler.stacks.values()) > 0
+    assert any(stack.split(';')[-1].startswith('busy (') for stack in sampler.stacks)
+
+
+@pytest.mark.parametrize('mode', [CPROFILE, SAMPLE])
+def test_collect_profile(tmpdir, mode):
+    for _ in range(2):
+        profiler = Profiler(mode, str(tmpdir))
+        busy(0.1)
+        profiler.stop()
+        # Profiles are named after the process
+        os.rename(str(tmpdir.join('{}.{}'.format(os.getpid(), mode))),
+                  str(tmpdir.join('{}.{}'.format(len(tmpdir.listdir()), mode))))
+
+    profile = collect_profile(str(tmpdir), mode)
+    assert profile['mode'] == mode
+    assert profile['processes'] == 2
+    assert 'busy' in profile['report']
+    data = profile_data(profile)
+    if mode == CPROFILE:
+        tmpdir.join('combined').write_binary(data)
+        stats = pstats.Stats(str(tmpdir.join('combined')))
+        assert any(func[2] == 'busy' and stat[0] == 2 for func, stat in stats.stats.items())
+    else:
+        assert all(line.rpartition(' ')[2].isdigit() for line in data.decode('utf8').splitlines())
+
+
+def test_collect_profile_empty(tmpdir):
+    assert collect_profile(str(tmpdir), CPROFILE) is None
@@ -0,0 +1,114 @@
+import pytest
+
+from datapackage_pipelines.utilities.extended_json import json
+from datapackage_pipelines.utilities.framing import get_framing, framing_available
+from datapackage_pipelines.utilities.replication import fan_out, fan_in, merge_stats, \
+    count_streamed_resources, ORDERED, UNORDERED
+
+
+def _bytes(data):
+    return data if isinstance(data, bytes) else data.encode('utf8')
+
+
+def _upstream(framing, resources):
+    dp = {'name': 'test', 'resources': [
+        {'name': 'res%d' % i, 'path': 'res%d.csv' % i, 'dpp:streaming': True,
+         'schema': {'fields': [{'name': 'i', 'type': 'integer'}]}}
+        for i in range(len(resources))
+    ]}
+    ret = b'{}\n' + json.dumps(dp, sort_keys=True).encode('utf8') + b'\n\n'
+    for rows in resources:
+        ret += b''.join(_bytes(framing.encode_row(row)) for row in rows)
+        ret += _bytes(framing.end_resource())
+    return ret + b'{"upstream": 1}\n'
+
+
+def _read_rows(framing, infile, batched):
+    """Yields the rows of a resource, reading them in batches larger than the chunks if `batched`"""
+    while True:
+        if batched:
+            batch, finished = framing.read_batch(infile, 10)
+            if batch is not None:
+                yield from batch.rows()
+            if finished:
+                return
+        else:
+            row = framing.read_row(infile)
+            if row is None:
+                return
+            yield row
+
+
+def _replica(infile, outfile, framing_name, index, batched=False):
+    """Does what the wrapper does in a replica, for a processor dropping every third row"""
+    framing = get_framing(framing_name)
+    out_framing = get_framing(framing_name)
+    header = [infile.readline() for _ in range(3)]
+    outfile.write(b''.join(header))
+    framing.on_chunk_end = lambda: outfile.write(_bytes(out_framing.end_chunk()))
+    rows = 0
+    for _ in range(count_streamed_resources(header[1])):
+        for row in _read_rows(framing, infile, batched):
+            rows += 1
+            if row['i'] % 3 != 0:
+                outfile.write(_bytes(out_framing.encode_row(dict(row, replica=index))))
+        outfile.write(_bytes(out_framing.end_resource()))
+    stats = json.loads(infile.readline().decode('utf8').strip() or '{}')
+    stats.update({'rows': rows, 'replica': 'r%d' % index})
+    outfile.write(json.dumps(stats).encode('utf8') + b'\n')
+
+
+@pytest.mark.parametrize('framing_name', ['json', 'msgpack', 'columnar'])
+@pytest.mark.parametrize('mode', [ORDERED, UNORDERED])
+@pytest.mark.parametrize('batched', [False, True])
+def test_fan_out_fan_in(tmpdir, monkeypatch, framing_name, mode, batched):
+    if not framing_available(framing_name):
+        pytest.skip('%s framing is not available' % framing_name)
+    monkeypatch.setenv('DPP_BATCH_SIZE', '3')
+    resources = [[{'i': i} for i in range(100)], [], [{'i': i} for i in range(7)]]
+    upstream = tmpdir.join('upstream')
+    upstream.write_binary(_upstream(get_framing(framing_name), resources))
+
+    replicas = 3
+    with upstream.open('rb') as infile:
+        fan_out(infile, [tmpdir.join('in%d' % i).open('wb') for i in range(replicas)],
+                get_framing(framing_name), mode, size=4)
+    for i in range(replicas):
+        with tmpdir.join('in%d' % i).open('rb') as infile, tmpdir.join('out%d' % i).open('wb') as outfile:
+            _replica(infile, outfile, framing_name, i, batched)
+    with tmpdir.join('merged').open('wb') as outfile:
+        fan_in([tmpdir.join('out%d' % i).open('rb') for i in range(replicas)], outfile,
+               get_framing(framing_name), mode)
+
+    framing = get_framing(framing_name)
+    with tmpdir.join('merged').open('rb') as merged:
+        header = [merged.readline() for _ in range(3)]
+        assert b''.join(header) == _upstream(framing, resources)[:len(b''.join(header))]
+        assert header[2] == b'\n'
+        for expected in resources:
+            rows = []
+            while True:
+                row = framing.read_row(merged)
+                if row is None:
+                    break
+                rows.append(dict(row))
+            values = [row['i'] for row in rows]
+            expected = [row['i'] for row in expected if row['i'] % 3 != 0]
+            if mode == ORDERED:
+                assert values == expected
+            else:
+                assert sorted(values) == expected
+            if len(expected) > 8:
+                # Rows were actually spread between the replicas
+                assert len(set(row['replica'] for row in rows)) == replicas
+        stats = json.loads(merged.readline().decode('utf8'))
+        assert stats == {'upstream': 1, 'rows': 107, 'replica': 'r0'}
+        assert merged.read() == b''
+
+
+def test_merge_stats():
+    assert merge_stats([
+        {'a': 1, 'b': 'x', 'c': {'d': 1.5, 'e': True}, 'f': [1]},
+        {'a': 2, 'b': 'y', 'c': {'d': 1, 'e': False, 'g': 3}},
+        {'a': 3, 'h': None},
+    ]) == {'a': 6, 'b': 'x', 'c': {'d': 2.5, 'e': True, 'g': 3}, 'f': [1], 'h': None}
@@ -0,0 +1,36 @@
+import io
+import sys
+
+from datapackage_pipelines.utilities.step_stats import metered_input, report_step_stats, \
+    parse_step_stats, hook_stats, STEP_STATS_MAGIC
+
+
+def test_metered_input():
+    data = b'line\n' * 10000
+    stdin = io.BufferedReader(io.BytesIO(data))
+    infile, meter = metered_input(stdin)
+    assert infile.readline() == b'line\n'
+    assert infile.read() == data[5:]
+    assert meter.bytes == len(data)
+    assert meter.blocked >= 0
+
+
+def test_report_step_stats(monkeypatch):
+    monkeypatch.setattr(sys, '__stderr__', io.StringIO())
+    report_step_stats(rows_in=10, blocked_on_input=0.12345)
+    line = sys.__stderr__.getvalue()
+    assert line.startswith(STEP_STATS_MAGIC) and line.endswith('\n')
+    stats = parse_step_stats(line.rstrip())
+    assert stats['rows_in'] == 10
+    assert stats['blocked_on_input'] == 0.123
+    assert stats['cpu_time'] > 0
+    assert stats['max_rss'] > 0
+    assert parse_step_stats('INFO    :Processed 10 rows') is None
+
+
+def test_hook_stats():
+    stats = {'count_of_rows': 1, '.dpp': {'out-datapackage-url': 'dp.json', 'max_rss': [{'step': 'a', 'max_rss': 1}]}}
+    assert hook_stats(stats) == {'count_of_rows': 1, '.dpp': {'out-datapackage-url': 'dp.json'}}
+    assert 'max_rss' in stats['.dpp']
+    assert hook_stats({'count_of_rows': 1}) == {'count_of_rows': 1}
+    assert hook_stats(None) is None
@@ -0,0 +1,121 @@
+import io
+import datetime
+import decimal
+import unittest.mock as mock
+
+import pytest
+
+from datapackage_pipelines.utilities import framing as framing_module
+from datapackage_pipelines.utilities.framing import get_framing, RecordBatch, BufferedOutput, \
+    JSON_FRAMING, MSGPACK_FRAMING, COLUMNAR_FRAMING
+
+
+ROWS = [
+    {'a': 1, 'b': 'hello', 'c': decimal.Decimal('1.23')},
+    {'a': None, 'b': 'שלום', 'c': datetime.date(2015, 1, 31),
+     'd': datetime.datetime(2015, 1, 31, 3, 0, 10), 'e': datetime.time(3, 0, 10)},
+]
+
+
+def _roundtrip(framing_name):
+    framing = get_framing(framing_name)
+    chunks = [framing.encode_row(row) for row in ROWS] + [framing.end_resource()]
+    if framing.BINARY:
+        infile = io.BytesIO(b''.join(chunks) + b'trailer\n')
+    else:
+        infile = io.BytesIO(''.join(chunks).encode('utf8') + b'trailer\n')
+    rows = []
+    while True:
+        row = framing.read_row(infile)
+        if row is None:
+            break
+        rows.append(row)
+    assert [dict(row) for row in rows] == ROWS
+    assert infile.readline() == b'trailer\n'
+    return framing, rows
+
+
+def test_json_framing_roundtrip():
+    _roundtrip(JSON_FRAMING)
+
+
+def test_msgpack_framing_roundtrip():
+    framing, rows = _roundtrip(MSGPACK_FRAMING)
+    # Unmodified rows are passed on without re-encoding
+    assert framing.encode_row(rows[0]) == framing.encode_row(ROWS[0])
+    rows[0]['a'] = 2
+    assert framing.read_row(io.BytesIO(framing.encode_row(rows[0])))['a'] == 2
+
+
+def test_columnar_framing_roundtrip():
+    _roundtrip(COLUMNAR_FRAMING)
+
+
+def test_columnar_framing_batches():
+    framing = get_framing(COLUMNAR_FRAMING)
+    framing.batch_size = 2
+    data = b''.join(framing.encode_row(row) for row in ROWS * 2) + \
+        framing.encode_batch(RecordBatch(['a'], [[1, 2, 3]])) + \
+        framing.end_resource()
+
+    framing = get_framing(COLUMNAR_FRAMING)
+    infile = io.BytesIO(data)
+    batches = []
+    while True:
+        batch, finished = framing.read_batch(infile, 100)
+        if finished:
+            break
+        batches.append(batch)
+    # Rows with a different set of fields are shipped in different batches
+    assert [len(batch) for batch in batches] == [1, 1, 1, 1, 3]
+    assert batches[-1].column('a') == [1, 2, 3]
+    assert [row for batch in batches[:-1] for row in batch] == ROWS * 2
+
+
+def test_columnar_framing_copies_rows():
+    framing = get_framing(COLUMNAR_FRAMING)
+    row = {'a': 1, 'b': 'x'}
+    data = framing.encode_row(row)
+    # Processors may reuse the same row object
+    row['a'] = 2
+    data += framing.encode_row(row) + framing.end_resource()
+    batch, _ = get_framing(COLUMNAR_FRAMING).read_batch(io.BytesIO(data), 100)
+    assert batch.column('a') == [1, 2]
+
+
+@pytest.mark.parametrize('framing_name', [JSON_FRAMING, MSGPACK_FRAMING, COLUMNAR_FRAMING])
+@pytest.mark.parametrize('block_size', [1, 7, 64 * 1024])
+def test_copy_resource(framing_name, block_size, monkeypatch):
+    monkeypatch.setattr(framing_module, 'PASSTHROUGH_BLOCK_SIZE', block_size)
+    framing = get_framing(framing_name)
+    empty = framing.end_resource()
+    full = framing.encode_text('').join(framing.encode_row(row) for row in ROWS * 3) + framing.end_resource()
+    data = empty + full + full + framing.encode_text('trailer\n')
+    if not framing.BINARY:
+        data = data.encode('utf8')
+
+    infile = io.BufferedReader(io.BytesIO(data), buffer_size=max(block_size, 8))
+    out = io.BytesIO() if framing.BINARY else io.StringIO()
+    counts = [framing.copy_resource(infile, [out]) for _ in range(3)]
+    assert counts == [0, 6, 6]
+    assert infile.readline() == b'trailer\n'
+    copied = out.getvalue()
+    assert (copied if framing.BINARY else copied.encode('utf8')) == data[:-len(b'trailer\n')]
+
+
+def test_buffered_output():
+    stream = mock.Mock()
+    out = BufferedOutput(stream, threshold=10)
+    out.write('abcd')
+    out.write('efgh')
+    assert stream.write.call_count == 0
+    out.write('ij')
+    stream.write.assert_called_once_with('abcdefghij')
+    out.write('k')
+    out.write('0123456789ab')
+    assert stream.write.call_args_list[1:] == [mock.call('k'), mock.call('0123456789ab')]
+    out.write('l')
+    out.flush()
+    assert stream.write.call_args_list[-1] == mock.call('l')
+    stream.flush.assert_called_once_with()
+    assert out.bytes == 24
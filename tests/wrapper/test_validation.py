@@ -0,0 +1,92 @@
+import io
+import decimal
+import unittest.mock as mock
+
+import pytest
+from tableschema import Schema
+
+from datapackage_pipelines.wrapper.validation import ResourceValidator, parse_validation_mode
+
+
+SCHEMA = Schema({'fields': [
+    {'name': 'id', 'type': 'integer'},
+    {'name': 'amount', 'type': 'number', 'constraints': {'minimum': 0}},
+    {'name': 'name', 'type': 'string'},
+]})
+
+
+def _rows(count, bad=()):
+    return [{'id': i if i not in bad else 'x', 'amount': decimal.Decimal(i), 'name': str(i)}
+            for i in range(count)]
+
+
+def _validate(mode, rows):
+    validator = ResourceValidator(SCHEMA, mode)
+    for row in rows:
+        validator.check_row(row)
+    validator.finish()
+    return validator.stats()
+
+
+def test_parse_validation_mode():
+    assert parse_validation_mode(False) is None
+    assert parse_validation_mode('False') is None
+    assert parse_validation_mode(True) == 'full'
+    assert parse_validation_mode('True') == 'full'
+    assert parse_validation_mode('every-10') == 'every-10'
+    for mode in ('first', 'first-0', 'last-10', 'sample-x'):
+        with pytest.raises(ValueError):
+            parse_validation_mode(mode)
+
+
+@pytest.mark.parametrize('mode,checked', [
+    ('full', 100), ('first-10', 10), ('every-7', 15), ('sample-20', 20), ('sample-200', 100),
+])
+def test_validation_modes(mode, checked):
+    assert _validate(mode, _rows(100)) == {'mode': mode, 'rows': 100, 'checked': checked}
+
+
+@pytest.mark.parametrize('mode,bad', [
+    ('full', 50), ('first-10', 5), ('every-10', 20), ('sample-100', 50),
+])
+def test_validation_errors(mode, bad):
+    with pytest.raises(ValueError):
+        _validate(mode, _rows(100, bad=(bad,)))
+
+
+def test_validation_errors_are_logged(caplog):
+    with pytest.raises(ValueError):
+        _validate('full', _rows(10, bad=(3,)))
+    messages = [record.getMessage() for record in caplog.records]
+    assert messages[0].startswith('Failed to validate row')
+    assert messages[1].startswith('1) ') and '"x"' in messages[1]
+
+
+def test_unchecked_rows_are_skipped():
+    assert _validate('first-10', _rows(100, bad=(50,)))['checked'] == 10
+
+
+def test_constraints():
+    rows = _rows(10)
+    rows[3]['amount'] = decimal.Decimal(-1)
+    with pytest.raises(ValueError):
+        _validate('full', rows)
+
+
+def test_descriptor_validation_is_cached(tmpdir, monkeypatch):
+    import datapackage
+    from datapackage_pipelines.wrapper import input_processor
+    from datapackage_pipelines.utilities.validation_cache import VALIDATION_CACHE_ENV_VAR
+
+    stream = b'{}\n{"name": "test", "resources": [{"name": "r", "path": "r.csv"}]}\n\n'
+    validate = mock.Mock(wraps=datapackage.validate)
+    monkeypatch.setattr(datapackage, 'validate', validate)
+    monkeypatch.setenv(VALIDATION_CACHE_ENV_VAR, str(tmpdir))
+    for _ in range(3):
+        dp, _, _ = input_processor.process_input(io.BytesIO(stream))
+        assert dp['name'] == 'test'
+    assert validate.call_count == 1
+
+    monkeypatch.delenv(VALIDATION_CACHE_ENV_VAR)
+    input_processor.process_input(io.BytesIO(stream))
+    assert validate.call_count == 2
@@ -1,5 +1,7 @@
+import io
 import unittest.mock as mock
 from datapackage_pipelines.wrapper import spew
+from datapackage_pipelines.wrapper.input_processor import process_input
 
 
 class TestWrapper(object):
@@ -22,3 +24,14 @@ class TestWrapper(object):
                 assert last_call_args != mock.call('\n')
 
             spew(datapackage, resources_iterator, finalizer=finalizer)
+
+
+def test_process_input_accepts_text_streams():
+    stream = b'{}\n' + \
+        b'{"name": "test", "resources": [{"name": "r", "path": "r.csv", "dpp:streaming": true, ' \
+        b'"schema": {"fields": [{"name": "i", "type": "integer"}]}}]}\n\n' + \
+        b'{"i": 1}\n{"i": 2}\n\n'
+    for infile in (io.BytesIO(stream), io.TextIOWrapper(io.BytesIO(stream))):
+        dp, resources, _ = process_input(infile)
+        assert dp['name'] == 'test'
+        assert [[dict(row) for row in resource] for resource in resources] == [[{'i': 1}, {'i': 2}]]